@@ -0,0 +1,104 @@
+"""
+asyncio front-end for ``TextCleaner`` which micro-batches concurrent requests,
+so online services get batched NER forward passes with single-request ergonomics.
+"""
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncTextCleaner:
+    """
+    Queues concurrent ``aclean`` calls and flushes them as one ``process_batch`` call
+    when ``max_batch_size`` texts are waiting or ``max_wait`` seconds passed since the
+    first one arrived. Batches run off the event loop in ``executor``, by default a
+    single thread as ``TextCleaner`` keeps per-text state while processing.
+    """
+
+    def __init__(self, cleaner=None, max_batch_size: int = 32, max_wait: float = 0.01, executor=None):
+        if cleaner is None:
+            from sct.sct import TextCleaner
+            cleaner = TextCleaner()
+        self.cleaner = cleaner
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._own_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix="sct")
+        self._pending = []  # (text, future)
+        self._timer = None
+        self._tasks = set()
+
+    async def aclean(self, text: str) -> Any:
+        """Cleans one text, returns the same result as ``TextCleaner.process``."""
+        if not isinstance(text, str):
+            raise ValueError(f"Input must be string, got {type(text)}")
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    async def aclean_batch(self, texts: List[str]) -> List[Any]:
+        """Cleans several texts, they are batched together with any other concurrent calls."""
+        return list(await asyncio.gather(*(self.aclean(text) for text in texts)))
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        task = asyncio.get_running_loop().create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _process(self, texts):
+        try:
+            return self.cleaner.process_batch(texts)
+        except Exception:
+            # isolate the failing text(s) instead of failing every caller in the batch
+            logger.warning("Batch of %d texts failed, retrying one by one", len(texts))
+            results = []
+            for text in texts:
+                try:
+                    results.append(self.cleaner.process_batch([text])[0])
+                except Exception as e:
+                    results.append(e)
+            return results
+
+    async def _run(self, batch):
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(self._executor, self._process, [text for text, _ in batch])
+        except Exception as e:
+            results = [e] * len(batch)
+
+        for (_, future), result in zip(batch, results):
+            if future.done():  # caller went away
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def aclose(self):
+        """Flushes the queued texts, waits for running batches and shuts the default executor down."""
+        self._flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._own_executor:
+            self._executor.shutdown(wait=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
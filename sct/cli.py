@@ -0,0 +1,95 @@
+"""
+Command line entry point, ``sct <command>``.
+"""
+import sys
+import argparse
+import logging
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="sct", description="SqueakyCleanText command line tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve = subparsers.add_parser("serve", help="Run the local HTTP cleaning server")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8000)
+    serve.add_argument("--workers", type=int, default=1, help="Forked worker processes sharing the models")
+    serve.add_argument("--threads", type=int, default=None, help="Torch threads per worker")
+    serve.add_argument("--max-batch-size", type=int, default=32)
+    serve.add_argument("--max-wait-ms", type=float, default=10.0, help="How long a request waits to be batched")
+    serve.add_argument("--max-body-mb", type=float, default=10.0, help="Larger request bodies are rejected")
+    serve.add_argument("--max-texts", type=int, default=1000, help="Larger batch requests are rejected")
+    serve.add_argument("--metrics", action="store_true", help="Collect metrics, exported at GET /metrics")
+    serve.add_argument("--max-restarts", type=int, default=5,
+                       help="Worker restarts allowed within --restart-window before the server exits with 1")
+    serve.add_argument("--restart-window", type=float, default=60.0, help="Seconds over which restarts are counted")
+
+    clean = subparsers.add_parser("clean", help="Clean a file with one text per line, resumable")
+    clean.add_argument("input", help="Input file, one text per line")
+    clean.add_argument("output_dir", help="Directory for the results and the progress journal")
+    clean.add_argument("--segment-size", type=int, default=10000, help="Texts committed at once")
+    clean.add_argument("--chunk-size", type=int, default=1000, help="Texts per process_batch call")
+    clean.add_argument("--batch-size", type=int, default=None, help="NER batch size")
+
+    shard = subparsers.add_parser("shard", help="Clean one shard of a file, for running on several machines")
+    shard.add_argument("input", help="Input file, one text per line, the same on every machine")
+    shard.add_argument("output_dir", help="Directory for the shards, collected from all machines for the merge")
+    shard.add_argument("--shard", type=int, required=True, help="Shard of this machine, from 0")
+    shard.add_argument("--num-shards", type=int, required=True)
+    shard.add_argument("--by", choices=["bytes", "hash"], default="bytes",
+                       help="Contiguous byte ranges, or lines by content hash")
+    shard.add_argument("--segment-size", type=int, default=10000, help="Texts committed at once")
+    shard.add_argument("--batch-size", type=int, default=None, help="NER batch size")
+
+    merge = subparsers.add_parser("merge", help="Validate finished shards and merge them in input order")
+    merge.add_argument("output_dir", help="Directory holding all the shards")
+    merge.add_argument("output", help="Merged JSON lines file")
+    merge.add_argument("--input", default=None, help="The input file, to check the content every shard cleaned")
+
+    snapshot = subparsers.add_parser("snapshot", help="Write the NER models to a directory for fast loading")
+    snapshot.add_argument("output_dir", help="Snapshot directory, used with config.NER_SNAPSHOT_DIR")
+    snapshot.add_argument("--cache-dir", default=None, help="Hugging Face cache to take the models from")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(process)d %(levelname)s %(message)s")
+
+    if args.command == "serve":
+        from sct import config, server
+        if args.metrics:
+            config.COLLECT_METRICS = True
+        return server.serve(
+            host=args.host,
+            port=args.port,
+            workers=args.workers,
+            threads=args.threads,
+            max_batch_size=args.max_batch_size,
+            max_wait=args.max_wait_ms / 1000,
+            max_body_bytes=int(args.max_body_mb * 2 ** 20),
+            max_texts=args.max_texts,
+            max_restarts=args.max_restarts,
+            restart_window=args.restart_window,
+        )
+    elif args.command == "clean":
+        from sct.runner import BatchRunner
+        runner = BatchRunner(args.output_dir, segment_size=args.segment_size, chunk_size=args.chunk_size,
+                             batch_size=args.batch_size)
+        stats = runner.run(args.input)
+        logging.info(f"Cleaned {stats['texts']} texts in {stats['segments']} segments "
+                     f"({stats['skipped']} already done, {stats['errors']} errors)")
+    elif args.command == "shard":
+        from sct.shard import run_shard
+        manifest = run_shard(args.input, args.output_dir, args.shard, args.num_shards, by=args.by,
+                             segment_size=args.segment_size, batch_size=args.batch_size)
+        logging.info(f"Shard {args.shard} done, {manifest['lines']} texts, {manifest['errors']} errors")
+    elif args.command == "merge":
+        from sct.shard import write_merged
+        count = write_merged(args.output_dir, args.output, args.input)
+        logging.info(f"Merged {count} results into {args.output}")
+    elif args.command == "snapshot":
+        from sct.utils.snapshot import write_snapshot
+        manifest = write_snapshot(args.output_dir, cache_dir=args.cache_dir)
+        logging.info(f"Wrote {len(manifest['models'])} models to {args.output_dir}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
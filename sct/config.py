@@ -1,5 +1,11 @@
 """
     detect_language : to detect the language automatically, but would consume more time if done on a batch
+    language_sample_chars : detect the language from at most this many characters, the head of the text plus
+                            windows spread over the rest, so long documents cost the same, None for the whole text
+    language_sample_windows : number of windows the language sample is split into
+    language_confidence_threshold : stop scoring sample windows once the leading language reaches this confidence,
+                                    None to score them all
+    language_low_accuracy : use lingua's low accuracy mode, faster and lighter but less reliable on short texts
     fix_bad_unicode : if True, fix "broken" unicode such as mojibake and garbled HTML entities
     to_ascii_unicode : if True, convert non-to_ascii characters into their closest to_ascii equivalents
     replace_with_url : special URL token, default "",
@@ -17,6 +23,53 @@
     casefold : to lower the text
     remove_stopwords : remove stopwords based on the language, usues NLTK stopwords
     remove_punctuation : removes all the special symbols
+    max_window_chars : documents longer than this are split at safe boundaries and processed window by window,
+                       None to always process the whole document at once
+    max_input_chars : hard limit on the input size, longer inputs are handled by input_overflow_policy
+    input_overflow_policy : 'truncate' (cut at a safe boundary), 'skip' (empty result) or 'error' (raise ValueError)
+    max_output_chars : cut the language model text to this many characters at a safe boundary, documents longer
+                       than the output needs are cleaned window by window and only until the output is full, so
+                       the rest never reaches NER, None for no limit
+    max_output_tokens : the same in tokens of the NER tokenizer, cut at a word boundary, None for no limit
+    short_text_max_chars : texts up to this length, e.g. tweets, run the batch-safe regex stages once over the
+                           whole batch joined together instead of one call per text, None to disable
+    ner_memory_budget_mb : RAM budget for the NER models, they are then loaded on demand and the least recently
+                           used one is evicted when needed, None loads all models upfront
+    ner_quantize : run the NER models with int8 dynamic quantization of their linear layers (CPU only),
+                   about 4x less memory and faster inference for a small recall drop,
+                   see sct/scripts/evaluate_quantization.py
+    ner_quantized_cache_dir : where the quantized models are stored for reuse, per model revision and torch version,
+                              None for ~/.cache/sct/quantized
+    ner_snapshot_dir : directory written by `sct snapshot`, the NER models and tokenizers are then loaded from it
+                       with memory-mapped weights instead of from NER_MODELS_LIST, None to disable
+    ner_autotune : choose the NER batch size of every model by probing growing sizes on its first large batch,
+                   measuring tokens per second and peak memory, and halve it for the process when memory runs out,
+                   the tuned choice is stored per host and model so later runs reuse it, see sct/utils/autotune.py
+    ner_autotune_path : JSON file of the autotuned batch sizes, None for ~/.cache/sct/autotune.json
+    ner_autotune_memory_mb : memory the autotuned batch sizes must stay under, None for 80% of the RAM on CPU
+                             or 90% of the GPU memory
+    boilerplate_min_count : TextCleaner.process_corpus treats blocks found in at least this many documents as boilerplate
+    boilerplate_min_chars : shorter blocks are never boilerplate
+    boilerplate_unit : "paragraph" or "line", the blocks compared across documents
+    drop_boilerplate : if True, process_corpus leaves the boilerplate blocks out instead of cleaning them once
+    optimize_stage_order : let the stage registry (sct.utils.stages) move cheap, length-reducing stages such as
+                           html stripping ahead of expensive ones such as fix_bad_unicode where their declared
+                           dependencies allow, False keeps the default order
+    checkpoint_path : SQLite file where the output of the checkpoint_stages is stored, keyed by the input and the
+                      config of the stages up to there, so re-runs after config changes resume from the deepest
+                      valid stage, None to disable
+    checkpoint_stages : the pipeline stages whose output is stored, e.g. the expensive unicode fixes and NER
+    return_result_objects : return CleanResult objects which compute the statistical model text only when
+                            it is read, instead of tuples, they still unpack and index like the tuples;
+                            results which are plain strings stay str
+    collect_metrics : count documents, time every stage and record NER usage, entities and cache hits in
+                      sct.utils.metrics.REGISTRY, exported in the Prometheus format at GET /metrics by sct serve
+    regex_backend : engine used for the compiled patterns, "re" (default), "regex" or "re2", set it before
+                    importing sct.sct or switch later with sct.utils.regexengine.use_backend
+    regex_timeout : seconds after which a "regex" backend pattern raises RegexTimeoutError, None to disable,
+                    also bounds the patterns falling back from "re2" to "regex", the stdlib "re" can't be bounded
+    regex_timeout_policy : what happens to a text whose cleaning raises RegexTimeoutError, 'skip' (empty result)
+                           or 'error' (raise), the other texts of the batch are cleaned either way
 """
 
 CHECK_DETECT_LANGUAGE = True
@@ -47,7 +100,36 @@ REPLACE_WITH_NUMBERS = "<NUMBER>"
 REPLACE_WITH_CURRENCY_SYMBOLS = None
 POSITIONAL_TAGS = ['PER', 'LOC', 'ORG']
 NER_CONFIDENCE_THRESHOLD = 0.85
+NER_MEMORY_BUDGET_MB = None
+NER_QUANTIZE = False
+NER_QUANTIZED_CACHE_DIR = None
+NER_SNAPSHOT_DIR = None
+NER_AUTOTUNE = False
+NER_AUTOTUNE_PATH = None
+NER_AUTOTUNE_MEMORY_MB = None
 LANGUAGE = None
+LANGUAGE_SAMPLE_CHARS = None
+LANGUAGE_SAMPLE_WINDOWS = 4
+LANGUAGE_CONFIDENCE_THRESHOLD = None
+LANGUAGE_LOW_ACCURACY = False
+MAX_WINDOW_CHARS = None
+MAX_INPUT_CHARS = None
+INPUT_OVERFLOW_POLICY = 'truncate'
+MAX_OUTPUT_CHARS = None
+MAX_OUTPUT_TOKENS = None
+SHORT_TEXT_MAX_CHARS = None
+BOILERPLATE_MIN_COUNT = 5
+BOILERPLATE_MIN_CHARS = 20
+BOILERPLATE_UNIT = "paragraph"
+DROP_BOILERPLATE = False
+OPTIMIZE_STAGE_ORDER = False
+CHECKPOINT_PATH = None
+CHECKPOINT_STAGES = ["to_ascii_unicode", "ner_process"]
+RETURN_RESULT_OBJECTS = False
+COLLECT_METRICS = False
+REGEX_BACKEND = "re"
+REGEX_TIMEOUT = 1.0
+REGEX_TIMEOUT_POLICY = 'skip'
 
 # Order of the model is Important : English Model, Dutch Model, German Model, Spanish Model, MULTILINGUAL Model
 NER_MODELS_LIST = ["FacebookAI/xlm-roberta-large-finetuned-conll03-english",
@@ -0,0 +1,198 @@
+"""
+Resumable batch cleaning for long running jobs.
+
+Results are committed in fixed-size segments, each written to its own JSON lines file and then
+recorded in an append-only journal. A restarted job skips the segments in the journal and
+resumes with the first uncommitted one, so at most one segment of work is lost when the
+process dies. Texts which fail are written as null results and recorded in an error sidecar
+next to their segment instead of aborting the job.
+
+    output_dir/
+        journal.jsonl                 one header line, then one line per committed segment
+        segment-000000.jsonl          one result per line, in input order
+        segment-000000.errors.jsonl   the texts of that segment which failed, if any
+"""
+import os
+import json
+import logging
+import itertools
+import traceback
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Union
+
+from sct import config
+from sct.utils.checkpoint import config_fingerprint
+from sct.utils.reader import LineIndexedFile
+from sct.utils.result import result_to_json
+
+logger = logging.getLogger(__name__)
+
+# config settings which change the results, a job can only be resumed with the same values
+RESULT_CONFIG = sorted(name for name in dir(config) if name.isupper() and name not in (
+    "NER_MEMORY_BUDGET_MB", "NER_QUANTIZED_CACHE_DIR", "REGEX_BACKEND", "REGEX_TIMEOUT",
+    "CHECKPOINT_PATH", "CHECKPOINT_STAGES", "RETURN_RESULT_OBJECTS", "BOILERPLATE_MIN_COUNT",
+    "BOILERPLATE_MIN_CHARS", "BOILERPLATE_UNIT", "DROP_BOILERPLATE", "COLLECT_METRICS", "SHORT_TEXT_MAX_CHARS",
+    "NER_AUTOTUNE", "NER_AUTOTUNE_PATH", "NER_AUTOTUNE_MEMORY_MB",
+))
+
+
+def write_lines(path: Path, records: Iterable[Any]) -> None:
+    """Writes JSON lines to ``path`` atomically, the file is complete or absent."""
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class BatchRunner:
+    """
+    Cleans a large input into ``output_dir`` segment by segment, see the module docstring.
+    Args:
+        cleaner: the ``TextCleaner`` to use, created on first use if None
+        segment_size: texts per committed segment, fixed for the lifetime of a job
+        chunk_size: texts per ``process_batch`` call within a segment
+        batch_size: NER batch size passed to ``process_batch``
+    """
+
+    JOURNAL = "journal.jsonl"
+
+    def __init__(self, output_dir: Union[str, Path], cleaner=None, segment_size: int = 10000,
+                 chunk_size: int = 1000, batch_size: int = None):
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.journal_path = self.output_dir / self.JOURNAL
+        self._cleaner = cleaner
+        self.segment_size = segment_size
+        self.chunk_size = chunk_size
+        self.batch_size = batch_size
+
+    @property
+    def cleaner(self):
+        if self._cleaner is None:
+            from sct.sct import TextCleaner
+            self._cleaner = TextCleaner()
+        return self._cleaner
+
+    def segment_path(self, segment: int, errors: bool = False) -> Path:
+        return self.output_dir / f"segment-{segment:06d}{'.errors' if errors else ''}.jsonl"
+
+    def header(self) -> Dict[str, Any]:
+        return {"segment_size": self.segment_size, "fingerprint": config_fingerprint(RESULT_CONFIG)}
+
+    def read_journal(self) -> Dict[int, Dict[str, Any]]:
+        """The committed segments by number, a torn last line from a crash is ignored."""
+        if not self.journal_path.exists():
+            return {}
+        with open(self.journal_path, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        entries = []
+        for line in lines:
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                logger.warning(f"Ignoring a torn line in {self.journal_path}")
+        if not entries:
+            return {}
+
+        header, expected = entries[0], self.header()
+        if header.get("segment_size") != expected["segment_size"]:
+            raise ValueError(f"Job in {self.output_dir} uses segment_size={header.get('segment_size')}, "
+                             f"got {self.segment_size}")
+        if header.get("fingerprint") != expected["fingerprint"]:
+            raise ValueError(f"The config changed since the job in {self.output_dir} started, "
+                             f"resuming would mix results, use a new output directory")
+        return {entry["segment"]: entry for entry in entries[1:] if self.segment_path(entry["segment"]).exists()}
+
+    def _append_journal(self, entry: Dict[str, Any]) -> None:
+        with open(self.journal_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _clean_chunk(self, texts: List[str], offset: int):
+        """Cleans ``texts``, retrying one by one when the batch fails. Returns the results and the errors."""
+        try:
+            return [result_to_json(result) for result in self.cleaner.process_batch(texts, self.batch_size)], []
+        except Exception:
+            logger.warning(f"Batch at text {offset} failed, retrying text by text")
+
+        results, errors = [], []
+        for i, text in enumerate(texts):
+            try:
+                results.append(result_to_json(self.cleaner.process_batch([text], self.batch_size)[0]))
+            except Exception as e:
+                results.append(None)
+                errors.append({
+                    "index": offset + i,
+                    "error": f"{type(e).__name__}: {e}",
+                    "traceback": traceback.format_exc(),
+                    "text": text if isinstance(text, str) else repr(text),
+                })
+        return results, errors
+
+    def _segments(self, source) -> Iterator[List[str]]:
+        if isinstance(source, (str, Path)):
+            with LineIndexedFile(source) as lines:
+                yield from lines.batches(self.segment_size)
+        elif isinstance(source, Sequence):
+            for start in range(0, len(source), self.segment_size):
+                yield list(source[start:start + self.segment_size])
+        else:
+            iterator = iter(source)
+            while True:
+                segment = list(itertools.islice(iterator, self.segment_size))
+                if not segment:
+                    return
+                yield segment
+
+    def run(self, source: Union[str, Path, Sequence[str], Iterable[str]]) -> Dict[str, int]:
+        """
+        Cleans ``source``, a file with one text per line, a sequence or an iterable of texts,
+        which must be the same when resuming. Returns counts of what this run did.
+        """
+        committed = self.read_journal()
+        if not self.journal_path.exists() or self.journal_path.stat().st_size == 0:
+            self._append_journal(self.header())
+        stats = {"segments": 0, "skipped": 0, "texts": 0, "errors": 0}
+
+        for segment, texts in enumerate(self._segments(source)):
+            if segment in committed:
+                stats["skipped"] += 1
+                continue
+            start = segment * self.segment_size
+            results, errors = [], []
+            for offset in range(0, len(texts), self.chunk_size):
+                chunk_results, chunk_errors = self._clean_chunk(texts[offset:offset + self.chunk_size], start + offset)
+                results.extend(chunk_results)
+                errors.extend(chunk_errors)
+
+            # the error sidecar goes first, a segment in the journal always has its errors on disk
+            if errors:
+                write_lines(self.segment_path(segment, errors=True), errors)
+            write_lines(self.segment_path(segment), results)
+            self._append_journal({"segment": segment, "start": start, "count": len(texts), "errors": len(errors)})
+
+            stats["segments"] += 1
+            stats["texts"] += len(texts)
+            stats["errors"] += len(errors)
+            logger.info(f"Committed segment {segment} ({start + len(texts)} texts, {len(errors)} errors)")
+        return stats
+
+    def results(self) -> Iterator[Optional[Dict[str, Any]]]:
+        """The committed results in input order, None for the texts which failed."""
+        for segment in sorted(self.read_journal()):
+            with open(self.segment_path(segment), encoding="utf-8") as f:
+                for line in f:
+                    yield json.loads(line)
+
+    def errors(self) -> Iterator[Dict[str, Any]]:
+        """The recorded failures of the committed segments."""
+        for segment in sorted(self.read_journal()):
+            path = self.segment_path(segment, errors=True)
+            if path.exists():
+                with open(path, encoding="utf-8") as f:
+                    for line in f:
+                        yield json.loads(line)
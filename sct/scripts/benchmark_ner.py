@@ -0,0 +1,236 @@
+"""
+Measures the NER throughput of ``GeneralNER`` without downloading anything.
+
+Small randomly initialised XLM-R token classification models, with Unigram tokenizers trained
+on a generated corpus, stand in for the five real checkpoints through ``config.NER_MODELS_LIST``.
+Their outputs are meaningless but batching, chunking, padding and the model routing are the
+real ones, so changes there can be measured anywhere, also in sandboxes without network.
+For each corpus shape ``ner_process`` (text by text) and ``process_batch`` are timed.
+
+    python -m sct.scripts.benchmark_ner [--shapes short long] [--docs 64] [--json report.json]
+    python -m sct.scripts.benchmark_ner --real    # the models of config.NER_MODELS_LIST instead
+"""
+import json
+import time
+import random
+import argparse
+import tempfile
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List
+
+from sct import config
+
+WORDS = {
+    "ENGLISH": "the of and to in is was for that with on as by at from which this are be has have it not "
+               "an were their more after also new first been other about two into year people".split(),
+    "DUTCH": "de van het een en in is op te dat voor met zijn niet aan er ook als bij door maar om "
+             "nog werd worden naar dan wordt jaar nieuwe mensen".split(),
+    "GERMAN": "der die und in den von zu das mit sich des auf für ist im dem nicht ein eine als auch "
+              "es an werden aus er hat dass sie nach jahr".split(),
+    "SPANISH": "de la que el en y a los se del las un por con no una su para es al lo como más pero "
+               "sus le ya o fue este año personas".split(),
+}
+NAMES = ["John Smith", "Angela Merkel", "Pablo García", "Willem de Vries", "Maria Rossi", "Hans Müller",
+         "Sarah Johnson", "Pedro Sánchez", "Jan Jansen", "Emma Schmidt"]
+PLACES = ["New York", "Berlin", "Madrid", "Amsterdam", "London", "München", "Barcelona", "Utrecht", "Paris"]
+ORGS = ["Microsoft", "Siemens", "Telefónica", "Philips", "the United Nations", "Deutsche Bank", "Rabobank"]
+
+# words per document
+SHAPES = {
+    "short": (8, 25),
+    "medium": (80, 250),
+    "long": (1500, 3000),
+    "mixed": (8, 3000),
+}
+LABELS = ["O", "B-PER", "I-PER", "B-ORG", "I-ORG", "B-LOC", "I-LOC", "B-MISC", "I-MISC"]
+
+
+def generate_text(rng: random.Random, words: int, language: str) -> str:
+    """A text of about ``words`` words in ``language``, with a name, place or organisation now and then."""
+    vocabulary = WORDS[language]
+    sentences, sentence = [], []
+    for _ in range(words):
+        roll = rng.random()
+        if roll < 0.03:
+            sentence.append(rng.choice(NAMES))
+        elif roll < 0.05:
+            sentence.append(rng.choice(PLACES))
+        elif roll < 0.06:
+            sentence.append(rng.choice(ORGS))
+        else:
+            sentence.append(rng.choice(vocabulary))
+        if len(sentence) >= rng.randint(8, 20):
+            sentences.append(" ".join(sentence).capitalize() + ".")
+            sentence = []
+    if sentence:
+        sentences.append(" ".join(sentence).capitalize() + ".")
+    return " ".join(sentences)
+
+
+def generate_corpus(shape: str, docs: int, seed: int = 0) -> List[tuple]:
+    """``docs`` (text, language) pairs of the corpus ``shape``, the same for the same seed."""
+    rng = random.Random(f"{shape}-{seed}")
+    low, high = SHAPES[shape]
+    languages = list(WORDS)
+    corpus = []
+    for i in range(docs):
+        language = languages[i % len(languages)]
+        corpus.append((generate_text(rng, rng.randint(low, high), language), language))
+    return corpus
+
+
+def make_tiny_model(path, seed: int = 0, hidden_size: int = 32, layers: int = 2, vocab_size: int = 2000) -> str:
+    """
+    Saves a randomly initialised XLM-R token classification model and a tokenizer trained on
+    the generated corpus to ``path``, unless already there. Returns the path as a string.
+    """
+    import torch
+    from tokenizers import Tokenizer, decoders, models, normalizers, pre_tokenizers, processors, trainers
+    from transformers import XLMRobertaConfig, XLMRobertaForTokenClassification, XLMRobertaTokenizerFast
+
+    path = Path(path)
+    if (path / "config.json").exists():
+        return str(path)
+
+    corpus = [text for shape in SHAPES for text, _ in generate_corpus(shape, 8, seed)]
+    corpus += NAMES + PLACES + ORGS
+    tokenizer = Tokenizer(models.Unigram())
+    tokenizer.normalizer = normalizers.NFKC()
+    tokenizer.pre_tokenizer = pre_tokenizers.Metaspace()
+    tokenizer.decoder = decoders.Metaspace()
+    specials = ["<s>", "<pad>", "</s>", "<unk>", "<mask>"]
+    tokenizer.train_from_iterator(corpus, trainers.UnigramTrainer(vocab_size=vocab_size, special_tokens=specials,
+                                                                  unk_token="<unk>"))
+    tokenizer.post_processor = processors.TemplateProcessing(
+        single="<s> $A </s>", pair="<s> $A </s> </s> $B </s>", special_tokens=[("<s>", 0), ("</s>", 2)])
+    fast_tokenizer = XLMRobertaTokenizerFast(
+        tokenizer_object=tokenizer, bos_token="<s>", eos_token="</s>", unk_token="<unk>", pad_token="<pad>",
+        mask_token="<mask>", cls_token="<s>", sep_token="</s>", model_max_length=512)
+
+    model_config = XLMRobertaConfig(
+        vocab_size=len(fast_tokenizer), hidden_size=hidden_size, num_hidden_layers=layers,
+        num_attention_heads=max(1, hidden_size // 16), intermediate_size=hidden_size * 2,
+        max_position_embeddings=514, pad_token_id=1, bos_token_id=0, eos_token_id=2,
+        id2label=dict(enumerate(LABELS)), label2id={label: i for i, label in enumerate(LABELS)})
+    torch.manual_seed(seed)
+    model = XLMRobertaForTokenClassification(model_config)
+    model.save_pretrained(path)
+    fast_tokenizer.save_pretrained(path)
+    return str(path)
+
+
+def make_tiny_models(directory, **kwargs) -> List[str]:
+    """One tiny model per entry of ``config.NER_MODELS_LIST``, in the same order."""
+    from sct.utils.ner import GeneralNER
+    return [make_tiny_model(Path(directory) / f"tiny-{key}", seed=seed, **kwargs)
+            for seed, key in enumerate(GeneralNER.MODEL_KEYS)]
+
+
+class PipelineRecorder:
+    """Wraps ``GeneralNER.run_pipeline`` of one instance to record the chunks and time of every model call."""
+
+    def __init__(self, ner):
+        self.ner = ner
+        self.run_pipeline = ner.run_pipeline
+        self.calls = []  # (model key, chunks, batch size, seconds)
+        ner.run_pipeline = self
+
+    def __call__(self, key, chunks, batch_size, positional_tags):
+        start = time.perf_counter()
+        outputs = self.run_pipeline(key, chunks, batch_size, positional_tags)
+        if chunks:
+            self.calls.append((key, chunks, batch_size, time.perf_counter() - start))
+        return outputs
+
+    def stats(self) -> Dict:
+        """Tokens, padded batch slots and seconds, in total and per model."""
+        tokens = slots = 0
+        seconds = defaultdict(float)
+        for key, chunks, batch_size, elapsed in self.calls:
+            tokenizer = getattr(self.ner, f"{key}_tokenizer")
+            lengths = [len(ids) for ids in tokenizer(chunks, truncation=True)["input_ids"]]
+            # the pipeline pads every batch of consecutive chunks to its longest one
+            for start in range(0, len(lengths), batch_size):
+                batch = lengths[start:start + batch_size]
+                tokens += sum(batch)
+                slots += max(batch) * len(batch)
+            seconds[key] += elapsed
+        return {"tokens": tokens, "slots": slots, "model_seconds": dict(seconds)}
+
+    def reset(self):
+        self.calls = []
+
+
+def benchmark(ner, corpus: List[tuple], batch_size: int = 8, repeat: int = 1) -> Dict[str, Dict]:
+    """Times ``ner_process`` per text and ``process_batch`` over ``corpus``, (text, language) pairs."""
+    texts = [text for text, _ in corpus]
+    languages = [language for _, language in corpus]
+    recorder = ner.run_pipeline if isinstance(ner.run_pipeline, PipelineRecorder) else PipelineRecorder(ner)
+    chunks = sum(len(ner.split_text(text, ner.min_token_length, ner.tokenizer)) for text in texts)
+    ner.process_batch(texts[:batch_size], batch_size, config.POSITIONAL_TAGS, language=languages[:batch_size])  # warm up
+
+    modes = {
+        "ner_process": lambda: [ner.ner_process(text, config.POSITIONAL_TAGS, config.NER_CONFIDENCE_THRESHOLD, language)
+                                for text, language in corpus],
+        "process_batch": lambda: ner.process_batch(texts, batch_size, config.POSITIONAL_TAGS,
+                                                   config.NER_CONFIDENCE_THRESHOLD, languages),
+    }
+    report = {}
+    for mode, run in modes.items():
+        recorder.reset()
+        start = time.perf_counter()
+        for _ in range(repeat):
+            run()
+        elapsed = time.perf_counter() - start
+        stats = recorder.stats()
+        report[mode] = {
+            "docs_per_second": len(texts) * repeat / elapsed,
+            "tokens_per_second": stats["tokens"] / elapsed,
+            "padding_ratio": 1 - stats["tokens"] / stats["slots"] if stats["slots"] else 0.0,
+            "chunks_per_document": chunks / len(texts),
+            "model_calls": len(recorder.calls),
+            "model_seconds": stats["model_seconds"],
+            "seconds": elapsed,
+        }
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--shapes", nargs="+", choices=list(SHAPES), default=list(SHAPES))
+    parser.add_argument("--docs", type=int, default=64, help="Documents per corpus shape")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=1, help="Timed passes over each corpus")
+    parser.add_argument("--models-dir", default=None, help="Where the tiny models are kept, default a temporary directory")
+    parser.add_argument("--hidden-size", type=int, default=32, help="Hidden size of the tiny models")
+    parser.add_argument("--layers", type=int, default=2, help="Layers of the tiny models")
+    parser.add_argument("--real", action="store_true", help="Benchmark the models of config.NER_MODELS_LIST")
+    parser.add_argument("--json", default=None, help="Also write the report to this file")
+    args = parser.parse_args(argv)
+
+    from sct.utils.ner import GeneralNER
+
+    with tempfile.TemporaryDirectory() as directory:
+        if not args.real:
+            config.NER_MODELS_LIST[:] = make_tiny_models(args.models_dir or directory, hidden_size=args.hidden_size,
+                                                         layers=args.layers)
+        ner = GeneralNER(device="cpu")
+
+        reports = {}
+        print(f"{'shape':<8} {'mode':<14} {'docs/s':>9} {'tokens/s':>10} {'padding':>8} {'chunks/doc':>10}  model seconds")
+        for shape in args.shapes:
+            reports[shape] = benchmark(ner, generate_corpus(shape, args.docs), args.batch_size, args.repeat)
+            for mode, report in reports[shape].items():
+                per_model = " ".join(f"{key}={seconds:.2f}" for key, seconds in sorted(report["model_seconds"].items()))
+                print(f"{shape:<8} {mode:<14} {report['docs_per_second']:>9.1f} {report['tokens_per_second']:>10.0f} "
+                      f"{report['padding_ratio']:>8.2f} {report['chunks_per_document']:>10.2f}  {per_model}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"models": list(config.NER_MODELS_LIST), "batch_size": args.batch_size, "shapes": reports}, f,
+                      indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Compares the int8 dynamically quantized NER models against the fp32 ones on a fixed corpus.
+The fp32 entities are taken as the reference, so precision and recall tell how much of
+its output the quantized model keeps. Latency and footprint are reported for both.
+
+    python -m sct.scripts.evaluate_quantization [--models NAME ...] [--repeat 3]
+"""
+import gc
+import time
+import argparse
+
+from transformers import AutoConfig, AutoTokenizer, AutoModelForTokenClassification, pipeline
+
+from sct import config
+from sct.utils.models import load_quantized_model, model_revision, module_footprint
+
+CORPUS = {
+    "en": [
+        "Barack Obama met Angela Merkel in Berlin to discuss the future of NATO.",
+        "Apple Inc. is opening a new office in London next to the British Museum.",
+        "Dr. Sarah Johnson from Microsoft presented the results at Stanford University.",
+        "The United Nations sent John Smith to Nairobi, Kenya, in March.",
+        "Amazon and Google compete for engineers in Seattle and San Francisco.",
+    ],
+    "nl": [
+        "Mark Rutte sprak in Den Haag met vertegenwoordigers van Philips en Shell.",
+        "Jan de Vries woont in Amsterdam en werkt bij de Rabobank in Utrecht.",
+        "De Universiteit Leiden ontving een subsidie van de Europese Commissie.",
+    ],
+    "de": [
+        "Angela Merkel besuchte gestern das Werk von Volkswagen in Wolfsburg.",
+        "Hans Müller arbeitet bei Siemens in München und wohnt in Augsburg.",
+        "Die Deutsche Bank eröffnet eine Filiale am Alexanderplatz in Berlin.",
+    ],
+    "es": [
+        "Pedro Sánchez se reunió en Madrid con directivos de Telefónica.",
+        "María García vive en Barcelona y trabaja para el Banco Santander.",
+        "La Universidad de Salamanca recibió a investigadores de la ONU.",
+    ],
+}
+CORPUS["multi"] = [text for texts in CORPUS.values() for text in texts]
+
+
+def entities(ner_pipeline, texts, threshold):
+    """Runs ``texts`` through the pipeline, returns one set of (group, start, end) per text."""
+    return [
+        {(e['entity_group'], e['start'], e['end']) for e in result
+         if e['entity_group'] in config.POSITIONAL_TAGS and e['score'] >= threshold}
+        for result in ner_pipeline(texts)
+    ]
+
+
+def measure(ner_pipeline, texts, threshold, repeat):
+    found = entities(ner_pipeline, texts, threshold)  # also warms up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        entities(ner_pipeline, texts, threshold)
+    latency = (time.perf_counter() - start) / (repeat * len(texts))
+    return found, latency
+
+
+def agreement(reference, candidate):
+    """Precision, recall and F1 of ``candidate`` against ``reference``, both lists of sets."""
+    true_positives = sum(len(ref & cand) for ref, cand in zip(reference, candidate))
+    predicted = sum(len(cand) for cand in candidate)
+    expected = sum(len(ref) for ref in reference)
+    precision = true_positives / predicted if predicted else 1.0
+    recall = true_positives / expected if expected else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return precision, recall, f1
+
+
+def evaluate(model_name, texts, threshold=None, repeat=3, cache_dir=None):
+    """Evaluates one model, only one of its variants is held in memory at a time."""
+    threshold = config.NER_CONFIDENCE_THRESHOLD if threshold is None else threshold
+    cache_args = {"cache_dir": str(cache_dir)} if cache_dir else {}
+    tokenizer = AutoTokenizer.from_pretrained(model_name, **cache_args)
+    load_model = lambda: AutoModelForTokenClassification.from_pretrained(model_name, **cache_args).eval()
+    build_model = lambda: AutoModelForTokenClassification.from_config(
+        AutoConfig.from_pretrained(model_name, **cache_args))
+    load_int8 = lambda: load_quantized_model(model_name, load_model, build_model, config.NER_QUANTIZED_CACHE_DIR,
+                                             revision=lambda: model_revision(model_name, cache_args.get("cache_dir")))
+
+    report = {"model": model_name}
+    for variant, load in (("fp32", load_model), ("int8", load_int8)):
+        model = load()
+        ner_pipeline = pipeline("ner", model=model, tokenizer=tokenizer, aggregation_strategy="simple", device="cpu")
+        report[variant] = dict(zip(("entities", "latency"), measure(ner_pipeline, texts, threshold, repeat)))
+        report[variant]["footprint"] = module_footprint(model)
+        del model, ner_pipeline
+        gc.collect()
+
+    report["precision"], report["recall"], report["f1"] = agreement(
+        report["fp32"]["entities"], report["int8"]["entities"])
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--models", nargs="+", default=None,
+                        help="Model names or paths, default config.NER_MODELS_LIST")
+    parser.add_argument("--threshold", type=float, default=None, help="Default config.NER_CONFIDENCE_THRESHOLD")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed passes over the corpus")
+    parser.add_argument("--cache-dir", default=None, help="Hugging Face cache directory")
+    args = parser.parse_args(argv)
+
+    model_names = args.models or config.NER_MODELS_LIST
+    keys = list(CORPUS) if args.models is None else ["multi"] * len(model_names)
+
+    print(f"{'model':<60} {'precision':>9} {'recall':>7} {'f1':>6} "
+          f"{'fp32 ms':>8} {'int8 ms':>8} {'fp32 MB':>8} {'int8 MB':>8}")
+    for key, model_name in zip(keys, model_names):
+        report = evaluate(model_name, CORPUS[key], args.threshold, args.repeat, args.cache_dir)
+        print(f"{model_name:<60} {report['precision']:>9.3f} {report['recall']:>7.3f} {report['f1']:>6.3f} "
+              f"{report['fp32']['latency'] * 1000:>8.1f} {report['int8']['latency'] * 1000:>8.1f} "
+              f"{report['fp32']['footprint'] / 1024 ** 2:>8.1f} {report['int8']['footprint'] / 1024 ** 2:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,117 +3,701 @@ This code provides a comprehensive text cleaning and preprocessing pipeline.
 It includes functions to normalize, remove personal information and clean text data, 
 which is crucial for natural language processing tasks.
 """
+import time
+import logging
 from sct import config
-from sct.utils import contact, datetime, ner, normtext, resources, special, stopwords
-from typing import List, Any
+from sct.utils import boilerplate, checkpoint, columnar, contact, datetime, features, langdetect, metrics, ner, normtext, reader, regexengine, resources, special, stages, stopwords, tokenization, windowing
+from sct.utils.result import CleanResult
+from typing import List, Any, Iterator, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
 
 class TextCleaner:
     
+    # window size of the output budgeted processing, input characters per output character or token
+    BUDGET_CHARS_PER_CHAR = 2
+    BUDGET_CHARS_PER_TOKEN = 8
+    
     def __init__(self):
         self.ProcessContacts = contact.ProcessContacts()
         self.ProcessDateTime = datetime.ProcessDateTime()
         self.ProcessSpecialSymbols = special.ProcessSpecialSymbols()
         self.NormaliseText = normtext.NormaliseText()
         self.ProcessStopwords = stopwords.ProcessStopwords()
+        self.FeatureHasher = features.FeatureHasher(self.ProcessStopwords)
+        self.WindowSplitter = windowing.WindowSplitter()
         self.GeneralNER = ner.GeneralNER()
+        self.LanguageDetector = langdetect.LanguageDetector(
+            sample_chars=config.LANGUAGE_SAMPLE_CHARS,
+            windows=config.LANGUAGE_SAMPLE_WINDOWS,
+            confidence_threshold=config.LANGUAGE_CONFIDENCE_THRESHOLD,
+            low_accuracy=config.LANGUAGE_LOW_ACCURACY
+        )
+        self.checkpoints = checkpoint.CheckpointStore(config.CHECKPOINT_PATH) if config.CHECKPOINT_PATH else None
+        self.lm_tokenizers = {}  # (name, placeholders) -> LMTokenizer, see process_batch_tokens
         self.pipeline = []
         self.language = None
+        self.language_confidence = None
+        self.configured_language = None
         self.batch_size = 8  # Default batch size for NER
         self.init_pipeline()
     
     def init_pipeline(self):
-        # Initialize pipeline steps based on config
+        # Initialize pipeline steps based on config, ordered by the stage registry
         language_config = config.LANGUAGE.lower() if config.LANGUAGE else None
 
+        enabled = {stage.name for stage in stages.REGISTRY.values() if stage.name != "detect_language" and stage.enabled()}
         if language_config and language_config in resources.LANGUAGE_NAME:
-            self.language = language_config.upper()
+            self.language = self.configured_language = language_config.upper()
         elif any([config.CHECK_DETECT_LANGUAGE, config.CHECK_NER_PROCESS, config.CHECK_REMOVE_STOPWORDS]):
-            self.pipeline.append(self.detect_language)
-        
-        if config.CHECK_FIX_BAD_UNICODE:
-            self.pipeline.append(self.fix_bad_unicode)
-        if config.CHECK_TO_ASCII_UNICODE:
-            self.pipeline.append(self.to_ascii_unicode)
-        if config.CHECK_REPLACE_HTML:
-            self.pipeline.append(self.replace_html)
-        if config.CHECK_REPLACE_URLS:
-            self.pipeline.append(self.replace_urls)
-        if config.CHECK_REPLACE_EMAILS:
-            self.pipeline.append(self.replace_emails)
-        if config.CHECK_REPLACE_YEARS:
-            self.pipeline.append(self.replace_years)
-        if config.CHECK_REPLACE_PHONE_NUMBERS:
-            self.pipeline.append(self.replace_phone_numbers)
-        if config.CHECK_REPLACE_NUMBERS:
-            self.pipeline.append(self.replace_numbers)
-        if config.CHECK_REPLACE_CURRENCY_SYMBOLS:
-            self.pipeline.append(self.replace_currency_symbols)
+            enabled.add("detect_language")
+        
+        self.batch_safe = set()
+        for stage in stages.build_order(enabled):
+            self.pipeline.append(getattr(self, stage.name) if stage.function is None else stage.function)
+            if stage.batch_safe:
+                self.batch_safe.add(stage.name)
         
         if config.CHECK_NER_PROCESS:
             self.pipeline.append(self.ner_process)
-        
-        if config.CHECK_REMOVE_ISOLATED_LETTERS:
-            self.pipeline.append(self.remove_isolated_letters)
-        if config.CHECK_REMOVE_ISOLATED_SPECIAL_SYMBOLS:
-            self.pipeline.append(self.remove_isolated_special_symbols)
-        if config.CHECK_NORMALIZE_WHITESPACE:
-            self.pipeline.append(self.normalize_whitespace)
     
     def process_batch(self, texts: List[str], batch_size: int = None) -> List[Any]:
-        """Process multiple texts efficiently in batches."""
+        """
+        Process multiple texts efficiently in batches.
+        The non-NER steps run per text, then NER runs over the whole batch at once
+        so texts share the model forward passes.
+        """
+        return self.format_batch(texts, batch_size)[0]
+
+    def process_batch_tokens(self, texts: List[str], tokenizer: Union[str, tokenization.LMTokenizer],
+                             batch_size: int = None) -> Tuple[List[Any], tokenization.TokenizedBatch]:
+        """
+        Like ``process_batch``, but also returns the ``TokenizedBatch`` of the language model texts,
+        tokenized in one call. ``tokenizer`` is an ``LMTokenizer`` or the name of a fast tokenizer.
+        """
+        results, lm_texts = self.format_batch(texts, batch_size)
+        return results, self.lm_tokenizer(tokenizer).encode(lm_texts)
+
+    def format_batch(self, texts: List[str], batch_size: int = None) -> Tuple[List[Any], List[str]]:
+        """The results of ``process_batch`` and the language model text of each, empty for skipped texts."""
+        start = time.perf_counter() if metrics.active() else None
+        results = []
+        lm_texts = []
+        for cleaned in self.clean_batch(texts, batch_size):
+            if cleaned is None:
+                results.append(self.empty_result())
+                lm_texts.append("")
+            else:
+                current_text, lm_windows, self.language = cleaned
+                results.append(self.format_result(current_text, lm_windows))
+                lm_texts.append(current_text)
+        if start is not None:
+            metrics.BATCH_SECONDS.observe(time.perf_counter() - start)
+            metrics.DOCUMENTS.inc(len(texts))
+        return results, lm_texts
+
+    def lm_tokenizer(self, tokenizer: Union[str, tokenization.LMTokenizer]) -> tokenization.LMTokenizer:
+        """
+        ``tokenizer``, loaded with the default settings and kept for the next batches if it is a name.
+        A change of the configured placeholders loads it again, registering the new ones.
+        """
+        if isinstance(tokenizer, tokenization.LMTokenizer):
+            return tokenizer
+        key = (tokenizer, tuple(tokenization.placeholders()))
+        if key not in self.lm_tokenizers:
+            self.lm_tokenizers[key] = tokenization.LMTokenizer(tokenizer)
+        return self.lm_tokenizers[key]
+
+    def process_batch_features(self, texts: List[str], batch_size: int = None,
+                               hasher: features.FeatureHasher = None) -> features.HashedFeatures:
+        """
+        Like ``process_batch``, but returns the statistical model side as hashed n-gram counts of the
+        whole batch instead of one string per text. ``hasher`` defaults to unigrams in 2**20 buckets.
+        """
+        hasher = hasher or self.FeatureHasher
+        cleaned_batch = self.clean_batch(texts, batch_size)
+        documents, lm_texts, languages = [], [], []
+        for cleaned in cleaned_batch:
+            if cleaned is None:
+                documents.append([])
+                lm_texts.append("")
+                languages.append(None)
+                continue
+            current_text, lm_windows, language = cleaned
+            tokens = []
+            for lm_window in lm_windows or [current_text]:
+                tokens.extend(hasher.tokens(lm_window, language))
+            documents.append(tokens)
+            lm_texts.append(current_text)
+            languages.append(language)
+        indptr, indices, data = hasher.transform(documents)
+        return features.HashedFeatures(indptr, indices, data, hasher.n_features, lm_texts, languages)
+
+    def clean_batch(self, texts: List[str], batch_size: int = None) -> List[Optional[Tuple[str, Optional[List[str]], str]]]:
+        """
+        Cleans texts up to the language model text. Returns for each text its language model text,
+        its cleaned windows if it was processed window by window, and its language, or None for
+        an empty or skipped text. A text whose cleaning hits ``config.REGEX_TIMEOUT`` is handled
+        on its own by ``regex_timeout``, the rest of the batch is unaffected.
+        """
         if not texts:
             return []
             
-        results = []
+        results = [None] * len(texts)
+        pending = []  # (index, text cleaned up to NER, language)
+        checkpointed = []  # (index, text) resumed from the checkpoint store
+        short = []  # (index, text) cleaned together by clean_short_texts
         batch_size = batch_size or self.batch_size
         
-        for text in texts:
+        for i, text in enumerate(texts):
             # Validate input type and content
             if not isinstance(text, str):
                 raise ValueError(f"Input must be string, got {type(text)}")
             
             # Handle empty text case
             if not text or text.isspace():
-                results.append(("", "", None))
                 continue
             
-            current_text = text  # No need for str() conversion now
+            if config.MAX_INPUT_CHARS and len(text) > config.MAX_INPUT_CHARS:
+                text = self.limit_input(text)
+                if text is None:
+                    continue
             
             # Reset language for each text
-            self.language = None
+            self.language = self.configured_language
             
-            # Apply non-NER pipeline steps
-            for step in [s for s in self.pipeline if s != self.ner_process]:
-                current_text = step(current_text)
-            
-            # Batch NER processing if enabled
-            if config.CHECK_NER_PROCESS:
-                current_text = self.GeneralNER.ner_process(
-                    current_text,
+            try:
+                budget_window = self.budget_window_chars()
+                if budget_window and len(text) > budget_window:
+                    results[i] = (self.process_budgeted(text, budget_window), None, self.language)
+                elif config.MAX_WINDOW_CHARS and len(text) > config.MAX_WINDOW_CHARS:
+                    current_text, lm_windows = self.process_windows(text)
+                    results[i] = (current_text, lm_windows, self.language)
+                elif self.checkpoints is not None:
+                    checkpointed.append((i, text))
+                elif config.SHORT_TEXT_MAX_CHARS and len(text) <= config.SHORT_TEXT_MAX_CHARS:
+                    short.append((i, text))
+                else:
+                    pending.append((i, self.clean_text(text, ner=False), self.language))
+            except regexengine.RegexTimeoutError as e:
+                self.regex_timeout(e)
+        
+        if short:
+            pending.extend(self.clean_short_texts(short))
+            pending.sort(key=lambda item: item[0])
+        
+        ner_keys = {}  # index -> checkpoint key of its NER output
+        if checkpointed:
+            finished, resumed, ner_keys = self.resume_checkpoints(checkpointed)
+            for i, current_text, language in finished:
+                results[i] = (current_text, None, language)
+            pending.extend(resumed)
+        
+        # Batch NER processing if enabled
+        if pending and config.CHECK_NER_PROCESS:
+            start = time.perf_counter()
+            ner_texts = self.GeneralNER.process_batch(
+                [text for _, text, _ in pending],
+                batch_size=batch_size,
+                positional_tags=config.POSITIONAL_TAGS,
+                ner_confidence_threshold=config.NER_CONFIDENCE_THRESHOLD,
+                language=[language for _, _, language in pending]
+            )
+            if metrics.active():
+                metrics.STAGE_SECONDS.observe(time.perf_counter() - start, stage="ner_process")
+            pending = [(i, ner_text, language) for (i, _, language), ner_text in zip(pending, ner_texts)]
+            if ner_keys:
+                self.checkpoints.save(
+                    (ner_keys[i], ner_text, language) for i, ner_text, language in pending if i in ner_keys)
+        
+        for i, current_text, language in pending:
+            results[i] = (current_text, None, language)
+        
+        if config.MAX_OUTPUT_CHARS or config.MAX_OUTPUT_TOKENS:
+            results = [None if result is None else self.limit_output(*result) for result in results]
+                
+        return results
+
+    def clean_column(self, column, batch_size: int = None, chunk_size: int = 10000):
+        """
+        Cleans a pandas Series or pyarrow string Array / ChunkedArray, ``chunk_size`` texts at a time.
+        Returns a pandas DataFrame with the same index, or a pyarrow Table, with the lm_text,
+        stat_text and language columns the config gives (as for the tuples of ``process_batch``).
+        Nulls stay null and empty texts give empty strings, both are never processed.
+        Steps with an Arrow compute equivalent run vectorized over the chunk where their
+        semantics allow it, NER runs batched and the other steps run text by text.
+        """
+        array, index = columnar.to_arrow(column)
+        tables = [self.clean_arrow(array.slice(start, chunk_size), batch_size)
+                  for start in range(0, len(array), chunk_size)]
+        table = columnar.pa.concat_tables(tables) if tables else self.clean_arrow(array, batch_size)
+        
+        if index is None:
+            return table
+        frame = table.to_pandas()
+        frame.index = index
+        return frame
+
+    def clean_arrow(self, array, batch_size: int = None):
+        """Cleans a large_string pyarrow Array, see ``clean_column``."""
+        pa, pc = columnar.pa, columnar.pc
+        nulls = pc.is_null(array)
+        keep = pc.invert(pc.or_(pc.fill_null(pc.utf8_is_space(array), True), pc.equal(pc.utf8_length(array), 0)))
+        keep = pc.fill_null(keep, False)
+        texts = pc.filter(array, keep)
+        
+        cleaned = None
+        if (config.MAX_WINDOW_CHARS or config.MAX_INPUT_CHARS or config.MAX_OUTPUT_CHARS or config.MAX_OUTPUT_TOKENS
+                or self.checkpoints is not None):
+            # windows, input and output limits and checkpoints are handled per text by clean_batch
+            cleaned = self.clean_batch(texts.to_pylist(), batch_size)
+        else:
+            try:
+                values, languages = self.clean_texts_columnar(texts, batch_size)
+                lm_windows = [None] * len(values)
+            except regexengine.RegexTimeoutError:
+                # clean_batch applies config.REGEX_TIMEOUT_POLICY text by text
+                cleaned = self.clean_batch(texts.to_pylist(), batch_size)
+        if cleaned is not None:
+            # a skipped text gives an empty string, like an empty one
+            cleaned = [("", None, None) if result is None else result for result in cleaned]
+            values = [current_text for current_text, _, _ in cleaned]
+            languages = [language for _, _, language in cleaned]
+            lm_windows = [windows for _, windows, _ in cleaned]
+        
+        def scatter(processed):
+            # puts the processed values back at the rows they came from, nulls elsewhere
+            return pc.replace_with_mask(pa.nulls(len(array), pa.large_string()), keep,
+                                        pa.array(processed, pa.large_string()))
+        
+        def restore(column):
+            # empty strings for the empty texts, and nulls where the input is null
+            return pc.if_else(nulls, pa.scalar(None, pa.large_string()), pc.fill_null(column, ""))
+        
+        columns = {"lm_text": restore(scatter(values))}
+        shape = self.result_shape()
+        if shape == 3:
+            columns["stat_text"] = restore(scatter([
+                self.statistical_model_processing(current_text, language) if windows is None
+                else self.windows_stat_text(windows, language)
+                for current_text, language, windows in zip(values, languages, lm_windows)
+            ]))
+        if shape >= 2:
+            columns["language"] = scatter(languages)
+        return pa.table(columns)
+
+    def clean_texts_columnar(self, texts, batch_size: int = None):
+        """
+        Runs the pipeline step by step over a pyarrow Array of non empty texts, vectorized
+        where possible. Returns the cleaned texts and their languages as lists.
+        """
+        values = None  # the texts as a list, once a step had to run text by text
+        languages = [self.configured_language] * len(texts)
+        for stage in self.stages():
+            if stage == self.detect_language:
+                values = texts.to_pylist() if values is None else values
+                languages = []
+                for text in values:
+                    self.detect_language(text)
+                    languages.append(self.language)
+            elif stage == self.ner_process:
+                values = texts.to_pylist() if values is None else values
+                values = self.GeneralNER.process_batch(
+                    values,
+                    batch_size=batch_size or self.batch_size,
                     positional_tags=config.POSITIONAL_TAGS,
                     ner_confidence_threshold=config.NER_CONFIDENCE_THRESHOLD,
-                    language=self.language
+                    language=languages
                 )
-            
-            # Format results
-            if config.CHECK_STATISTICAL_MODEL_PROCESSING:
-                stext = self.statistical_model_processing(current_text)
-                results.append((current_text, stext, self.language))
-            elif config.CHECK_DETECT_LANGUAGE:
-                results.append((current_text, self.language))
             else:
-                results.append(current_text)
-                
+                vectorized = columnar.ARROW_STAGES.get(stage.__name__)
+                if vectorized is not None:
+                    current = texts if values is None else columnar.pa.array(values, columnar.pa.large_string())
+                    result = vectorized(current)
+                    if result is not None:
+                        texts, values = result, None
+                        continue
+                    texts, values = current, None
+                values = [stage(text) for text in (texts.to_pylist() if values is None else values)]
+        return (texts.to_pylist() if values is None else values), languages
+
+    def clean_short_texts(self, items: List[Tuple[int, str]]) -> List[Tuple[int, str, str]]:
+        """
+        Cleans (index, text) items up to NER like ``clean_text``, but runs every sequence of
+        batch-safe stages once over the texts joined with ``stages.BATCH_SEPARATOR`` instead of
+        once per text, which spreads the per-call overhead of short texts over the batch.
+        Returns the (index, text, language) items, without the ones skipped by ``regex_timeout``.
+        """
+        texts = [text for _, text in items]
+        languages = [self.configured_language] * len(texts)
+        steps = [step for step in self.pipeline if step != self.ner_process]
+        # a NUL in a text could form a separator with the one after it, those run on their own
+        joinable = [j for j, text in enumerate(texts) if "\x00" not in text]
+        
+        k = 0
+        while k < len(steps):
+            if steps[k].__name__ in self.batch_safe:
+                run = []
+                while k < len(steps) and steps[k].__name__ in self.batch_safe:
+                    run.append(steps[k])
+                    k += 1
+                joined = stages.BATCH_SEPARATOR.join(texts[j] for j in joinable)
+                try:
+                    for step in run:
+                        joined = self.run_stage(step, joined)
+                except regexengine.RegexTimeoutError:
+                    # some text of the batch is pathological, the texts run one by one to find it
+                    joinable = []
+                else:
+                    for j, text in zip(joinable, joined.split(stages.BATCH_SEPARATOR)):
+                        texts[j] = text
+                for j in set(range(len(texts))).difference(joinable):
+                    texts[j] = self.run_guarded(run, texts[j])
+                joinable = [j for j, text in enumerate(texts) if text is not None and "\x00" not in text]
+                continue
+            if steps[k] == self.detect_language:
+                for j, text in enumerate(texts):
+                    if text is not None:
+                        self.detect_language(text)
+                        languages[j] = self.language
+            else:
+                texts = [self.run_guarded([steps[k]], text) for text in texts]
+            k += 1
+        
+        return [(i, text, language) for (i, _), text, language in zip(items, texts, languages) if text is not None]
+
+    def run_guarded(self, steps, text: Optional[str]) -> Optional[str]:
+        """
+        Applies ``steps`` to ``text``, returns None for a text which is None already or whose
+        cleaning hits ``config.REGEX_TIMEOUT`` and is skipped by ``regex_timeout``.
+        """
+        if text is None:
+            return None
+        try:
+            for step in steps:
+                text = self.run_stage(step, text)
+        except regexengine.RegexTimeoutError as e:
+            self.regex_timeout(e)
+            return None
+        return text
+
+    def regex_timeout(self, error: regexengine.RegexTimeoutError) -> None:
+        """
+        Applies ``config.REGEX_TIMEOUT_POLICY`` to a text whose cleaning ran longer than ``config.REGEX_TIMEOUT``
+        in a pattern: 'skip' leaves it out of the results like an empty text and 'error' raises the error.
+        """
+        policy = config.REGEX_TIMEOUT_POLICY
+        if policy == 'skip':
+            logger.warning(f"Skipping a text: {error}")
+            return
+        if policy == 'error':
+            raise error
+        raise ValueError(f"Unknown REGEX_TIMEOUT_POLICY {policy!r}")
+
+    def stages(self) -> List[Any]:
+        """The pipeline steps in the order ``clean_text`` applies them, NER last."""
+        stages = [step for step in self.pipeline if step != self.ner_process]
+        if config.CHECK_NER_PROCESS:
+            stages.append(self.ner_process)
+        return stages
+
+    def resume_checkpoints(self, items: List[Tuple[int, str]]):
+        """
+        Cleans (index, text) items up to NER, each resumed from the deepest stage of
+        ``config.CHECKPOINT_STAGES`` stored for its input and the current config, and stores
+        the outputs of the checkpointed stages it runs.
+        Returns the finished (index, lm_text, language) items, the ones still waiting for NER
+        and the checkpoint key of the NER output of the latter, by index.
+        """
+        stages = self.stages()
+        names = [stage.__name__ for stage in stages]
+        ner = getattr(self, "GeneralNER", None)
+        models = ner.model_versions() if "ner_process" in names and hasattr(ner, "model_versions") else None
+        fingerprints = checkpoint.stage_fingerprints(names, models)
+        saved_at = [k for k, name in enumerate(names) if name in config.CHECKPOINT_STAGES]
+        keys = {(i, k): checkpoint.checkpoint_key(fingerprints[k], text) for i, text in items for k in saved_at}
+        found = self.checkpoints.load(keys.values())
+        
+        finished, pending, ner_keys, new = [], [], {}, []
+        for i, text in items:
+            start, self.language = 0, self.configured_language
+            for k in reversed(saved_at):
+                if keys[i, k] in found:
+                    text, self.language = found[keys[i, k]]
+                    start = k + 1
+                    break
+            self.checkpoints.hits += start > 0
+            self.checkpoints.misses += start == 0
+            if metrics.active():
+                metrics.CACHE_REQUESTS.inc(cache="checkpoint", result="hit" if start > 0 else "miss")
+            
+            try:
+                for k in range(start, len(stages)):
+                    if stages[k] == self.ner_process:
+                        # NER runs batched over all the pending texts
+                        pending.append((i, text, self.language))
+                        if k in saved_at:
+                            ner_keys[i] = keys[i, k]
+                        break
+                    text = self.run_stage(stages[k], text)
+                    if k in saved_at:
+                        new.append((keys[i, k], text, self.language))
+                else:
+                    finished.append((i, text, self.language))
+            except regexengine.RegexTimeoutError as e:
+                self.regex_timeout(e)
+        
+        self.checkpoints.save(new)
+        return finished, pending, ner_keys
+
+    def process_file(self, path, start: int = 0, stop: int = None, chunk_size: int = 1000,
+                     batch_size: int = None) -> Iterator[Any]:
+        """
+        Yields the results for lines ``start`` to ``stop`` of a file with one text per line, read
+        ``chunk_size`` lines at a time through a memory-mapped line index (see ``reader.LineIndexedFile``).
+        """
+        with reader.LineIndexedFile(path) as lines:
+            for texts in lines.batches(chunk_size, start, stop):
+                yield from self.process_batch(texts, batch_size)
+
+    def process_corpus(self, texts: List[str], batch_size: int = None, drop_boilerplate: bool = None,
+                       detector: boilerplate.BoilerplateDetector = None) -> List[Any]:
+        """
+        Processes a corpus whose documents share boilerplate such as disclaimers, signatures and footers.
+        Blocks repeated across documents are detected in a first pass, then every distinct segment is
+        cleaned once and spliced into each document containing it. With ``drop_boilerplate``
+        (default config.DROP_BOILERPLATE) the repeated blocks are left out of the results instead.
+        The language of a document is the one of its longest segment which isn't boilerplate.
+        """
+        drop_boilerplate = config.DROP_BOILERPLATE if drop_boilerplate is None else drop_boilerplate
+        if detector is None:
+            detector = boilerplate.BoilerplateDetector(
+                min_count=config.BOILERPLATE_MIN_COUNT,
+                min_chars=config.BOILERPLATE_MIN_CHARS,
+                unit=config.BOILERPLATE_UNIT
+            )
+        
+        documents = []
+        for text in texts:
+            if not isinstance(text, str):
+                raise ValueError(f"Input must be string, got {type(text)}")
+            if config.MAX_INPUT_CHARS and len(text) > config.MAX_INPUT_CHARS:
+                text = self.limit_input(text) or ""
+            documents.append(text)
+        detector.fit(documents)
+        
+        segments = {}  # distinct segment -> its index in the batch
+        layouts = []  # per document (segment index, separator, is boilerplate)
+        for text in documents:
+            layout = []
+            for segment, separator, is_boilerplate in detector.segment(text):
+                if not segment.strip() or (is_boilerplate and drop_boilerplate):
+                    continue
+                layout.append((segments.setdefault(segment, len(segments)), separator, is_boilerplate))
+            layouts.append(layout)
+        
+        cleaned = self.clean_batch(list(segments), batch_size)
+        
+        results = []
+        for layout in layouts:
+            lm_parts, language, longest = [], None, -1
+            for index, separator, is_boilerplate in layout:
+                if cleaned[index] is None:
+                    continue
+                current_text, _, segment_language = cleaned[index]
+                lm_parts.append(current_text if config.CHECK_NORMALIZE_WHITESPACE else current_text + separator)
+                weight = len(current_text) if not is_boilerplate else -1
+                if language is None or weight > longest:
+                    language, longest = segment_language, weight
+            
+            lm_parts = [part for part in lm_parts if part]
+            if not lm_parts:
+                results.append(self.empty_result())
+                continue
+            self.language = language
+            current_text = self.window_separator().join(lm_parts)
+            if config.MAX_OUTPUT_CHARS or config.MAX_OUTPUT_TOKENS:
+                # the segments are limited on their own, the document as a whole still has to be
+                current_text, lm_parts, _ = self.limit_output(current_text, lm_parts, language)
+            results.append(self.format_result(current_text, lm_parts))
         return results
 
+    def format_result(self, current_text: str, lm_windows: List[str] = None) -> Any:
+        """
+        Shapes the output of one text according to the config. ``lm_windows`` are the cleaned
+        windows of a windowed document, the statistical model text is then built per window.
+        """
+        language = self.language
+        if lm_windows is None:
+            stat_fn = lambda: self.statistical_model_processing(current_text, language)
+        else:
+            stat_fn = lambda: self.windows_stat_text(lm_windows, language)
+        
+        if config.RETURN_RESULT_OBJECTS and self.result_shape() > 1:
+            # a plain string result has nothing to compute lazily, it stays a str
+            return CleanResult(current_text, language=language, stat_fn=stat_fn, shape=self.result_shape())
+        if config.CHECK_STATISTICAL_MODEL_PROCESSING:
+            return (current_text, stat_fn(), language)
+        elif config.CHECK_DETECT_LANGUAGE:
+            return (current_text, language)
+        return current_text
+
+    def result_shape(self) -> int:
+        """Length of the result tuple for the current config, 1 for a plain string."""
+        if config.CHECK_STATISTICAL_MODEL_PROCESSING:
+            return 3
+        return 2 if config.CHECK_DETECT_LANGUAGE else 1
+
+    def empty_result(self) -> Any:
+        """Result for an empty or skipped input."""
+        if config.RETURN_RESULT_OBJECTS:
+            shape = self.result_shape()
+            return CleanResult("", stat_text="", language=None, shape=shape) if shape > 1 else ""
+        return ("", "", None)
+
+    def clean_text(self, text: str, detect_language: bool = True, ner: bool = True) -> str:
+        """Runs the language model pipeline over a single text."""
+        current_text = text
+        
+        # Apply non-NER pipeline steps
+        for step in self.pipeline:
+            if step == self.ner_process or (step == self.detect_language and not detect_language):
+                continue
+            current_text = self.run_stage(step, current_text)
+        
+        # NER processing if enabled, on the otherwise cleaned text
+        if ner and config.CHECK_NER_PROCESS:
+            current_text = self.GeneralNER.ner_process(
+                current_text,
+                positional_tags=config.POSITIONAL_TAGS,
+                ner_confidence_threshold=config.NER_CONFIDENCE_THRESHOLD,
+                language=self.language
+            )
+        return current_text
+
+    def run_stage(self, stage, text: str) -> str:
+        """Applies a pipeline stage, timing it when metrics are collected."""
+        if not metrics.active():
+            return stage(text)
+        start = time.perf_counter()
+        text = stage(text)
+        metrics.STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage.__name__)
+        return text
+
+    def process_windows(self, text: str):
+        """
+        Processes a large document window by window, keeping peak memory bounded by
+        ``config.MAX_WINDOW_CHARS`` instead of the document size. The language is
+        detected on the first window and reused for the rest.
+        Returns the stitched language model text and the cleaned windows.
+        """
+        lm_parts = []
+        for i, window in enumerate(self.WindowSplitter.windows(text, config.MAX_WINDOW_CHARS)):
+            if not window.strip():
+                continue
+            lm_parts.append(self.clean_text(window, detect_language=(i == 0 or self.language is None)))
+        
+        return self.window_separator().join(lm_parts), lm_parts
+
+    def budget_window_chars(self) -> Optional[int]:
+        """
+        Window size for documents processed under ``config.MAX_OUTPUT_CHARS`` / ``config.MAX_OUTPUT_TOKENS``,
+        enough input for the whole output budget in most cases, None without a budget.
+        """
+        sizes = []
+        if config.MAX_OUTPUT_CHARS:
+            sizes.append(config.MAX_OUTPUT_CHARS * self.BUDGET_CHARS_PER_CHAR)
+        if config.MAX_OUTPUT_TOKENS:
+            sizes.append(config.MAX_OUTPUT_TOKENS * self.BUDGET_CHARS_PER_TOKEN)
+        if not sizes:
+            return None
+        return min(sizes + [config.MAX_WINDOW_CHARS or sizes[0]])
+
+    def process_budgeted(self, text: str, window_chars: int) -> str:
+        """
+        Processes a document window by window, in order, until the cleaned output fills the output
+        budget. The rest of the document is never cleaned nor run through NER. The language is
+        detected on the first window, as for ``process_windows``. Returns the language model text,
+        which may still exceed the budget, see ``limit_output``.
+        """
+        lm_parts, chars, tokens = [], 0, 0
+        for i, window in enumerate(self.WindowSplitter.windows(text, window_chars)):
+            if not window.strip():
+                continue
+            lm_part = self.clean_text(window, detect_language=(i == 0 or self.language is None))
+            lm_parts.append(lm_part)
+            chars += len(lm_part) + len(self.window_separator())
+            if config.MAX_OUTPUT_TOKENS:
+                tokens += self.count_tokens(lm_part)
+            if (config.MAX_OUTPUT_CHARS and chars >= config.MAX_OUTPUT_CHARS) or (
+                    config.MAX_OUTPUT_TOKENS and tokens >= config.MAX_OUTPUT_TOKENS):
+                break
+        return self.window_separator().join(lm_parts)
+
+    def count_tokens(self, text: str) -> int:
+        """Tokens of ``text`` for ``config.MAX_OUTPUT_TOKENS``, counted with the NER tokenizer."""
+        return len(self.GeneralNER.tokenizer(text, add_special_tokens=False)["input_ids"])
+
+    def limit_output(self, current_text: str, lm_windows: Optional[List[str]], language: str):
+        """
+        Cuts a cleaned (text, windows, language) result to ``config.MAX_OUTPUT_CHARS`` characters at a
+        safe boundary and to ``config.MAX_OUTPUT_TOKENS`` tokens at a word boundary. A cut result
+        loses its windows, its statistical model text is built from the cut text.
+        """
+        limited = current_text
+        if config.MAX_OUTPUT_CHARS and len(limited) > config.MAX_OUTPUT_CHARS:
+            limited = self.WindowSplitter.truncate(limited, config.MAX_OUTPUT_CHARS).rstrip()
+        if config.MAX_OUTPUT_TOKENS:
+            offsets = self.GeneralNER.tokenizer(
+                limited, add_special_tokens=False, return_offsets_mapping=True)["offset_mapping"]
+            if len(offsets) > config.MAX_OUTPUT_TOKENS:
+                cut = offsets[config.MAX_OUTPUT_TOKENS][0]
+                if cut > 0 and not limited[cut - 1].isspace():
+                    # the first token left out continues a word, leave out the whole word
+                    start = cut
+                    while start > 0 and not limited[start - 1].isspace():
+                        start -= 1
+                    cut = start or cut
+                limited = limited[:cut].rstrip()
+        if len(limited) == len(current_text):
+            return current_text, lm_windows, language
+        return limited, None, language
+
+    def window_separator(self) -> str:
+        return " " if config.CHECK_NORMALIZE_WHITESPACE else ""
+
+    def windows_stat_text(self, lm_windows: List[str], language: str = None) -> str:
+        """Statistical model text of a windowed document, processed window by window."""
+        return self.window_separator().join(
+            self.statistical_model_processing(lm_window, language) for lm_window in lm_windows)
+
+    def limit_input(self, text: str):
+        """
+        Applies ``config.INPUT_OVERFLOW_POLICY`` to a text longer than ``config.MAX_INPUT_CHARS``:
+        'truncate' cuts it at the last safe boundary, 'skip' returns None and 'error' raises ValueError.
+        """
+        policy = config.INPUT_OVERFLOW_POLICY
+        if policy == 'truncate':
+            return self.WindowSplitter.truncate(text, config.MAX_INPUT_CHARS)
+        if policy == 'skip':
+            return None
+        if policy == 'error':
+            raise ValueError(f"Input of {len(text)} characters exceeds MAX_INPUT_CHARS={config.MAX_INPUT_CHARS}")
+        raise ValueError(f"Unknown INPUT_OVERFLOW_POLICY {policy!r}")
+
     def process(self, text: str) -> Any:
         """Process a single text. Maintains backward compatibility."""
         return self.process_batch([text])[0]
 
     def detect_language(self, text):
-        self.language = str(resources.DETECTOR.detect_language_of(text)).split(".")[-1]
+        self.language, self.language_confidence = self.language_of(text)
         return text
 
+    def language_of(self, text: str) -> Tuple[str, float]:
+        """The detected language name of ``text`` and its confidence, between 0 and 1."""
+        language, confidence = self.LanguageDetector.detect(text)
+        return str(language).split(".")[-1], confidence
+
     def fix_bad_unicode(self, text):
         return self.NormaliseText.fix_bad_unicode(text)
 
@@ -153,11 +737,12 @@ class TextCleaner:
     def normalize_whitespace(self, text):
         return self.NormaliseText.normalize_whitespace(text, no_line_breaks=True)
 
-    def statistical_model_processing(self, text):
+    def statistical_model_processing(self, text, language=None):
+        stext = text
         if config.CHECK_CASEFOLD:
-            stext = text.casefold()  # lowercase
+            stext = stext.casefold()  # lowercase
         if config.CHECK_REMOVE_STOPWORDS:
-            stext = self.ProcessStopwords.remove_stopwords(stext, self.language)
+            stext = self.ProcessStopwords.remove_stopwords(stext, language or self.language)
         if config.CHECK_REMOVE_PUNCTUATION:
             stext = self.ProcessSpecialSymbols.remove_punctuation(stext)
         if config.CHECK_REMOVE_ISOLATED_LETTERS:
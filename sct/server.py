@@ -0,0 +1,345 @@
+"""
+Local HTTP cleaning server, started with ``sct serve``.
+
+The models are loaded once in the parent process which then forks the workers, so the
+weights are shared copy-on-write instead of being loaded N times. Each worker accepts
+connections on the shared listening socket and micro-batches concurrent requests into
+``TextCleaner.process_batch`` calls.
+
+Endpoints:
+    POST /clean        {"text": "..."}          -> {"result": {...}}
+    POST /clean/batch  {"texts": ["...", ...]}  -> {"results": [{...}, ...]}
+    GET  /health       liveness
+    GET  /ready        readiness, with the loaded models
+    GET  /metrics      Prometheus metrics summed over the workers, see sct.utils.metrics
+
+Request bodies over ``max_body_bytes`` and batches of more than ``max_texts`` texts are
+rejected with 413.
+"""
+import gc
+import os
+import collections
+import json
+import shutil
+import tempfile
+import time
+import queue
+import signal
+import logging
+import threading
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, List
+
+from sct import config
+from sct.utils import metrics
+from sct.utils.result import result_to_json
+
+logger = logging.getLogger(__name__)
+
+
+class RequestTooLarge(Exception):
+    """A request body or batch over the server limits, answered with 413."""
+
+
+class MicroBatcher:
+    """
+    Collects texts submitted from many handler threads and cleans them together, flushing
+    when ``max_batch_size`` texts are queued or ``max_wait`` seconds after the first one.
+    """
+
+    def __init__(self, cleaner, max_batch_size: int = 32, max_wait: float = 0.01, metrics_dir: str = None):
+        self.cleaner = cleaner
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.metrics_dir = metrics_dir
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, name="sct-batcher", daemon=True)
+        self._thread.start()
+
+    @property
+    def running(self) -> bool:
+        return self._thread.is_alive()
+
+    def submit(self, texts: List[str]) -> List[Any]:
+        """Blocks until ``texts`` are cleaned, possibly together with other requests."""
+        futures = []
+        for text in texts:
+            future = Future()
+            self._queue.put((text, future))
+            futures.append(future)
+        return [future.result() for future in futures]
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            texts = [text for text, _ in batch]
+            try:
+                results = self.cleaner.process_batch(texts)
+            except Exception:
+                # isolate the failing text(s) instead of failing every request in the batch
+                results = []
+                for text in texts:
+                    try:
+                        results.append(self.cleaner.process_batch([text])[0])
+                    except Exception as e:
+                        results.append(e)
+            for (_, future), result in zip(batch, results):
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+            if self.metrics_dir and metrics.active():
+                metrics.dump(self.metrics_dir)
+
+
+class CleaningRequestHandler(BaseHTTPRequestHandler):
+    """Serves the cleaning endpoints, ``self.server`` carries the batcher and the cleaner."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def send_json(self, status: int, payload: dict):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length < 0:
+            raise ValueError(f"Invalid Content-Length {length}")
+        if length > self.server.max_body_bytes:
+            raise RequestTooLarge(f"Request body of {length} bytes, the limit is {self.server.max_body_bytes}")
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        if self.path == "/health":
+            self.send_json(200, {"status": "ok", "pid": os.getpid()})
+        elif self.path == "/ready":
+            ready = self.server.batcher is not None and self.server.batcher.running
+            self.send_json(200 if ready else 503, {
+                "ready": ready,
+                "pid": os.getpid(),
+                "models": loaded_models(self.server.cleaner),
+            })
+        elif self.path == "/metrics":
+            body = metrics.prometheus_text(self.server.metrics_dir).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self.send_json(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        try:
+            payload = self.read_json()
+            if self.path == "/clean":
+                texts = [payload["text"]]
+            elif self.path == "/clean/batch":
+                texts = payload["texts"]
+            else:
+                self.send_json(404, {"error": f"Unknown path {self.path}"})
+                return
+            if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+                raise ValueError("Texts must be strings")
+            if len(texts) > self.server.max_texts:
+                raise RequestTooLarge(f"{len(texts)} texts, the limit is {self.server.max_texts}")
+        except RequestTooLarge as e:
+            # the body may not have been read, the connection can't be reused
+            self.close_connection = True
+            self.send_json(413, {"error": str(e)})
+            return
+        except (ValueError, KeyError, TypeError) as e:
+            self.send_json(400, {"error": f"Invalid request: {e}"})
+            return
+
+        try:
+            results = [result_to_json(result) for result in self.server.batcher.submit(texts)]
+        except Exception as e:
+            logger.exception("Cleaning failed")
+            self.send_json(500, {"error": str(e)})
+            return
+
+        if self.path == "/clean":
+            self.send_json(200, {"result": results[0]})
+        else:
+            self.send_json(200, {"results": results})
+
+
+def loaded_models(cleaner) -> dict:
+    """Names of the NER models held by ``cleaner``, by language key."""
+    ner = getattr(cleaner, "GeneralNER", None)
+    if ner is None or not hasattr(ner, "loaded_models"):
+        return {}
+    return ner.loaded_models()
+
+
+def make_server(cleaner, host: str = "127.0.0.1", port: int = 8000, max_body_bytes: int = 10 * 2 ** 20,
+                max_texts: int = 1000):
+    """
+    Creates the HTTP server for ``cleaner``. The batcher thread is started by ``start_worker``
+    in the process which serves, as threads don't survive a fork.
+    """
+    server = ThreadingHTTPServer((host, port), CleaningRequestHandler)
+    server.daemon_threads = True
+    server.cleaner = cleaner
+    server.batcher = None
+    server.max_body_bytes = max_body_bytes
+    server.max_texts = max_texts
+    server.metrics_dir = None
+    return server
+
+
+def start_worker(server, max_batch_size: int = 32, max_wait: float = 0.01):
+    """Starts the micro-batcher of ``server`` in the current process."""
+    server.batcher = MicroBatcher(server.cleaner, max_batch_size=max_batch_size, max_wait=max_wait,
+                                  metrics_dir=server.metrics_dir)
+    return server
+
+
+def serve(host: str = "127.0.0.1", port: int = 8000, workers: int = 1, threads: int = None,
+          max_batch_size: int = 32, max_wait: float = 0.01, cleaner=None, max_body_bytes: int = 10 * 2 ** 20,
+          max_texts: int = 1000, max_restarts: int = 5, restart_window: float = 60.0, restart_backoff: float = 1.0):
+    """
+    Loads the models once, then serves with ``workers`` forked processes sharing them.
+    Returns the exit status, 1 when the workers kept dying, see ``run_workers``.
+    Args:
+        workers: number of worker processes, forced to 1 on CUDA as it can't be forked
+        threads: torch intra-op threads per worker, default cpu count / workers
+        max_batch_size: texts per batch
+        max_wait: seconds a request waits for others to join its batch
+        max_body_bytes: larger request bodies are rejected with 413
+        max_texts: batch requests with more texts are rejected with 413
+        max_restarts: worker restarts allowed within ``restart_window`` seconds
+        restart_backoff: seconds before the first restart, doubled for each further one in the window
+    """
+    if cleaner is None:
+        from sct.sct import TextCleaner
+        cleaner = TextCleaner()
+
+    device = getattr(getattr(cleaner, "GeneralNER", None), "device", "cpu")
+    if workers > 1 and device == "cuda":
+        logger.warning("CUDA can't be shared with forked workers, serving with a single worker")
+        workers = 1
+    threads = threads or max(1, (os.cpu_count() or 1) // workers)
+
+    server = make_server(cleaner, host, port, max_body_bytes=max_body_bytes, max_texts=max_texts)
+    logger.info(f"Serving on http://{host}:{server.server_address[1]} with {workers} worker(s)")
+    return run_workers(server, workers, threads, max_batch_size, max_wait, max_restarts=max_restarts,
+                       restart_window=restart_window, restart_backoff=restart_backoff)
+
+
+def run_workers(server, workers: int = 1, threads: int = 1, max_batch_size: int = 32, max_wait: float = 0.01,
+                max_restarts: int = 5, restart_window: float = 60.0, restart_backoff: float = 1.0):
+    """
+    Serves ``server`` in this process, or with more than one worker from forked processes,
+    restarting those which exit until SIGTERM or SIGINT stops them all.
+    A restart waits ``restart_backoff`` seconds, doubled for every other restart in the last
+    ``restart_window`` seconds. When a worker exits after ``max_restarts`` restarts within the
+    window, the others are stopped too and 1 is returned instead of 0.
+    """
+    import torch
+
+    if workers == 1:
+        torch.set_num_threads(threads)
+        start_worker(server, max_batch_size, max_wait)
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+        return 0
+
+    if config.COLLECT_METRICS:
+        # the workers dump their metrics here so any of them can report the totals, the
+        # parent dumps what loading the models counted and each worker starts from zero
+        server.metrics_dir = tempfile.mkdtemp(prefix="sct-metrics-")
+        metrics.dump(server.metrics_dir)
+
+    # move everything loaded so far out of the collector's reach, so the
+    # children don't touch (and copy) the pages holding the model objects
+    gc.collect()
+    gc.freeze()
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            metrics.REGISTRY.reset()
+            torch.set_num_threads(threads)
+            start_worker(server, max_batch_size, max_wait)
+            try:
+                server.serve_forever()
+            finally:
+                os._exit(0)
+        return pid
+
+    children = {spawn() for _ in range(workers)}
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    restarts = collections.deque()
+    failed = False
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        children.discard(pid)
+        if stopping:
+            continue
+        now = time.monotonic()
+        while restarts and restarts[0] <= now - restart_window:
+            restarts.popleft()
+        if len(restarts) >= max_restarts:
+            logger.error(f"Worker {pid} exited with status {status} after {len(restarts)} restarts "
+                         f"within {restart_window}s, stopping")
+            failed = True
+            stop(None, None)
+            continue
+        delay = restart_backoff * 2 ** len(restarts)
+        logger.warning(f"Worker {pid} exited with status {status}, restarting in {delay:.1f}s")
+        # in short sleeps, so a SIGTERM during the back-off isn't held up
+        deadline = now + delay
+        while not stopping and time.monotonic() < deadline:
+            time.sleep(min(0.1, deadline - time.monotonic()))
+        if not stopping:
+            restarts.append(time.monotonic())
+            children.add(spawn())
+    server.server_close()
+    if server.metrics_dir:
+        shutil.rmtree(server.metrics_dir, ignore_errors=True)
+    return 1 if failed else 0
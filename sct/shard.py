@@ -0,0 +1,276 @@
+"""
+Deterministic sharding of a corpus file for cleaning it on several machines without coordination.
+
+Every worker opens the same input file and computes its own share of the lines, either a
+contiguous byte range (``by="bytes"``) or the lines whose content hashes to it (``by="hash"``,
+which reads the whole file but keeps duplicates on one shard). It cleans them with a
+``BatchRunner``, so a restarted worker resumes, and writes a manifest once it is done,
+with a digest of the bytes of its lines. The merge checks that all shards cleaned the same
+input with the same config and models, and given the input file that every shard cleaned
+its content, then interleaves their results back into the original line order.
+
+    output_dir/
+        shard-00000-of-00004/
+            plan.json        the shard and input it was started for, checked on resume
+            lines.npy        input line numbers of the shard, ascending
+            journal.jsonl    segment-*.jsonl ...    the BatchRunner job
+            manifest.json    written once the shard is complete
+"""
+import os
+import json
+import hashlib
+import logging
+import importlib.metadata
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+import numpy as np
+
+from sct.runner import BatchRunner, write_lines
+from sct.utils.reader import LineIndexedFile
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 2
+STRATEGIES = ("bytes", "hash")
+
+# manifest fields which must be the same on every shard for the results to be merged
+CONSISTENT_FIELDS = ("version", "num_shards", "by", "input", "fingerprint", "models", "libraries")
+
+
+def line_hash(text: str) -> int:
+    """Hash of a line which, unlike ``hash``, is the same in every process and on every machine."""
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=8).digest(), "little")
+
+
+def input_fingerprint(corpus: LineIndexedFile) -> Dict[str, Any]:
+    """
+    Identifies the input by its size, line offsets and a digest of sampled blocks of its content,
+    copies on other machines have other mtimes. ``shard_digest`` covers the rest of the content.
+    """
+    digest = hashlib.blake2b(np.ascontiguousarray(corpus.offsets).tobytes(), digest_size=16).hexdigest()
+    return {"lines": len(corpus), "size": corpus.size, "digest": digest, "sample": corpus.sampled_digest()}
+
+
+def shard_digest(corpus: LineIndexedFile, lines: np.ndarray, block_lines: int = 100000) -> str:
+    """Hex digest of the bytes of the ascending ``lines``, read in runs of consecutive lines."""
+    digest = hashlib.blake2b(digest_size=16)
+    if len(lines):
+        breaks = np.flatnonzero(np.diff(lines) != 1) + 1
+        starts = lines[np.concatenate(([0], breaks))]
+        stops = lines[np.concatenate((breaks - 1, [len(lines) - 1]))] + 1
+        for start, stop in zip(starts.tolist(), stops.tolist()):
+            for block_start in range(start, stop, block_lines):
+                digest.update(corpus.raw(block_start, min(block_start + block_lines, stop)))
+    return digest.hexdigest()
+
+
+def shard_lines(corpus: LineIndexedFile, shard: int, num_shards: int, by: str = "bytes",
+                batch_size: int = 10000) -> np.ndarray:
+    """The ascending line numbers assigned to ``shard`` out of ``num_shards``."""
+    if not 0 <= shard < num_shards:
+        raise ValueError(f"Shard {shard} out of range for {num_shards} shards")
+    if by == "bytes":
+        start, stop = corpus.split(num_shards, by="bytes")[shard]
+        return np.arange(start, stop, dtype=np.int64)
+    if by == "hash":
+        lines = []
+        for batch_start in range(0, len(corpus), batch_size):
+            batch = corpus.read(batch_start, batch_start + batch_size)
+            lines.extend(batch_start + i for i, text in enumerate(batch) if line_hash(text) % num_shards == shard)
+        return np.array(lines, dtype=np.int64)
+    raise ValueError(f"Unknown sharding {by!r}, expected one of {STRATEGIES}")
+
+
+def shard_dir(output_dir: Union[str, Path], shard: int, num_shards: int) -> Path:
+    return Path(output_dir) / f"shard-{shard:05d}-of-{num_shards:05d}"
+
+
+class ShardLines(Sequence):
+    """The texts of the lines ``indices`` of ``corpus``, read on access."""
+
+    def __init__(self, corpus: LineIndexedFile, indices: np.ndarray):
+        self.corpus = corpus
+        self.indices = indices
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self.corpus.line(int(self.indices[key]))
+        indices = self.indices[key]
+        if len(indices) and indices[-1] - indices[0] + 1 == len(indices):
+            return self.corpus.read(int(indices[0]), int(indices[-1]) + 1)  # contiguous, one read
+        return [self.corpus.line(int(i)) for i in indices]
+
+
+def _libraries() -> Dict[str, Optional[str]]:
+    versions = {}
+    for name in ("SqueakyCleanText", "transformers", "torch"):
+        try:
+            versions[name] = importlib.metadata.version(name)
+        except importlib.metadata.PackageNotFoundError:
+            versions[name] = None
+    return versions
+
+
+def run_shard(path: Union[str, Path], output_dir: Union[str, Path], shard: int, num_shards: int,
+              by: str = "bytes", cleaner=None, segment_size: int = 10000, chunk_size: int = 1000,
+              batch_size: int = None) -> Dict[str, Any]:
+    """Cleans the lines of ``path`` assigned to ``shard``, resuming a previous run. Returns the manifest."""
+    directory = shard_dir(output_dir, shard, num_shards)
+    runner = BatchRunner(directory, cleaner=cleaner, segment_size=segment_size, chunk_size=chunk_size,
+                         batch_size=batch_size)
+    with LineIndexedFile(path) as corpus:
+        plan = {"shard": shard, "num_shards": num_shards, "by": by, "input": input_fingerprint(corpus)}
+        plan_path = directory / "plan.json"
+        if plan_path.exists():
+            with open(plan_path, encoding="utf-8") as f:
+                if json.load(f) != plan:
+                    raise ValueError(f"{directory} holds a shard of another input or sharding, "
+                                     f"use a new output directory")
+        lines = shard_lines(corpus, shard, num_shards, by)
+        with open(directory / "lines.npy.tmp", "wb") as f:
+            np.save(f, lines)
+        os.replace(directory / "lines.npy.tmp", directory / "lines.npy")
+        write_lines(plan_path, [plan])
+
+        logger.info(f"Shard {shard} of {num_shards} has {len(lines)} of {len(corpus)} lines")
+        runner.run(ShardLines(corpus, lines))
+        journal = runner.read_journal()
+        manifest = {
+            "version": MANIFEST_VERSION,
+            **plan,
+            "lines": len(lines),
+            "texts": sum(entry["count"] for entry in journal.values()),
+            "errors": sum(entry["errors"] for entry in journal.values()),
+            "segments": len(journal),
+            "segment_size": segment_size,
+            "content_digest": shard_digest(corpus, lines),
+            "fingerprint": runner.header()["fingerprint"],
+            "models": runner.cleaner.GeneralNER.model_versions() if hasattr(runner.cleaner, "GeneralNER") else None,
+            "libraries": _libraries(),
+        }
+    if manifest["texts"] != manifest["lines"]:
+        raise RuntimeError(f"Shard {shard} cleaned {manifest['texts']} of its {manifest['lines']} lines")
+
+    manifest_path = directory / "manifest.json"
+    tmp_path = manifest_path.with_name(manifest_path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+    return manifest
+
+
+def load_manifests(output_dir: Union[str, Path]) -> List[Dict[str, Any]]:
+    """
+    Reads and cross-checks the manifests of the shards in ``output_dir``, raising ValueError
+    when a shard is missing or incomplete or the shards don't agree. Returns them by shard.
+    """
+    manifests = []
+    for manifest_path in sorted(Path(output_dir).glob("shard-*-of-*/manifest.json")):
+        with open(manifest_path, encoding="utf-8") as f:
+            manifests.append(json.load(f))
+    if not manifests:
+        raise ValueError(f"No finished shards in {output_dir}")
+
+    reference = manifests[0]
+    for manifest in manifests[1:]:
+        for field in CONSISTENT_FIELDS:
+            if manifest.get(field) != reference.get(field):
+                raise ValueError(f"Shards {reference['shard']} and {manifest['shard']} differ in {field}: "
+                                 f"{reference.get(field)} != {manifest.get(field)}")
+    shards = {manifest["shard"] for manifest in manifests}
+    missing = sorted(set(range(reference["num_shards"])) - shards)
+    if missing or len(manifests) != reference["num_shards"]:
+        raise ValueError(f"Missing or duplicate shards in {output_dir}, missing {missing}")
+    return sorted(manifests, key=lambda manifest: manifest["shard"])
+
+
+def _shard_results(directory: Path, manifest: Dict[str, Any]) -> Iterator[Optional[Dict[str, Any]]]:
+    # read the segment files directly, the merge doesn't need the config the shards ran with
+    for segment in range(manifest["segments"]):
+        with open(directory / f"segment-{segment:06d}.jsonl", encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+
+
+def verify_input(output_dir: Union[str, Path], manifests: List[Dict[str, Any]], path: Union[str, Path]) -> None:
+    """Raises ValueError unless every shard in ``output_dir`` cleaned the content of its lines of ``path``."""
+    with LineIndexedFile(path) as corpus:
+        if input_fingerprint(corpus) != manifests[0]["input"]:
+            raise ValueError(f"{path} is not the input the shards were started for")
+        for manifest in manifests:
+            lines = np.load(shard_dir(output_dir, manifest["shard"], manifest["num_shards"]) / "lines.npy")
+            if shard_digest(corpus, lines) != manifest["content_digest"]:
+                raise ValueError(f"Shard {manifest['shard']} cleaned other content than its lines of {path}")
+
+
+def merge_shards(output_dir: Union[str, Path],
+                 input_path: Union[str, Path] = None) -> Iterator[Optional[Dict[str, Any]]]:
+    """
+    Yields the results of all shards in ``output_dir`` in the line order of the input,
+    None for the lines which failed, after validating the manifests and line assignments
+    and, given the ``input_path``, the content every shard cleaned.
+    """
+    manifests = load_manifests(output_dir)
+    if input_path is not None:
+        verify_input(output_dir, manifests, input_path)
+    num_shards = manifests[0]["num_shards"]
+    total = manifests[0]["input"]["lines"]
+
+    # which shard holds each line, every line must be held by exactly one
+    owner = np.full(total, -1, dtype=np.int32)
+    for manifest in manifests:
+        lines = np.load(shard_dir(output_dir, manifest["shard"], num_shards) / "lines.npy")
+        if len(lines) != manifest["lines"] or (len(lines) and (lines.min() < 0 or lines.max() >= total)):
+            raise ValueError(f"Shard {manifest['shard']} lines don't match its manifest")
+        if (owner[lines] != -1).any():
+            raise ValueError(f"Shard {manifest['shard']} overlaps another shard")
+        owner[lines] = manifest["shard"]
+    if (owner == -1).any():
+        raise ValueError(f"{int((owner == -1).sum())} lines are in no shard")
+
+    iterators = [_shard_results(shard_dir(output_dir, manifest["shard"], num_shards), manifest)
+                 for manifest in manifests]
+    for shard in owner:
+        yield next(iterators[shard])
+    for manifest, iterator in zip(manifests, iterators):
+        if next(iterator, StopIteration) is not StopIteration:
+            raise ValueError(f"Shard {manifest['shard']} has more results than lines")
+
+
+def merge_errors(output_dir: Union[str, Path]) -> Iterator[Dict[str, Any]]:
+    """The failures of all shards with their input ``line`` number, by shard."""
+    manifests = load_manifests(output_dir)
+    for manifest in manifests:
+        directory = shard_dir(output_dir, manifest["shard"], manifest["num_shards"])
+        lines = np.load(directory / "lines.npy")
+        for path in sorted(directory.glob("segment-*.errors.jsonl")):
+            with open(path, encoding="utf-8") as f:
+                for record in map(json.loads, f):
+                    yield {"line": int(lines[record["index"]]), "shard": manifest["shard"], **record}
+
+
+def write_merged(output_dir: Union[str, Path], output_path: Union[str, Path],
+                 input_path: Union[str, Path] = None) -> int:
+    """
+    Writes the merged results to ``output_path`` as JSON lines, and the failures next to it.
+    Returns the count. See ``merge_shards`` for the ``input_path``.
+    """
+    output_path = Path(output_path)
+    count = 0
+
+    def counted():
+        nonlocal count
+        for result in merge_shards(output_dir, input_path):
+            count += 1
+            yield result
+
+    write_lines(output_path, counted())
+    errors = list(merge_errors(output_dir))
+    if errors:
+        write_lines(output_path.with_name(output_path.name + ".errors.jsonl"), errors)
+    return count
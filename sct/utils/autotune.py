@@ -0,0 +1,231 @@
+"""
+NER batch size autotuning, enabled with ``config.NER_AUTOTUNE``.
+
+The first large enough batch of chunks a model gets is used to probe growing batch sizes, measuring
+tokens per second and the peak memory of each. Probing stops once a larger batch size is no faster,
+runs out of memory or goes over the memory limit, and the fastest size is stored in a JSON file
+(``config.NER_AUTOTUNE_PATH``, default ``~/.cache/sct/autotune.json``) per host and model, so later
+runs on the same machine start with it. During a run the batch size is halved whenever a forward
+pass runs out of memory or takes the process from under the limit to over it. The halved size is
+kept for the rest of the process only, as memory may just have been short meanwhile.
+
+The peak memory of a run is the high water mark since it started: on CUDA after resetting the peak
+statistics, on Linux after resetting the resident set high water mark through /proc/self/clear_refs.
+Elsewhere it is the resident set sampled right after the run.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import logging
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import torch
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None  # Windows, the CPU memory isn't tracked
+
+logger = logging.getLogger(__name__)
+
+
+def default_path() -> Path:
+    return Path.home() / ".cache" / "sct" / "autotune.json"
+
+
+def host_key() -> str:
+    """Identifies the machine type the settings were tuned on, the host name and its cores."""
+    return f"{socket.gethostname()}-{os.cpu_count()}cpu"
+
+
+def is_out_of_memory(error: BaseException) -> bool:
+    return isinstance(error, MemoryError) or "out of memory" in str(error).lower()
+
+
+def memory_mb(device: str = "cpu", peak: bool = False) -> float:
+    """
+    Memory used by the process on ``device``, the resident set on CPU. ``peak`` returns the high
+    water mark instead, since the last ``reset_peak_memory``.
+    """
+    if device.startswith("cuda"):
+        used = torch.cuda.max_memory_allocated(device) if peak else torch.cuda.memory_allocated(device)
+        return used / 2 ** 20
+    try:
+        field = "VmHWM:" if peak else "VmRSS:"
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field):
+                    return int(line.split()[1]) / 2 ** 10
+    except (OSError, ValueError):
+        pass  # no procfs, e.g. macOS, the lifetime high water mark is the best estimate
+    if resource is None:
+        return 0.0
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return maxrss / 2 ** 20 if sys.platform == "darwin" else maxrss / 2 ** 10
+
+
+def reset_peak_memory(device: str = "cpu") -> bool:
+    """Restarts the high water mark of ``memory_mb(device, peak=True)``, False where it can't be reset."""
+    if device.startswith("cuda"):
+        torch.cuda.reset_peak_memory_stats(device)
+        return True
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")  # resets the resident set high water mark, Linux only
+        return True
+    except OSError:
+        return False
+
+
+def track_peak(device: str = "cpu") -> Callable[[], Tuple[float, float]]:
+    """
+    Starts measuring a run on ``device``. Returns a function giving the memory before the run and
+    the peak since, in MB, the resident set when it is called where the peak can't be reset.
+    """
+    resettable = reset_peak_memory(device)
+    before = memory_mb(device)
+
+    def measure() -> Tuple[float, float]:
+        peak = memory_mb(device, peak=True) if resettable else memory_mb(device)
+        return before, max(before, peak)
+    return measure
+
+
+def default_memory_limit_mb(device: str = "cpu") -> float:
+    """90% of the GPU memory on CUDA, 80% of the physical memory on CPU."""
+    if device.startswith("cuda"):
+        return torch.cuda.get_device_properties(device).total_memory * 0.9 / 2 ** 20
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") * 0.8 / 2 ** 20
+    except (AttributeError, ValueError, OSError):  # pragma: no cover
+        return float("inf")
+
+
+class BatchSizeTuner:
+    """Chooses, remembers and backs off the batch size of every model, see the module docstring."""
+
+    CANDIDATES = (1, 2, 4, 8, 16, 32, 64)
+    # each candidate is timed over this many of its batches
+    PROBE_BATCHES = 2
+    # a larger batch size has to be this much faster to be chosen
+    MIN_GAIN = 0.05
+    # fewer chunks than this are not enough to probe, the caller's batch size is used meanwhile
+    MIN_CHUNKS = 16
+
+    def __init__(self, path=None, device: str = "cpu", memory_limit_mb: Optional[float] = None):
+        self.path = Path(path) if path else default_path()
+        self.device = device
+        self.memory_limit_mb = memory_limit_mb or default_memory_limit_mb(device)
+        self.host = host_key()
+        self.settings = self.load().get(self.host, {})
+
+    def load(self) -> Dict[str, Dict[str, Dict]]:
+        """The stored settings of every host, by host and model."""
+        if not self.path.exists():
+            return {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring the unreadable autotune settings {self.path}: {e}")
+            return {}
+
+    def save(self, model: str, setting: Dict) -> None:
+        """Stores the ``setting`` of ``model`` on this host, keeping what other processes stored meanwhile."""
+        self.settings[model] = setting
+        stored = self.load()
+        stored.setdefault(self.host, {})[model] = setting
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(stored, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def model_id(self, model_name: str, quantized: bool = False) -> str:
+        return f"{model_name}|{self.device}{'|int8' if quantized else ''}"
+
+    def batch_size(self, model: str, chunks: List[str], run: Callable[[List[str], int], object],
+                   count_tokens: Callable[[List[str]], int], default: int) -> int:
+        """
+        The batch size of ``model``, probed on ``chunks`` when there is none yet.
+
+        Args:
+            run: runs the model over chunks with a batch size
+            count_tokens: the number of tokens of chunks, without padding
+            default: used while there are too few chunks to probe
+        """
+        if model in self.settings:
+            return self.settings[model]["batch_size"]
+        if len(chunks) < self.MIN_CHUNKS:
+            return default
+        setting, complete = self.probe(chunks, run, count_tokens)
+        logger.info(f"Autotuned batch size {setting['batch_size']} for {model}")
+        if complete:
+            self.save(model, setting)
+        else:
+            # too few chunks to try the larger sizes, kept for this process and probed again by the next
+            self.settings[model] = setting
+        return setting["batch_size"]
+
+    def probe(self, chunks: List[str], run: Callable[[List[str], int], object],
+              count_tokens: Callable[[List[str]], int]) -> Tuple[Dict, bool]:
+        """
+        Times growing batch sizes over ``chunks`` and returns the fastest with its measurements, and
+        whether the probing came to a conclusion rather than running out of chunks.
+        """
+        run(chunks[:1], 1)  # lazy initialization would be timed as part of the first candidate
+        best, complete = None, True
+        for candidate in self.CANDIDATES:
+            sample = chunks[:candidate * self.PROBE_BATCHES]
+            if len(sample) < candidate * self.PROBE_BATCHES:
+                complete = False
+                break
+            measure = track_peak(self.device)
+            try:
+                start = time.perf_counter()
+                run(sample, candidate)
+                seconds = time.perf_counter() - start
+            except (RuntimeError, MemoryError) as e:
+                if not is_out_of_memory(e):
+                    raise
+                self.release()
+                break
+            before, peak = measure()
+            result = {"batch_size": candidate, "tokens_per_second": round(count_tokens(sample) / seconds, 1),
+                      "peak_memory_mb": round(peak), "batch_memory_mb": round(peak - before),
+                      "tuned_at": int(time.time())}
+            if peak > self.memory_limit_mb:
+                break
+            if best is not None and result["tokens_per_second"] < best["tokens_per_second"] * (1 + self.MIN_GAIN):
+                break
+            best = result
+        if best is None:
+            best = {"batch_size": 1, "tokens_per_second": None, "peak_memory_mb": None, "batch_memory_mb": None,
+                    "tuned_at": int(time.time())}
+        return best, complete
+
+    def back_off(self, model: str, batch_size: int) -> int:
+        """
+        Halves the batch size of ``model`` after running out of memory with ``batch_size``, for the rest
+        of the process. The stored setting is kept, the next process starts from the tuned size again.
+        """
+        smaller = max(1, batch_size // 2)
+        logger.warning(f"Reducing the batch size of {model} from {batch_size} to {smaller}")
+        self.release()
+        self.settings[model] = dict(self.settings.get(model, {}), batch_size=smaller, backed_off_at=int(time.time()))
+        return smaller
+
+    def under_pressure(self, before: float, peak: float) -> bool:
+        """
+        Whether a run, with the memory ``before`` it and its ``peak`` from ``track_peak``, took the
+        process over the limit. Memory already over it before the run isn't freed by smaller batches.
+        """
+        return before <= self.memory_limit_mb < peak
+
+    def release(self) -> None:
+        if self.device.startswith("cuda"):
+            torch.cuda.empty_cache()
@@ -0,0 +1,69 @@
+import hashlib
+from collections import Counter
+from typing import Iterable, List, Tuple
+
+from sct.utils import regexengine
+
+
+class BoilerplateDetector:
+    """
+    Finds the blocks (paragraphs or lines) which repeat across the documents of a corpus,
+    like disclaimers, signatures and footers, so they can be cleaned once instead of per document.
+    A block is boilerplate when it occurs in at least ``min_count`` documents and has at least
+    ``min_chars`` characters, blocks are compared with their whitespace normalised.
+    """
+
+    SEPARATORS = {
+        "paragraph": regexengine.compile(r"\n[ \t]*\n\s*"),
+        "line": regexengine.compile(r"\n\s*"),
+    }
+
+    def __init__(self, min_count: int = 5, min_chars: int = 20, unit: str = "paragraph"):
+        if unit not in self.SEPARATORS:
+            raise ValueError(f"Unknown boilerplate unit {unit!r}, expected one of {list(self.SEPARATORS)}")
+        self.min_count = min_count
+        self.min_chars = min_chars
+        self.unit = unit
+        self.counts = Counter()  # block fingerprint -> number of documents containing it
+        self.boilerplate = set()
+
+    def blocks(self, text: str) -> List[Tuple[str, str]]:
+        """Splits ``text`` into (block, following separator) pairs which concatenate back to it."""
+        blocks = []
+        start = 0
+        for match in self.SEPARATORS[self.unit].finditer(text):
+            blocks.append((text[start:match.start()], match.group()))
+            start = match.end()
+        if start < len(text) or not blocks:
+            blocks.append((text[start:], ""))
+        return blocks
+
+    def fingerprint(self, block: str) -> bytes:
+        return hashlib.blake2b(" ".join(block.split()).encode("utf-8"), digest_size=8).digest()
+
+    def fit(self, texts: Iterable[str]) -> "BoilerplateDetector":
+        """Counts in how many documents each block occurs and marks the frequent ones as boilerplate."""
+        for text in texts:
+            self.counts.update({
+                self.fingerprint(block) for block, _ in self.blocks(text) if len(block.strip()) >= self.min_chars
+            })
+        self.boilerplate = {key for key, count in self.counts.items() if count >= self.min_count}
+        return self
+
+    def is_boilerplate(self, block: str) -> bool:
+        return len(block.strip()) >= self.min_chars and self.fingerprint(block) in self.boilerplate
+
+    def segment(self, text: str) -> List[Tuple[str, str, bool]]:
+        """
+        Splits ``text`` into (segment, following separator, is boilerplate) triples, consecutive
+        blocks which aren't boilerplate are merged into one segment so they keep their context.
+        """
+        segments = []
+        for block, separator in self.blocks(text):
+            boilerplate = self.is_boilerplate(block)
+            if segments and not boilerplate and not segments[-1][2]:
+                previous, previous_separator, _ = segments[-1]
+                segments[-1] = (previous + previous_separator + block, separator, False)
+            else:
+                segments.append((block, separator, boilerplate))
+        return segments
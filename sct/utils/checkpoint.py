@@ -0,0 +1,127 @@
+import json
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sct import config
+
+# bump when a stage changes its output for the same input and config, invalidating all checkpoints
+CHECKPOINT_VERSION = 1
+
+# config values every stage depends on: a configured language is carried with the text from the
+# start, also when detect_language doesn't run, and picks the NER model
+PIPELINE_CONFIG = ["LANGUAGE"]
+
+# config values each pipeline stage depends on, besides whether it runs at all, the regex
+# stages also on the engine, e.g. \w only matches ASCII word characters with re2
+STAGE_CONFIG = {
+    "detect_language": ["LANGUAGE", "LANGUAGE_SAMPLE_CHARS", "LANGUAGE_SAMPLE_WINDOWS",
+                        "LANGUAGE_CONFIDENCE_THRESHOLD", "LANGUAGE_LOW_ACCURACY"],
+    "fix_bad_unicode": [],
+    "to_ascii_unicode": [],
+    "replace_html": ["REPLACE_WITH_HTML", "REGEX_BACKEND"],
+    "replace_urls": ["REPLACE_WITH_URL", "REGEX_BACKEND"],
+    "replace_emails": ["REPLACE_WITH_EMAIL", "REGEX_BACKEND"],
+    "replace_years": ["REPLACE_WITH_YEARS", "REGEX_BACKEND"],
+    "replace_phone_numbers": ["REPLACE_WITH_PHONE_NUMBERS", "REGEX_BACKEND"],
+    "replace_numbers": ["REPLACE_WITH_NUMBERS", "REGEX_BACKEND"],
+    "replace_currency_symbols": ["REPLACE_WITH_CURRENCY_SYMBOLS", "REGEX_BACKEND"],
+    "ner_process": ["POSITIONAL_TAGS", "NER_CONFIDENCE_THRESHOLD", "NER_MODELS_LIST", "NER_QUANTIZE"],
+    "remove_isolated_letters": ["REGEX_BACKEND"],
+    "remove_isolated_special_symbols": ["REGEX_BACKEND"],
+    "normalize_whitespace": ["REGEX_BACKEND"],
+}
+
+# versions of the user stages which declare one, bumped when their output changes for the same input and config
+STAGE_VERSIONS = {}
+
+
+def config_fingerprint(names: Iterable[str], extra=None) -> str:
+    """Hex digest of the current values of the ``config`` settings ``names``, plus ``extra``."""
+    values = {name: getattr(config, name, None) for name in names}
+    payload = json.dumps([values, extra], sort_keys=True, default=repr)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def stage_fingerprints(stage_names: List[str], models: Optional[Dict] = None) -> List[str]:
+    """
+    Fingerprint of every prefix of the pipeline, the stage ``k`` one covers the stages up to
+    and including ``k``, their versions and the config they depend on, so a change only
+    invalidates later stages, and the ``PIPELINE_CONFIG``, which invalidates all of them.
+    ``models`` identifies the NER models, as returned by ``GeneralNER.model_versions()``,
+    and is part of the ner_process fingerprint.
+    """
+    fingerprints = []
+    previous = config_fingerprint(PIPELINE_CONFIG, extra=CHECKPOINT_VERSION)
+    for name in stage_names:
+        extra = [previous, name]
+        if STAGE_VERSIONS.get(name) is not None:
+            extra.append(STAGE_VERSIONS[name])
+        if name == "ner_process" and models is not None:
+            extra.append(models)
+        previous = config_fingerprint(STAGE_CONFIG.get(name, []), extra=extra)
+        fingerprints.append(previous)
+    return fingerprints
+
+
+def checkpoint_key(fingerprint: str, text: str) -> bytes:
+    """Key of the output of the stage with ``fingerprint`` for the input ``text``."""
+    digest = hashlib.blake2b(fingerprint.encode("ascii"), digest_size=16)
+    digest.update(text.encode("utf-8", "surrogatepass"))
+    return digest.digest()
+
+
+class CheckpointStore:
+    """
+    Persists the text (and detected language) after chosen pipeline stages in a SQLite file,
+    so re-running a corpus after a config change resumes from the deepest still valid stage.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._lock:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS checkpoints (key BLOB PRIMARY KEY, text TEXT, language TEXT)"
+            )
+            self._connection.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, keys: Iterable[bytes]) -> Dict[bytes, Tuple[str, Optional[str]]]:
+        """Returns the stored (text, language) of the ``keys`` found."""
+        keys = list(keys)
+        found = {}
+        with self._lock:
+            # stay below SQLite's limit on the number of query parameters
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self._connection.execute(
+                    f"SELECT key, text, language FROM checkpoints WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                )
+                found.update((key, (text, language)) for key, text, language in rows)
+        return found
+
+    def save(self, items: Iterable[Tuple[bytes, str, Optional[str]]]) -> None:
+        """Stores (key, text, language) items, replacing existing ones."""
+        with self._lock:
+            self._connection.executemany("INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?)", items)
+            self._connection.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connection.execute("DELETE FROM checkpoints")
+            self._connection.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM checkpoints").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
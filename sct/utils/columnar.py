@@ -0,0 +1,77 @@
+"""
+Arrow helpers for ``TextCleaner.clean_column``. pyarrow (and pandas for Series) are optional
+dependencies, installed with ``pip install SqueakyCleanText[columnar]``.
+"""
+import sys
+from typing import Callable, Dict, Optional
+
+from sct import config
+from sct.utils import constants
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:  # pragma: no cover
+    pa = None
+    pc = None
+
+
+def require_pyarrow():
+    if pa is None:
+        raise ImportError("clean_column needs pyarrow, install it with: pip install SqueakyCleanText[columnar]")
+
+
+def to_arrow(column):
+    """
+    Returns ``column`` (a pandas Series, pyarrow Array or ChunkedArray of strings) as one
+    large_string Array, with the pandas index or None.
+    """
+    require_pyarrow()
+    index = None
+    pandas = sys.modules.get("pandas")  # a Series can only exist if pandas was imported
+    if pandas is not None and isinstance(column, pandas.Series):
+        index = column.index
+        column = pa.array(column.to_numpy(dtype=object, na_value=None), type=pa.large_string(), from_pandas=True)
+    if isinstance(column, pa.ChunkedArray):
+        column = column.combine_chunks() if column.num_chunks else pa.array([], type=pa.large_string())
+    if not isinstance(column, pa.Array):
+        column = pa.array(column, type=pa.large_string())
+    if not (pa.types.is_string(column.type) or pa.types.is_large_string(column.type)):
+        raise ValueError(f"Column must hold strings, got {column.type}")
+    return column.cast(pa.large_string()), index
+
+
+def _literal_replacement(replace_with: str) -> Optional[str]:
+    # backslashes are group references for both re.sub and RE2, only plain text is passed through
+    return None if replace_with is None or "\\" in replace_with else replace_with
+
+
+def replace_years(array) -> Optional["pa.Array"]:
+    """
+    Vectorized ``replace_years``. RE2 only knows ASCII word boundaries and digits, so this only
+    matches the ``re`` semantics when every text is ASCII, e.g. after ``to_ascii_unicode``.
+    """
+    replace_with = _literal_replacement(config.REPLACE_WITH_YEARS)
+    if replace_with is None or not pc.all(pc.string_is_ascii(array)).as_py():
+        return None
+    return pc.replace_substring_regex(array, constants.YEAR_REGEX.pattern, replace_with)
+
+
+def replace_currency_symbols(array) -> Optional["pa.Array"]:
+    """Vectorized ``replace_currency_symbols``, the symbols are plain literals so any text qualifies."""
+    if config.REPLACE_WITH_CURRENCY_SYMBOLS is None:
+        # the 3 letter codes contain no symbols, so replacing one symbol at a time is the same as one pass
+        for symbol in sorted(constants.CURRENCIES, key=len, reverse=True):
+            array = pc.replace_substring(array, symbol, constants.CURRENCIES[symbol])
+        return array
+    replace_with = _literal_replacement(config.REPLACE_WITH_CURRENCY_SYMBOLS)
+    if replace_with is None:
+        return None
+    return pc.replace_substring_regex(array, constants.CURRENCY_REGEX.pattern, replace_with)
+
+
+# pipeline steps with an Arrow compute equivalent, they return None when it doesn't apply
+ARROW_STAGES: Dict[str, Callable[["pa.Array"], Optional["pa.Array"]]] = {
+    "replace_years": replace_years,
+    "replace_currency_symbols": replace_currency_symbols,
+}
@@ -1,8 +1,11 @@
 """
 Constant symbols and compiled RegExs use for cleaning.
+Patterns are compiled through ``regexengine`` with the backend set in ``config.REGEX_BACKEND``.
 """
 
 import re
+import string
+from sct.utils import regexengine
 
 CURRENCIES = {
     "$": "USD",
@@ -21,18 +24,95 @@ CURRENCIES = {
     "₴": "UAH",
     "₹": "INR",
 }
-CURRENCY_REGEX = re.compile(
+CURRENCY_REGEX = regexengine.compile(
     "({})+".format("|".join(re.escape(c) for c in CURRENCIES.keys()))
 )
+# single character symbols are mapped in one pass with ``str.translate``,
+# the few multi character ones (e.g. "zł") need a pattern of their own
+CURRENCY_TRANSLATION = str.maketrans({k: v for k, v in CURRENCIES.items() if len(k) == 1})
+MULTI_CHAR_CURRENCY_REGEX = regexengine.compile(
+    "|".join(re.escape(c) for c in CURRENCIES.keys() if len(c) > 1)
+)
 
-ACRONYM_REGEX = re.compile(
+ACRONYM_REGEX = regexengine.compile(
     r"(?:^|(?<=\W))(?:(?:(?:(?:[A-Z]\.?)+[a-z0-9&/-]?)+(?:[A-Z][s.]?|[0-9]s?))|(?:[0-9](?:\-?[A-Z])+))(?:$|(?=\W))",
     flags=re.UNICODE,
 )
 
+
+class PrefixedPattern:
+    """
+    A pattern which only matches at the start of the text or after a character matching ``prefix``,
+    the ``(?:^|(?<=prefix))`` lookbehind of the original patterns, which RE2 can't compile.
+    Where the character doesn't qualify, ``fallback`` (an alternative needing no prefix) may still match.
+    Offers the ``search``, ``finditer``, ``sub`` and ``subn`` methods of a compiled pattern.
+
+    Searching takes the prefix character, which keeps it linear, but the character before a match
+    may be the last one of the previous match: so first the pattern is tried right where the search
+    starts, with the prefix checked without taking it, and a match can follow the previous one directly.
+    """
+
+    def __init__(self, pattern, prefix, flags=0, fallback=None):
+        self.pattern = pattern if fallback is None else f"(?:{pattern})|{fallback}"
+        self.flags = flags
+        self.body = regexengine.compile(self.pattern, flags)
+        # the fallback goes first, it starts a character before a body after the prefix
+        prefixed = f"({prefix})(?:{pattern})"
+        self._search = regexengine.compile(prefixed if fallback is None else f"{fallback}|{prefixed}", flags)
+        # always the re module, for the unicode \w of the original lookbehind on every backend
+        self._prefix = re.compile(prefix, flags).match
+
+    def __repr__(self):
+        return f"PrefixedPattern({self.body!r})"
+
+    def _after_prefix(self, string, pos):
+        return pos == 0 or self._prefix(string, pos - 1, pos) is not None
+
+    def finditer(self, string, pos=0):
+        while pos <= len(string):
+            match = self.body.match(string, pos) if self._after_prefix(string, pos) else None
+            if match is None:
+                match = self._search.search(string, pos)
+                if match is None:
+                    return
+                if match.start(1) != -1:
+                    # after the prefix, as found by the search, unless the backend's \w differs
+                    start = match.end(1)
+                    match = self.body.match(string, start) if self._after_prefix(string, start) else None
+                    if match is None:
+                        pos = start
+                        continue
+            yield match
+            pos = max(match.end(), match.start() + 1)
+
+    def search(self, string, pos=0):
+        return next(self.finditer(string, pos), None)
+
+    def subn(self, repl, string, count=0):
+        if not callable(repl):
+            template = repl
+            repl = (lambda match: template) if "\\" not in template else (lambda match: match.expand(template))
+        pieces, end, n = [], 0, 0
+        for match in self.finditer(string):
+            pieces.append(string[end:match.start()])
+            pieces.append(repl(match))
+            end = match.end()
+            n += 1
+            if n == count:
+                break
+        if not n:
+            return string, 0
+        pieces.append(string[end:])
+        return "".join(pieces), n
+
+    def sub(self, repl, string, count=0):
+        return self.subn(repl, string, count)[0]
+
+
 # taken hostname, domainname, tld from URL regex below
-EMAIL_REGEX = re.compile(
-    r"(?:^|(?<=[^\w@.)]))([\w+-](\.(?!\.))?)*?[\w+-](@|[(<{\[]at[)>}\]])(?:(?:[a-z\\u00a1-\\uffff0-9]-?)*[a-z\\u00a1-\\uffff0-9]+)(?:\.(?:[a-z\\u00a1-\\uffff0-9]-?)*[a-z\\u00a1-\\uffff0-9]+)*(?:\.(?:[a-z\\u00a1-\\uffff]{2,}))",
+EMAIL_REGEX = PrefixedPattern(
+    r"(?:[\w+-]\.?)*?[\w+-](?:@|[(<{\[]at[)>}\]])(?:[a-z\\u00a1-\\uffff0-9]+(?:-[a-z\\u00a1-\\uffff0-9]+)*)(?:\.[a-z\\u00a1-\\uffff0-9]+(?:-[a-z\\u00a1-\\uffff0-9]+)*)*(?:\.(?:[a-z\\u00a1-\\uffff]{2,}))",
+    r"[^\w@.)]",
     flags=re.IGNORECASE | re.UNICODE,
 )
 
@@ -44,48 +124,48 @@ EMAIL_REGEX = re.compile(
 #     r"((?:^|(?<=[^\w)]))((\+?[01]|0{1,2}\d{0,1}|\+\d{2})[ .-]?)?(\(?\d{3,4}\)?/?[ .-]?)?(\d{3}[ .-]?\d{4})(\s?(?:ext\.?|[#x-])\s?\d{2,6})?(?:$|(?=\W)))|\+?\d{4,5}[ .-/]\d{6,9}"
 # )
 
-PHONE_REGEX = re.compile(
-    r"((?:^|(?<=[^\w)]))((\+?\d+|0{1,2}\d*?)[ .-]?)?(\(?\d{3,4}\)?/?[ .-]?)?(\d{3}[ .-]?\d{4})(\s?(?:ext\.?|[#x-])\s?\d{2,6})?(?:$|(?=\W)))|\+?\d{4,5}[ .-/]\d{6,9}"
-)
+_PHONE_BODY = r"(?:(?:\+?\d+|0{1,2}\d*?)[ .-]?)?(?:\(?\d{3,4}\)?/?[ .-]?)?(?:\d{3}[ .-]?\d{4})(?:\s?(?:ext\.?|[#x-])\s?\d{2,6})?(?:$|\b)"
+PHONE_REGEX = PrefixedPattern(_PHONE_BODY, r"[^\w)]", fallback=r"\+?\d{4,5}[ .-/]\d{6,9}")
 
-NUMBERS_REGEX = re.compile(
-    r"(?:^|(?<=[^\w,.]))[+–-]?(([1-9]\d{0,2}(,\d{3})+(\.\d*)?)|([1-9]\d{0,2}([ .]\d{3})+(,\d*)?)|(\d*?[.,]\d+)|\d+)(?:$|(?=\b))"
+NUMBERS_REGEX = PrefixedPattern(
+    r"[+–-]?(([1-9]\d{0,2}(,\d{3})+(\.\d*)?)|([1-9]\d{0,2}([ .]\d{3})+(,\d*)?)|(\d*?[.,]\d+)|\d+)(?:$|\b)",
+    r"[^\w,.]",
 )
 
-LINEBREAK_REGEX = re.compile(r"((\r\n)|[\n\v])+")
-TWO_LINEBREAK_REGEX = re.compile(r"((\r\n)|[\n\v])+((\r\n)|[\n\v])+")
-MULTI_WHITESPACE_TO_ONE_REGEX = re.compile(r"\s+")
-NONBREAKING_SPACE_REGEX = re.compile(r"(?!\n)\s+")
+LINEBREAK_REGEX = regexengine.compile(r"((\r\n)|[\n\v])+")
+TWO_LINEBREAK_REGEX = regexengine.compile(r"((\r\n)|[\n\v])+((\r\n)|[\n\v])+")
+MULTI_WHITESPACE_TO_ONE_REGEX = regexengine.compile(r"\s+")
+NONBREAKING_SPACE_REGEX = regexengine.compile(r"(?!\n)\s+")
 
 
-HTML_REGEX = re.compile('<.*?>|&([a-z0-9]+|#[0-9]{1,6}|#x[0-9a-f]{1,6});', flags=re.UNICODE | re.IGNORECASE,)
+HTML_REGEX = regexengine.compile('<.*?>|&([a-z0-9]+|#[0-9]{1,6}|#x[0-9a-f]{1,6});', flags=re.UNICODE | re.IGNORECASE,)
 
 # source: https://gist.github.com/dperini/729294
-URL_REGEX = re.compile(
-    r"(?:^|(?<![\w\/\.]))"
+URL_REGEX = PrefixedPattern(
     # protocol identifier
     # r"(?:(?:https?|ftp)://)" # <-- alt?
     r"(?:(?:https?:\/\/|ftp:\/\/|www\d{0,3}\.))"
     # user:pass authentication
-    r"(?:\S+(?::\S*)?@)?" r"(?:"
-    # IP address exclusion
-    # private & local networks
-    r"(?!(?:10|127)(?:\.\d{1,3}){3})"
-    r"(?!(?:169\.254|192\.168)(?:\.\d{1,3}){2})"
-    r"(?!172\.(?:1[6-9]|2\d|3[0-1])(?:\.\d{1,3}){2})"
-    # IP address dotted notation octets
-    # excludes loopback network 0.0.0.0
-    # excludes reserved space >= 224.0.0.0
-    # excludes network & broadcast addresses
+    r"(?:\S+@)?" r"(?:"
+    # IP address dotted notation octets, excluding
+    # private & local networks (10/8, 127/8, 169.254/16, 172.16/12, 192.168/16)
+    # loopback network 0.0.0.0
+    # reserved space >= 224.0.0.0
+    # network & broadcast addresses
     # (first & last IP address of each class)
-    r"(?:[1-9]\d?|1\d\d|2[01]\d|22[0-3])"
+    r"(?:"
+    r"(?:[1-9]|1[1-9]|[2-9]\d|1(?:[013-58]\d|2[0-689]|6[0-8]|7[013-9]|9[013-9])|2[01]\d|22[0-3])"
     r"(?:\.(?:1?\d{1,2}|2[0-4]\d|25[0-5])){2}"
+    r"|169\.(?:1?\d{1,2}|2[0-4]\d|25[0-35])\.(?:1?\d{1,2}|2[0-4]\d|25[0-5])"
+    r"|172\.(?:\d|0\d|1[0-5]|3[2-9]|[4-9]\d|1\d\d|2[0-4]\d|25[0-5])\.(?:1?\d{1,2}|2[0-4]\d|25[0-5])"
+    r"|192\.(?:\d{1,2}|1(?:[0-57-9]\d|6[0-79])|2[0-4]\d|25[0-5])\.(?:1?\d{1,2}|2[0-4]\d|25[0-5])"
+    r")"
     r"(?:\.(?:[1-9]\d?|1\d\d|2[0-4]\d|25[0-4]))"
     r"|"
     # host name
-    r"(?:(?:[a-z\\u00a1-\\uffff0-9]-?)*[a-z\\u00a1-\\uffff0-9]+)"
+    r"(?:[a-z\\u00a1-\\uffff0-9]+(?:-[a-z\\u00a1-\\uffff0-9]+)*)"
     # domain name
-    r"(?:\.(?:[a-z\\u00a1-\\uffff0-9]-?)*[a-z\\u00a1-\\uffff0-9]+)*"
+    r"(?:\.[a-z\\u00a1-\\uffff0-9]+(?:-[a-z\\u00a1-\\uffff0-9]+)*)*"
     # TLD identifier
     r"(?:\.(?:[a-z\\u00a1-\\uffff]{2,}))" r"|" r"(?:(localhost))" r")"
     # port number
@@ -94,6 +174,7 @@ URL_REGEX = re.compile(
     # resource path
     r"(?:\/[^\)\]\}\s]*)?",
     # r"(?:$|(?![\w?!+&\/\)]))",
+    r"[^\w\/\.]",
     flags=re.UNICODE | re.IGNORECASE,
 )
 
@@ -118,13 +199,49 @@ strange_double_quotes = [
 ]
 strange_single_quotes = ["‘", "‛", "’", "❛", "❜", "`", "´", "‘", "’"]
 
-DOUBLE_QUOTE_REGEX = re.compile("|".join(strange_double_quotes))
-SINGLE_QUOTE_REGEX = re.compile("|".join(strange_single_quotes))
+DOUBLE_QUOTE_REGEX = regexengine.compile("|".join(strange_double_quotes))
+SINGLE_QUOTE_REGEX = regexengine.compile("|".join(strange_single_quotes))
+QUOTES_TRANSLATION = str.maketrans(
+    {**{q: "'" for q in strange_single_quotes}, **{q: '"' for q in strange_double_quotes}}
+)
+
+PUNCTUATION_TRANSLATION = str.maketrans("", "", string.punctuation)
+
+YEAR_REGEX = regexengine.compile(r"\b(19|20)\d{2}\b") # Matches years from 1900 to 2099
 
-YEAR_REGEX = re.compile(r"\b(19|20)\d{2}\b") # Matches years from 1900 to 2099
+ISOLATED_LETTERS_REGEX = regexengine.compile(r"(?:^|\s)[B, C, D, E, F, G, H, I, J, K, L, M, N, O, P, Q, R, S, T, V, W, X, Y, Z](?=\s|$)", flags=re.UNICODE | re.IGNORECASE)
 
-ISOLATED_LETTERS_REGEX = re.compile(r"(?:^|\s)[B, C, D, E, F, G, H, I, J, K, L, M, N, O, P, Q, R, S, T, V, W, X, Y, Z](?=\s|$)", flags=re.UNICODE | re.IGNORECASE)
+ISOLATED_SPECIAL_SYMBOLS_REGEX = regexengine.compile(r"(?<![a-zA-Z0-9])[:_.|><;·}@~!?+#)({,/\\\\^]+(?![a-zA-Z0-9])", flags=re.UNICODE | re.IGNORECASE)
+SQUARE_BRACKETS_REGEX = regexengine.compile(r"\[[^\]]+\]") # [] content, usually image or file location text
+CURLY_BRACKETS_REGEX = regexengine.compile(r"\{[^}]+\}") # {} content, usually html links
+ISOLATED_MARKS_REGEX = regexengine.compile(r"(?<![a-zA-Z0-9])['\"\-*%](?![a-zA-Z0-9])", flags=re.UNICODE | re.IGNORECASE)
 
-ISOLATED_SPECIAL_SYMBOLS_REGEX = re.compile(r"(?<![a-zA-Z0-9])[:_.|><;·}@~!?+#)({,/\\\\^]+(?![a-zA-Z0-9])", flags=re.UNICODE | re.IGNORECASE)
+SENTENCE_BOUNDARY_PATTERN = regexengine.compile('(?<=[.!?])\s+(?=[^\d])')
 
-SENTENCE_BOUNDARY_PATTERN = re.compile('(?<=[.!?])\s+(?=[^\d])')
\ No newline at end of file
+
+# Necessary conditions of the patterns, cheap substring or character tests: when the check of a
+# pattern is False for a text, the pattern matches nowhere in it and the stage can skip the text.
+# They always use the re module, whose unicode \d covers the digits of every backend.
+_digit_search = re.compile(r"\d").search
+
+
+def _has_digit(text):
+    return _digit_search(text) is not None
+
+
+def _has_currency(text):
+    return any(symbol in text for symbol in CURRENCIES)
+
+
+PREFILTERS = {
+    # a protocol or "www" (any case) starts every URL
+    "URL_REGEX": lambda text: "://" in text or "www" in text.lower(),
+    # the local part is followed by "@" or a bracketed "at" such as "[at]", which needs a closing bracket
+    "EMAIL_REGEX": lambda text: any(c in text for c in "@)>}]"),
+    "YEAR_REGEX": lambda text: "19" in text or "20" in text,
+    "PHONE_REGEX": _has_digit,
+    "NUMBERS_REGEX": _has_digit,
+    "CURRENCY_REGEX": _has_currency,
+    "MULTI_CHAR_CURRENCY_REGEX": lambda text: any(symbol in text for symbol in CURRENCIES if len(symbol) > 1),
+    "HTML_REGEX": lambda text: "<" in text or "&" in text,
+}
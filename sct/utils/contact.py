@@ -17,6 +17,8 @@ class ProcessContacts:
         # # Check if the matched substring contains non-ASCII characters
         #     if not any(ord(char) > 127 for char in match.group()):
         #         result = text[:match.start()] + replace_with + text[match.end():]
+        if not constants.PREFILTERS["URL_REGEX"](text):
+            return text
         return constants.URL_REGEX.sub(replace_with, text)
 
     def replace_html(self, text, replace_with="<HTML>"):
@@ -35,16 +37,22 @@ class ProcessContacts:
         """
         Replace all emails in ``text`` str with ``replace_with`` str.
         """
+        if not constants.PREFILTERS["EMAIL_REGEX"](text):
+            return text
         return constants.EMAIL_REGEX.sub(replace_with, text)
 
     def replace_phone_numbers(self, text, replace_with="<PHONE>"):
         """
         Replace all phone numbers in ``text`` str with ``replace_with`` str.
         """
+        if not constants.PREFILTERS["PHONE_REGEX"](text):
+            return text
         return constants.PHONE_REGEX.sub(replace_with, text)
 
     def replace_numbers(self, text, replace_with="<NUMBER>"):
         """
         Replace all numbers in ``text`` str with ``replace_with`` str.
         """
+        if not constants.PREFILTERS["NUMBERS_REGEX"](text):
+            return text
         return constants.NUMBERS_REGEX.sub(replace_with, text)
\ No newline at end of file
@@ -10,6 +10,8 @@ class ProcessDateTime:
         """
         Replaces years between 1900 to 2099 in the text with a special token.
         """
+        if not constants.PREFILTERS["YEAR_REGEX"](text):
+            return text
         cleaned_string = constants.YEAR_REGEX.sub(replace_with, text)
 
         return cleaned_string
\ No newline at end of file
@@ -0,0 +1,130 @@
+"""
+Hashed bag of words features of the statistical model text, returned by
+``TextCleaner.process_batch_features``. The tokens are hashed as they come out of the casefold,
+stopword, punctuation and isolated letter steps, so the statistical model text is never built.
+``HashedFeatures.to_csr`` needs scipy, installed with ``pip install SqueakyCleanText[features]``.
+"""
+import zlib
+from collections import Counter
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from sct import config
+from sct.utils import constants
+
+try:
+    import scipy.sparse as sparse
+except ImportError:  # pragma: no cover
+    sparse = None
+
+
+def require_scipy():
+    if sparse is None:
+        raise ImportError("to_csr needs scipy, install it with: pip install SqueakyCleanText[features]")
+
+
+class HashedFeatures:
+    """
+    Features of a batch in CSR layout: text ``i`` has the feature indices
+    ``indices[indptr[i]:indptr[i + 1]]``, sorted, with their counts in ``data`` at the same positions.
+    """
+
+    __slots__ = ("indptr", "indices", "data", "n_features", "lm_texts", "languages")
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray, data: np.ndarray, n_features: int,
+                 lm_texts: List[str], languages: List[Optional[str]]):
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.n_features = n_features
+        self.lm_texts = lm_texts
+        self.languages = languages
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return (len(self), self.n_features)
+
+    def row(self, i: int) -> Tuple[np.ndarray, np.ndarray]:
+        """The feature indices and counts of text ``i``."""
+        start, end = self.indptr[i], self.indptr[i + 1]
+        return self.indices[start:end], self.data[start:end]
+
+    def to_csr(self):
+        """The features as a ``scipy.sparse.csr_matrix``, sharing the arrays."""
+        require_scipy()
+        return sparse.csr_matrix((self.data, self.indices, self.indptr), shape=self.shape)
+
+
+class FeatureHasher:
+    """
+    Maps the tokens of the statistical model text, and their n-grams, to ``n_features`` buckets
+    with CRC32, which unlike ``hash`` is the same in every process.
+    """
+
+    def __init__(self, stopwords, n_features: int = 2 ** 20, ngram_range: Tuple[int, int] = (1, 1)):
+        """
+        Args:
+            stopwords: the ``ProcessStopwords`` whose lists are removed
+            ngram_range: smallest and largest n-gram length, (1, 2) hashes words and word pairs
+        """
+        low, high = ngram_range
+        if n_features <= 0 or not 1 <= low <= high:
+            raise ValueError(f"Invalid n_features {n_features} or ngram_range {ngram_range}")
+        self.n_features = n_features
+        self.ngram_range = (low, high)
+        self.stop_words = {
+            "ENGLISH": frozenset(stopwords.STOP_WORDS_EN),
+            "DUTCH": frozenset(stopwords.STOP_WORDS_NL),
+            "GERMAN": frozenset(stopwords.STOP_WORDS_DE),
+            "SPANISH": frozenset(stopwords.STOP_WORDS_ES),
+        }
+
+    def tokens(self, text: str, language: Optional[str] = None) -> List[str]:
+        """
+        The whitespace separated tokens of ``statistical_model_processing(text, language)``, applying
+        its steps token by token. No stopwords are removed for a language without a list.
+        """
+        if config.CHECK_CASEFOLD:
+            text = text.casefold()
+        tokens = text.split()
+        if config.CHECK_REMOVE_STOPWORDS:
+            stop_words = self.stop_words.get(language, frozenset())
+            tokens = [token for token in tokens if token not in stop_words]
+        if config.CHECK_REMOVE_PUNCTUATION:
+            tokens = [token for token in (token.translate(constants.PUNCTUATION_TRANSLATION) for token in tokens)
+                      if token]
+        if config.CHECK_REMOVE_ISOLATED_LETTERS:
+            # the pattern matches a single character between whitespace, i.e. a whole token
+            isolated = constants.ISOLATED_LETTERS_REGEX.fullmatch
+            tokens = [token for token in tokens if len(token) > 1 or not isolated(token)]
+        return tokens
+
+    def counts(self, tokens: Sequence[str]) -> Counter:
+        """Counts per feature index of the n-grams of ``tokens``."""
+        low, high = self.ngram_range
+        n_features = self.n_features
+        counts = Counter()
+        for n in range(low, high + 1):
+            if n == 1:
+                grams = tokens
+            else:
+                grams = (" ".join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+            counts.update(zlib.crc32(gram.encode("utf-8")) % n_features for gram in grams)
+        return counts
+
+    def transform(self, documents: Iterable[Sequence[str]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """The CSR ``indptr``, ``indices`` and ``data`` arrays of the token lists ``documents``."""
+        indptr, indices, data = [0], [], []
+        for tokens in documents:
+            counts = self.counts(tokens)
+            keys = sorted(counts)
+            indices.extend(keys)
+            data.extend(counts[key] for key in keys)
+            indptr.append(len(indices))
+        index_dtype = np.int32 if self.n_features <= 2 ** 31 else np.int64
+        return (np.asarray(indptr, dtype=np.int64), np.asarray(indices, dtype=index_dtype),
+                np.asarray(data, dtype=np.int32))
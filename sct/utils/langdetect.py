@@ -0,0 +1,88 @@
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from lingua import Language, LanguageDetectorBuilder
+
+from sct.utils import resources
+
+_LOW_ACCURACY_DETECTOR = None
+
+
+def get_detector(low_accuracy: bool = False):
+    """The lingua detector for the supported languages, the low accuracy one is built on first use."""
+    global _LOW_ACCURACY_DETECTOR
+    if not low_accuracy:
+        return resources.DETECTOR
+    if _LOW_ACCURACY_DETECTOR is None:
+        _LOW_ACCURACY_DETECTOR = LanguageDetectorBuilder.from_languages(*resources.LANGUAGES) \
+            .with_low_accuracy_mode().build()
+    return _LOW_ACCURACY_DETECTOR
+
+
+class LanguageDetector:
+    """
+    Detects the language of a text from a bounded sample of it, so the cost stays constant for
+    long documents: the head plus windows spread evenly over the rest, ``sample_chars`` in total.
+    Windows are scored in that order and detection stops once the running confidence of the
+    leading language reaches ``confidence_threshold``.
+    """
+
+    def __init__(self, sample_chars: int = None, windows: int = 4, confidence_threshold: float = None,
+                 low_accuracy: bool = False):
+        """
+        Args:
+            sample_chars: characters inspected at most, None for the whole text
+            windows: number of windows the sample is split into, the first is the head of the text
+            confidence_threshold: stop after the window where the leading language reaches it, None to score all
+            low_accuracy: use lingua's low accuracy mode, faster and smaller but less reliable on short texts
+        """
+        self.sample_chars = sample_chars
+        self.windows = max(1, windows)
+        self.confidence_threshold = confidence_threshold
+        self.detector = get_detector(low_accuracy)
+
+    def sample(self, text: str) -> List[str]:
+        """The windows of ``text`` to score, the whole text if it fits the sample."""
+        if not self.sample_chars or len(text) <= self.sample_chars:
+            return [text]
+        size = self.sample_chars // self.windows
+        if self.windows == 1:
+            starts = [0]
+        else:
+            # the head, then the remaining windows spaced evenly up to the end of the text
+            step = (len(text) - size) / (self.windows - 1)
+            starts = [round(k * step) for k in range(self.windows)]
+        return [self._trim(text, start, start + size) for start in starts]
+
+    @staticmethod
+    def _trim(text: str, start: int, stop: int) -> str:
+        # cut at whitespace so no window starts or ends in the middle of a word
+        if start > 0 and not text[start - 1].isspace():
+            space = text.find(" ", start, stop)
+            start = space + 1 if space != -1 else start
+        if stop < len(text) and not text[stop].isspace():
+            space = text.rfind(" ", start, stop)
+            stop = space if space != -1 else stop
+        return text[start:stop]
+
+    def confidences(self, text: str) -> Dict[Language, float]:
+        """Confidence of every language, averaged over the scored windows weighted by their length."""
+        totals, weight = defaultdict(float), 0
+        for window in self.sample(text):
+            for value in self.detector.compute_language_confidence_values(window):
+                totals[value.language] += value.value * len(window)
+            weight += len(window)
+            if self.confidence_threshold is not None and totals:
+                if max(totals.values()) / weight >= self.confidence_threshold:
+                    break
+        return {language: total / weight for language, total in totals.items()} if weight else {}
+
+    def detect(self, text: str) -> Tuple[Optional[Language], float]:
+        """
+        The most likely language and its confidence, or None when no language is ahead,
+        like lingua's ``detect_language_of``.
+        """
+        ranked = sorted(self.confidences(text).items(), key=lambda item: item[1], reverse=True)
+        if not ranked or (len(ranked) > 1 and ranked[0][1] == ranked[1][1]):
+            return None, 0.0
+        return ranked[0]
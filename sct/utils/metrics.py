@@ -0,0 +1,269 @@
+"""
+Throughput, latency and model usage metrics of the cleaning pipeline, collected when
+``config.COLLECT_METRICS`` is set. When it isn't, instrumented code only pays for one attribute
+lookup: it gets None from ``active()`` and skips the timing.
+
+Read them with ``REGISTRY.snapshot()`` or in the Prometheus text format with ``prometheus_text()``,
+which ``sct serve`` exposes at ``GET /metrics``. Metrics are per process. Forked server workers
+``dump`` theirs to a shared directory after every batch, and ``prometheus_text(directory)`` sums the
+dumps, so whichever worker answers the scrape reports the totals of all of them.
+"""
+import os
+import copy
+import json
+import math
+import threading
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sct import config
+
+# seconds, from a short regex stage on one text up to NER over a large batch
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0)
+COUNT_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+class Metric:
+    """A named metric with one value per combination of label values."""
+
+    kind = None
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"Metric {self.name} takes labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[label]) for label in self.labels)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def blank(self) -> "Metric":
+        """A metric with the same name, labels and buckets, without values."""
+        metric = copy.copy(self)
+        metric._values = {}
+        metric._lock = threading.Lock()
+        return metric
+
+    def dump(self) -> List:
+        """The raw values with their label values, JSON serializable, read back by ``merge``."""
+        with self._lock:
+            return [[list(key), self._copy(value)] for key, value in self._values.items()]
+
+    def merge(self, dumped: List) -> None:
+        """Adds the values ``dump`` returned for the same metric, e.g. in another process."""
+        with self._lock:
+            for key, value in dumped:
+                key = tuple(key)
+                self._values[key] = self._add(self._values.get(key), value)
+
+    def _copy(self, value):
+        return value
+
+    def _add(self, value, other):
+        return other if value is None else value + other
+
+    def _format_labels(self, key: Tuple[str, ...], extra: Dict[str, str] = None) -> str:
+        pairs = list(zip(self.labels, key)) + list((extra or {}).items())
+        if not pairs:
+            return ""
+        escaped = (value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in pairs)
+        return "{" + ",".join(f'{label}="{value}"' for (label, _), value in zip(pairs, escaped)) + "}"
+
+
+class Counter(Metric):
+    """A value which only goes up, e.g. the texts cleaned."""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> List[Dict]:
+        with self._lock:
+            return [{"labels": dict(zip(self.labels, key)), "value": value} for key, value in self._values.items()]
+
+    def prometheus_lines(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{self._format_labels(key)} {_number(value)}" for key, value in self._values.items()]
+
+
+class Histogram(Metric):
+    """Distribution of observed values over fixed buckets, e.g. stage latencies."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = (), buckets: Iterable[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # count per bucket (the last one is +Inf), sum, count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _copy(self, value):
+        counts, total, count = value
+        return [list(counts), total, count]
+
+    def _add(self, value, other):
+        if value is None:
+            return self._copy(other)
+        return [[a + b for a, b in zip(value[0], other[0])], value[1] + other[1], value[2] + other[2]]
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def sum(self, **labels) -> float:
+        state = self._values.get(self._key(labels))
+        return state[1] if state else 0.0
+
+    def samples(self) -> List[Dict]:
+        with self._lock:
+            return [{
+                "labels": dict(zip(self.labels, key)),
+                "buckets": dict(zip(self.buckets + (math.inf,), _cumulative(counts))),
+                "sum": total,
+                "count": count,
+            } for key, (counts, total, count) in self._values.items()]
+
+    def prometheus_lines(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                for bound, cumulative in zip(self.buckets + (math.inf,), _cumulative(counts)):
+                    le = "+Inf" if bound == math.inf else _number(bound)
+                    lines.append(f"{self.name}_bucket{self._format_labels(key, {'le': le})} {cumulative}")
+                lines.append(f"{self.name}_sum{self._format_labels(key)} {_number(total)}")
+                lines.append(f"{self.name}_count{self._format_labels(key)} {count}")
+        return lines
+
+
+def _cumulative(counts: List[int]) -> List[int]:
+    total, cumulative = 0, []
+    for count in counts:
+        total += count
+        cumulative.append(total)
+    return cumulative
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class MetricsRegistry:
+    """The metrics of a process, by name."""
+
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Iterable[str] = (), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def reset(self) -> None:
+        for metric in self.metrics.values():
+            metric.reset()
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Current values of all metrics, JSON serializable apart from the infinite histogram bound."""
+        return {name: {"type": metric.kind, "help": metric.help, "samples": metric.samples()}
+                for name, metric in self.metrics.items()}
+
+    def dump(self) -> Dict[str, List]:
+        """The raw values of all metrics by name, see ``Metric.dump``."""
+        return {name: metric.dump() for name, metric in self.metrics.items()}
+
+    def merged(self, dumps: Iterable[Dict[str, List]]) -> "MetricsRegistry":
+        """A registry with the same metrics holding the sums of ``dumps``, unknown metrics are ignored."""
+        registry = MetricsRegistry()
+        for metric in self.metrics.values():
+            registry.register(metric.blank())
+        for dumped in dumps:
+            for name, values in dumped.items():
+                if name in registry.metrics:
+                    registry.metrics[name].merge(values)
+        return registry
+
+    def prometheus_text(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.prometheus_lines())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+DOCUMENTS = REGISTRY.counter("sct_documents_total", "Texts cleaned")
+BATCH_SECONDS = REGISTRY.histogram("sct_batch_seconds", "Duration of TextCleaner.process_batch calls")
+STAGE_SECONDS = REGISTRY.histogram("sct_stage_seconds", "Duration of a pipeline stage call, per batch for NER",
+                                   ["stage"])
+NER_CHUNKS = REGISTRY.histogram("sct_ner_chunks_per_document", "NER chunks a text is split into", buckets=COUNT_BUCKETS)
+NER_INVOCATIONS = REGISTRY.counter("sct_ner_invocations_total", "NER pipeline calls by model language", ["model"])
+NER_CHUNKS_PROCESSED = REGISTRY.counter("sct_ner_chunks_total", "Chunks run through each NER model", ["model"])
+ENTITIES = REGISTRY.counter("sct_entities_total", "Entities anonymized by tag", ["tag"])
+CACHE_REQUESTS = REGISTRY.counter("sct_cache_requests_total", "Model and checkpoint cache lookups",
+                                  ["cache", "result"])
+
+
+def active() -> Optional[MetricsRegistry]:
+    """The registry to update, None when collecting metrics is disabled."""
+    return REGISTRY if config.COLLECT_METRICS else None
+
+
+def dump(directory: str) -> None:
+    """Writes the metrics of this process to ``directory``, one file per process id."""
+    path = os.path.join(directory, f"{os.getpid()}.json")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(REGISTRY.dump(), f)
+    os.replace(tmp_path, path)
+
+
+def prometheus_text(directory: Optional[str] = None) -> str:
+    """
+    The metrics of this process, or with ``directory`` the sums of every process which dumped its
+    metrics there. Dumps of exited processes are kept, so counters don't go down when a worker is
+    restarted.
+    """
+    if directory is None:
+        return REGISTRY.prometheus_text()
+    dump(directory)
+    dumps = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".json"):
+            try:
+                with open(os.path.join(directory, name), encoding="utf-8") as f:
+                    dumps.append(json.load(f))
+            except (OSError, ValueError):
+                continue  # removed meanwhile
+    return REGISTRY.merged(dumps).prometheus_text()
@@ -0,0 +1,266 @@
+import gc
+import re
+import hashlib
+import logging
+import threading
+import warnings
+from collections import OrderedDict, namedtuple
+from pathlib import Path
+from typing import Callable, Dict, Iterator, Optional
+
+import torch
+
+from sct.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# A loaded NER model and the pipeline wrapping it
+LoadedModel = namedtuple("LoadedModel", ["name", "model", "pipeline"])
+
+
+def _state_tensors(module: torch.nn.Module) -> Iterator[torch.Tensor]:
+    # quantized linear layers keep their weights in packed params, only visible in the state dict
+    yield from module.parameters()
+    yield from module.buffers()
+    for value in module.state_dict(keep_vars=True).values():
+        for tensor in value if isinstance(value, tuple) else (value,):
+            if isinstance(tensor, torch.Tensor):
+                yield tensor
+
+
+def module_footprint(module: torch.nn.Module) -> int:
+    """Bytes held by the parameters, buffers and packed weights of ``module``, shared tensors counted once."""
+    seen = set()
+    total = 0
+    for tensor in _state_tensors(module):
+        if tensor.device.type == "meta":
+            continue
+        key = (tensor.untyped_storage().data_ptr(), tensor.device)
+        if key not in seen:
+            seen.add(key)
+            total += tensor.untyped_storage().nbytes()
+    return total
+
+
+def quantize_model(model: torch.nn.Module) -> torch.nn.Module:
+    """Applies dynamic int8 quantization to the linear layers of a CPU model."""
+    from torch.ao.quantization import quantize_dynamic
+
+    with warnings.catch_warnings():
+        # torch.ao.quantization is deprecated in favour of torchao, which isn't a dependency
+        warnings.simplefilter("ignore", DeprecationWarning)
+        return quantize_dynamic(model.eval(), {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def quantized_cache_path(model_name: str, revision: str, cache_dir: Optional[str] = None) -> Path:
+    """
+    Where the quantized weights of ``model_name`` are stored, keyed by the ``revision`` of the weights
+    they were quantized from and the torch version which packed them.
+    """
+    cache_dir = Path(cache_dir or Path.home() / ".cache" / "sct" / "quantized")
+    safe_name = re.sub(r"[^\w.-]+", "--", model_name.strip("/\\"))
+    safe_revision = re.sub(r"[^\w.-]+", "--", revision)
+    return cache_dir / f"{safe_name}-{safe_revision}-torch{torch.__version__}.pt"
+
+
+def model_revision(model_name: str, cache_dir: Optional[str] = None) -> Optional[str]:
+    """
+    Identifies the weights ``model_name`` resolves to, the commit of the cached Hub snapshot or,
+    for a local directory, a digest of its config and the names, sizes and modification times of
+    its files, so rewriting the weights in place changes it.
+    """
+    path = Path(model_name)
+    if path.is_dir():
+        digest = hashlib.blake2b(digest_size=16)
+        config_path = path / "config.json"
+        if config_path.exists():
+            digest.update(config_path.read_bytes())
+        for file in sorted(path.iterdir()):
+            if file.is_file():
+                stat = file.stat()
+                digest.update(f"{file.name}:{stat.st_size}:{stat.st_mtime_ns};".encode("utf-8"))
+        return f"local-{digest.hexdigest()}"
+
+    from huggingface_hub import try_to_load_from_cache
+    cached = try_to_load_from_cache(model_name, "config.json", cache_dir=cache_dir)
+    # .../models--org--name/snapshots/<commit>/config.json
+    return Path(cached).parent.name if isinstance(cached, str) else None
+
+
+_PACKED = "._packed_params._packed_params"
+
+
+def _pack_quantized_state(state: Dict[str, object]) -> Dict[str, torch.Tensor]:
+    """
+    Stores the packed (weight, bias) of the quantized linear layers as plain tensors. Pickled
+    quantized tensors and dtypes are looked up by name in every imported module on save, which
+    fails on lazy modules like transformers that raise ImportError for names they don't know.
+    """
+    packed = {}
+    for key, value in state.items():
+        if key.endswith(_PACKED):
+            prefix = key[:-len(_PACKED)]
+            weight, bias = value
+            packed[f"{prefix}.weight_int8"] = weight.int_repr()
+            packed[f"{prefix}.weight_scale"] = torch.tensor(weight.q_scale(), dtype=torch.float64)
+            packed[f"{prefix}.weight_zero_point"] = torch.tensor(weight.q_zero_point())
+            if bias is not None:
+                packed[f"{prefix}.bias"] = bias
+        elif isinstance(value, torch.Tensor):
+            packed[key] = value
+    return packed
+
+
+def _unpack_quantized_state(packed: Dict[str, torch.Tensor]) -> Dict[str, object]:
+    """Inverse of ``_pack_quantized_state``."""
+    state = dict(packed)
+    for key in [key for key in packed if key.endswith(".weight_int8")]:
+        prefix = key[:-len(".weight_int8")]
+        weight = torch._make_per_tensor_quantized_tensor(
+            state.pop(key), state.pop(f"{prefix}.weight_scale").item(), state.pop(f"{prefix}.weight_zero_point").item())
+        state[prefix + _PACKED] = (weight, state.pop(f"{prefix}.bias", None))
+        state[f"{prefix}._packed_params.dtype"] = torch.qint8
+    return state
+
+
+def load_quantized_model(model_name: str, load_model: Callable[[], torch.nn.Module],
+                         build_model: Callable[[], torch.nn.Module], cache_dir: Optional[str] = None,
+                         revision: Optional[Callable[[], Optional[str]]] = None) -> torch.nn.Module:
+    """
+    Returns the int8 quantized ``model_name``. If this revision of it was quantized before, the
+    architecture from ``build_model`` is quantized and the stored weights are loaded into it,
+    skipping the fp32 checkpoint. Otherwise the fp32 model from ``load_model`` is quantized and
+    stored for the next time.
+
+    ``revision`` returns the revision of the weights ``load_model`` loads, by default
+    ``model_revision(model_name)``. When it is unknown, e.g. before a Hub model is downloaded,
+    nothing stored is used.
+    """
+    revision = revision or (lambda: model_revision(model_name))
+    current = revision()
+    path = quantized_cache_path(model_name, current, cache_dir) if current else None
+    if path is not None and path.exists():
+        try:
+            model = quantize_model(build_model())
+            state = model.state_dict()  # keeps the module versions the packed params format depends on
+            state.update(_unpack_quantized_state(torch.load(path, map_location="cpu", weights_only=True)))
+            model.load_state_dict(state)
+            return model
+        except Exception as e:
+            logger.warning(f"Ignoring unusable quantized weights {path}: {e}")
+
+    model = quantize_model(load_model())
+    current = current or revision()  # known once load_model downloaded the model
+    if not current:
+        logger.info(f"Not storing the quantized weights of {model_name}, its revision is unknown")
+        return model
+    path = quantized_cache_path(model_name, current, cache_dir)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        torch.save(_pack_quantized_state(model.state_dict()), tmp_path)
+        tmp_path.replace(path)
+    except OSError as e:
+        logger.warning(f"Could not store quantized weights {path}: {e}")
+    return model
+
+
+class ModelManager:
+    """
+    Loads models on demand and keeps their total footprint within ``memory_budget_mb``,
+    evicting the least recently used model when loading another one would exceed it.
+    Without a budget every registered model stays loaded once used.
+    """
+
+    def __init__(self, memory_budget_mb: Optional[float] = None):
+        self.memory_budget = int(memory_budget_mb * 1024 ** 2) if memory_budget_mb else None
+        self._loaders: Dict[str, Callable[[], LoadedModel]] = {}
+        self._loaded: "OrderedDict[str, LoadedModel]" = OrderedDict()
+        self._footprints: Dict[str, int] = {}  # last measured footprint, also kept after eviction
+        self._lock = threading.RLock()
+        self.loads = 0
+        self.evictions = 0
+        self.hits = 0
+
+    def register(self, key: str, loader: Callable[[], LoadedModel]) -> None:
+        """Registers how to load ``key``, evicting a previously loaded model under that key."""
+        with self._lock:
+            self.evict(key)
+            self._loaders[key] = loader
+            self._footprints.pop(key, None)
+
+    def get(self, key: str) -> LoadedModel:
+        """Returns the model for ``key``, loading it (and evicting others) if needed."""
+        with self._lock:
+            if key in self._loaded:
+                self._loaded.move_to_end(key)
+                self.hits += 1
+                if metrics.active():
+                    metrics.CACHE_REQUESTS.inc(cache="model", result="hit")
+                return self._loaded[key]
+
+            if key not in self._loaders:
+                raise KeyError(f"No model registered for {key!r}")
+
+            # make room up front when the size is known from an earlier load
+            self._evict_for(self._footprints.get(key, 0))
+            loaded = self._loaders[key]()
+            self.loads += 1
+            if metrics.active():
+                metrics.CACHE_REQUESTS.inc(cache="model", result="miss")
+            self._footprints[key] = module_footprint(loaded.model)
+            self._loaded[key] = loaded
+            self._evict_for(0, keep=key)
+
+            if self.memory_budget and self._footprints[key] > self.memory_budget:
+                logger.warning(f"Model {loaded.name} alone exceeds the memory budget")
+            return loaded
+
+    def _evict_for(self, incoming: int, keep: str = None) -> None:
+        if not self.memory_budget:
+            return
+        while self._loaded and self.memory_used + incoming > self.memory_budget:
+            victim = next(iter(self._loaded))
+            if victim == keep:
+                break
+            self.evict(victim)
+
+    def evict(self, key: str) -> bool:
+        """Drops the model loaded under ``key``, returns whether one was loaded."""
+        with self._lock:
+            loaded = self._loaded.pop(key, None)
+            if loaded is None:
+                return False
+            on_cuda = any(p.is_cuda for p in loaded.model.parameters())
+            del loaded
+            self.evictions += 1
+            gc.collect()
+            if on_cuda:
+                torch.cuda.empty_cache()
+            return True
+
+    def evict_all(self) -> None:
+        with self._lock:
+            for key in list(self._loaded):
+                self.evict(key)
+
+    def is_loaded(self, key: str) -> bool:
+        return key in self._loaded
+
+    def loaded(self) -> Dict[str, LoadedModel]:
+        """The currently loaded models, least recently used first."""
+        return dict(self._loaded)
+
+    @property
+    def memory_used(self) -> int:
+        return sum(self._footprints[key] for key in self._loaded)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "hits": self.hits,
+            "loaded": list(self._loaded),
+            "memory_used_mb": round(self.memory_used / 1024 ** 2, 1),
+            "memory_budget_mb": round(self.memory_budget / 1024 ** 2, 1) if self.memory_budget else None,
+        }
@@ -3,18 +3,18 @@ import torch
 import itertools
 from collections import defaultdict
 import logging
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Union
 from pathlib import Path
 
 import transformers
-from transformers import AutoTokenizer, AutoModelForTokenClassification, pipeline
+from transformers import AutoConfig, AutoTokenizer, AutoModelForTokenClassification, pipeline
 
 from presidio_anonymizer import AnonymizerEngine
 from presidio_anonymizer.entities import RecognizerResult
 
-from sct.utils import constants
+from sct.utils import autotune, constants, metrics, snapshot
+from sct.utils.models import LoadedModel, ModelManager, load_quantized_model, model_revision
 from sct import config
-from sct.config import NER_MODELS_LIST
 
 transformers.logging.set_verbosity_error() 
 
@@ -30,15 +30,30 @@ class GeneralNER:
     To tag [PER, LOC, ORG, MISC] postional tags using ensemble technique
     """
     
-    def __init__(self, cache_dir: Optional[Path] = None, device: str = None):
+    # language key of each model, in the order of NER_MODELS_LIST
+    MODEL_KEYS = ["en", "nl", "de", "es", "multi"]
+    
+    def __init__(self, cache_dir: Optional[Path] = None, device: str = None, memory_budget_mb: float = None,
+                 quantize: bool = None):
         """Initialize NER models.
         
         Args:
             cache_dir: Optional directory for caching models
             device: Device to use for inference ('cuda' or 'cpu'). If None, will auto-detect.
+            memory_budget_mb: Optional RAM budget for the models, default config.NER_MEMORY_BUDGET_MB.
+                If set, models are loaded on first use and the least recently used one is
+                evicted when the budget would be exceeded, otherwise all are loaded upfront.
+            quantize: Whether to run int8 dynamically quantized models on CPU, default config.NER_QUANTIZE.
         """
         self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
         logger.info(f"Using device: {self.device}")
+        self.quantize = config.NER_QUANTIZE if quantize is None else quantize
+        if self.quantize and self.device != "cpu":
+            logger.warning("Dynamic quantization is only supported on CPU, using the fp32 models")
+            self.quantize = False
+        self.models = ModelManager(memory_budget_mb or config.NER_MEMORY_BUDGET_MB)
+        self.autotuner = autotune.BatchSizeTuner(
+            config.NER_AUTOTUNE_PATH, self.device, config.NER_AUTOTUNE_MEMORY_MB) if config.NER_AUTOTUNE else None
         
         # Default model names as fallback
         DEFAULT_MODELS = [
@@ -52,9 +67,14 @@ class GeneralNER:
         try:
             self.engine = AnonymizerEngine()
             
-            # Use config if valid, otherwise fallback to defaults
-            if len(NER_MODELS_LIST) == 5:
-                model_names = NER_MODELS_LIST
+            # Use a snapshot if configured, then the config if valid, otherwise fallback to defaults
+            self.snapshot = None
+            if config.NER_SNAPSHOT_DIR:
+                self.snapshot = snapshot.read_manifest(config.NER_SNAPSHOT_DIR)
+                model_names = [str(Path(config.NER_SNAPSHOT_DIR) / key) for key in self.MODEL_KEYS]
+                logger.info(f"Using the model snapshot {config.NER_SNAPSHOT_DIR}")
+            elif len(config.NER_MODELS_LIST) == 5:
+                model_names = config.NER_MODELS_LIST
                 logger.info("Using models from config")
             else:
                 model_names = DEFAULT_MODELS
@@ -79,41 +99,76 @@ class GeneralNER:
             raise ModelLoadError(f"NER initialization failed: {e}")
 
     def _load_models(self, model_names: List[str], cache_args: Dict[str, str]) -> None:
-        """Load NER models with caching support."""
+        """
+        Load NER tokenizers and register the models with caching support.
+        Models are loaded right away unless a memory budget is set.
+        """
+        self.model_names = dict(zip(self.MODEL_KEYS, model_names))
+        self.cache_dir = cache_args.get("cache_dir")
         try:
-            # Load models sequentially with proper error handling
-            for i, model_name in enumerate(model_names):
-                logger.info(f"Loading model {model_name}")
-                if i == 0:  # English
-                    self.en_tokenizer = AutoTokenizer.from_pretrained(model_name, **cache_args)
-                    self.en_model = AutoModelForTokenClassification.from_pretrained(model_name, **cache_args).to(self.device)
-                    self.en_ner_pipeline = pipeline("ner", model=self.en_model, tokenizer=self.en_tokenizer, 
-                                                  aggregation_strategy="simple", device=self.device)
-                elif i == 1:  # Dutch
-                    self.nl_tokenizer = AutoTokenizer.from_pretrained(model_name, **cache_args)
-                    self.nl_model = AutoModelForTokenClassification.from_pretrained(model_name, **cache_args).to(self.device)
-                    self.nl_ner_pipeline = pipeline("ner", model=self.nl_model, tokenizer=self.nl_tokenizer,
-                                                  aggregation_strategy="simple", device=self.device)
-                elif i == 2:  # German
-                    self.de_tokenizer = AutoTokenizer.from_pretrained(model_name, **cache_args)
-                    self.de_model = AutoModelForTokenClassification.from_pretrained(model_name, **cache_args).to(self.device)
-                    self.de_ner_pipeline = pipeline("ner", model=self.de_model, tokenizer=self.de_tokenizer,
-                                                  aggregation_strategy="simple", device=self.device)
-                elif i == 3:  # Spanish
-                    self.es_tokenizer = AutoTokenizer.from_pretrained(model_name, **cache_args)
-                    self.es_model = AutoModelForTokenClassification.from_pretrained(model_name, **cache_args).to(self.device)
-                    self.es_ner_pipeline = pipeline("ner", model=self.es_model, tokenizer=self.es_tokenizer,
-                                                  aggregation_strategy="simple", device=self.device)
-                elif i == 4:  # Multilingual
-                    self.multi_tokenizer = AutoTokenizer.from_pretrained(model_name, **cache_args)
-                    self.multi_model = AutoModelForTokenClassification.from_pretrained(model_name, **cache_args).to(self.device)
-                    self.multi_ner_pipeline = pipeline("ner", model=self.multi_model, tokenizer=self.multi_tokenizer,
-                                                     aggregation_strategy="simple", device=self.device)
+            # Load tokenizers sequentially with proper error handling, they are small and always kept
+            for key, model_name in zip(self.MODEL_KEYS, model_names):
+                logger.info(f"Loading tokenizer {model_name}")
+                tokenizer = AutoTokenizer.from_pretrained(model_name, **cache_args)
+                setattr(self, f"{key}_tokenizer", tokenizer)
+                self.models.register(key, self._model_loader(model_name, tokenizer, cache_args))
+            
+            if not self.models.memory_budget:
+                for key in self.MODEL_KEYS[:len(model_names)]:
+                    self.models.get(key)
                 
         except Exception as e:
             logger.error(f"Failed to load model {model_name}: {e}")
             raise ModelLoadError(f"Model loading failed: {e}")
 
+    def _model_loader(self, model_name: str, tokenizer, cache_args: Dict[str, str]):
+        """Returns a function loading ``model_name`` and its pipeline."""
+        def load():
+            logger.info(f"Loading model {model_name}")
+            if self.snapshot:
+                load_model = lambda: snapshot.load_model(model_name)
+            else:
+                load_model = lambda: AutoModelForTokenClassification.from_pretrained(model_name, **cache_args)
+            if self.quantize:
+                build_model = lambda: AutoModelForTokenClassification.from_config(
+                    AutoConfig.from_pretrained(model_name, **cache_args))
+                model = load_quantized_model(model_name, load_model, build_model, config.NER_QUANTIZED_CACHE_DIR,
+                                             revision=lambda: model_revision(model_name, self.cache_dir))
+            else:
+                model = load_model().to(self.device)
+            ner_pipeline = pipeline("ner", model=model, tokenizer=tokenizer,
+                                    aggregation_strategy="simple", device=self.device)
+            return LoadedModel(model_name, model, ner_pipeline)
+        return load
+
+    def __getattr__(self, name):
+        # en_model, en_ner_pipeline, ... resolve through the model manager, loading on demand
+        key, _, attribute = name.partition("_")
+        if key in GeneralNER.MODEL_KEYS and attribute in ("model", "ner_pipeline") and "models" in self.__dict__:
+            try:
+                loaded = self.models.get(key)
+            except KeyError:
+                raise AttributeError(name)
+            return loaded.model if attribute == "model" else loaded.pipeline
+        raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+
+    def loaded_models(self) -> Dict[str, str]:
+        """Returns the name or path of each loaded model, by language key."""
+        return {key: loaded.name for key, loaded in self.models.loaded().items()}
+
+    def model_versions(self) -> Dict[str, Dict[str, Any]]:
+        """Returns the name and revision of every configured model, by language key, to record with results."""
+        if self.snapshot:
+            # the models the snapshot was written from, wherever it was copied to
+            return {
+                key: {"name": model["name"], "revision": model["revision"], "quantized": self.quantize}
+                for key, model in self.snapshot["models"].items()
+            }
+        return {
+            key: {"name": name, "revision": model_revision(name, self.cache_dir), "quantized": self.quantize}
+            for key, name in self.model_names.items()
+        }
+
     def ner_data(self, data, pos):
         """
         Formats NER (Named Entity Recognition) files.
@@ -188,7 +243,6 @@ class GeneralNER:
         
         return filter_ner_results
     
-    @torch.no_grad()
     def ner_process(
         self, 
         text: str,
@@ -200,106 +254,180 @@ class GeneralNER:
         if not positional_tags:
             raise ValueError("Must provide at least one positional tag")
         
-        ner_confidence_threshold = ner_confidence_threshold or 0.85
+        return self.process_batch(
+            [text],
+            batch_size=1,
+            positional_tags=positional_tags,
+            ner_confidence_threshold=ner_confidence_threshold,
+            language=language
+        )[0]
+    
+    def anonymize_chunk(self, text_chunk, ner_results, ner_confidence_threshold):
+        """Anonymizes the entities found in one chunk which meet the confidence threshold."""
+        # Apply confidence threshold before filtering
+        confident_results = [r for r in ner_results if r['score'] >= ner_confidence_threshold]
         
-        # Split long text into chunks
-        texts = self.split_text(text, self.min_token_length, self.tokenizer)
-        ner_clean_text = []
+        if not confident_results:
+            # If no entities meet the confidence threshold, return original text
+            return text_chunk
         
-        for text_chunk in texts:
-            ner_results = []
-            
-            # First try language-specific pipeline if specified
-            if language == 'DUTCH':
-                ner_results.extend(self.ner_data(self.nl_ner_pipeline(text_chunk), positional_tags))
-            elif language == 'GERMAN':
-                ner_results.extend(self.ner_data(self.de_ner_pipeline(text_chunk), positional_tags))
-            elif language == 'SPANISH':
-                ner_results.extend(self.ner_data(self.es_ner_pipeline(text_chunk), positional_tags))
-            else:
-                # For English or unspecified, try English first then multilingual
-                en_results = self.ner_data(self.en_ner_pipeline(text_chunk), positional_tags)
-                if en_results:  # If English model finds entities, use those
-                    ner_results.extend(en_results)
-                else:  # Otherwise try multilingual model
-                    ner_results.extend(self.ner_data(self.multi_ner_pipeline(text_chunk), positional_tags))
-            
-            # Apply confidence threshold before filtering
-            confident_results = [r for r in ner_results if r['score'] >= ner_confidence_threshold]
-            
-            if confident_results:
-                # Get unique entities with highest confidence
-                keys = list(set(item['key'] for item in confident_results))
-                filtered_data = self.filter_ner_data(confident_results, keys)
-                
-                # Anonymize text
-                ner_text = self.anonymize_text(text_chunk, filtered_data).text
-            else:
-                # If no entities meet the confidence threshold, return original text
-                ner_text = text_chunk
-            
-            ner_clean_text.append(ner_text)
+        # Get unique entities with highest confidence
+        keys = list(set(item['key'] for item in confident_results))
+        filtered_data = self.filter_ner_data(confident_results, keys)
+        if metrics.active():
+            for item in filtered_data:
+                metrics.ENTITIES.inc(tag=item['entity_group'])
         
-        return ' '.join(ner_clean_text)
+        # Anonymize text
+        return self.anonymize_text(text_chunk, filtered_data).text
     
     def split_text(self, text: str, max_tokens: int, tokenizer) -> List[str]:
-        """Split text into chunks optimized for model processing."""
+        """
+        Split text into chunks optimized for model processing.
+        Chunks end at a word boundary once ``max_tokens`` is reached (or hard at the tokenizer
+        limit), so they partition the text and can be joined back without adding spaces.
+        """
         # Cache tokenizer results
         tokenized_text = tokenizer(text, return_offsets_mapping=True)
+        hard_max = max(max_tokens, getattr(tokenizer, 'max_len_single_sentence', max_tokens))
         
         chunks = []
-        current_chunk = []
         current_tokens = 0
         last_end = 0
         
         for start, end in tokenized_text.offset_mapping:
-            if current_tokens >= max_tokens:
+            if current_tokens >= max_tokens and start > last_end and (
+                text[start - 1].isspace() or current_tokens >= hard_max
+            ):
                 chunks.append(text[last_end:start])
-                current_chunk = []
                 current_tokens = 0
                 last_end = start
                 
-            current_chunk.append(text[start:end])
             current_tokens += 1
             
-        if current_chunk:
+        if current_tokens:
             chunks.append(text[last_end:])
             
         return chunks
 
+    def model_key(self, language: str) -> str:
+        """Returns the key of the language specific model, English for any other language."""
+        if language == 'DUTCH':
+            return 'nl'
+        if language == 'GERMAN':
+            return 'de'
+        if language == 'SPANISH':
+            return 'es'
+        return 'en'
+
+    def run_pipeline(self, key: str, chunks: List[str], batch_size: int, positional_tags: List[str]):
+        """Runs ``chunks`` through the ``key`` model in batches of ``batch_size`` and formats the entities."""
+        if not chunks:
+            return []
+        ner_pipeline = self.models.get(key).pipeline
+        if metrics.active():
+            metrics.NER_INVOCATIONS.inc(model=key)
+            metrics.NER_CHUNKS_PROCESSED.inc(len(chunks), model=key)
+        if self.autotuner is not None:
+            outputs = self.run_autotuned(key, ner_pipeline, chunks, batch_size)
+        else:
+            outputs = ner_pipeline(chunks, batch_size=batch_size)
+        return [self.ner_data(entities, positional_tags) for entities in outputs]
+
+    def run_autotuned(self, key: str, ner_pipeline, chunks: List[str], batch_size: int):
+        """
+        Runs ``chunks`` through the pipeline with the autotuned batch size of the ``key`` model,
+        ``batch_size`` until it is tuned, halving it for this process when memory runs out.
+        """
+        tuner = self.autotuner
+        model = tuner.model_id(self.model_names[key], self.quantize)
+        tokenizer = getattr(self, f"{key}_tokenizer")
+        run = lambda sample, size: list(ner_pipeline(sample, batch_size=size))
+        count_tokens = lambda sample: sum(len(ids) for ids in tokenizer(sample, truncation=True)["input_ids"])
+        batch_size = tuner.batch_size(model, chunks, run, count_tokens, batch_size)
+        while True:
+            measure = autotune.track_peak(tuner.device)
+            try:
+                outputs = run(chunks, batch_size)
+            except (RuntimeError, MemoryError) as e:
+                if batch_size == 1 or not autotune.is_out_of_memory(e):
+                    raise
+                batch_size = tuner.back_off(model, batch_size)
+                continue
+            if batch_size > 1 and tuner.under_pressure(*measure()):
+                tuner.back_off(model, batch_size)
+            return outputs
+
+    @torch.no_grad()
     def process_batch(
         self, 
         texts: List[str], 
         batch_size: int = 8,
         positional_tags: List[str] = None,
         ner_confidence_threshold: float = None,
-        language: str = None
+        language: Union[str, List[str]] = None
     ) -> List[str]:
         """Process multiple texts efficiently in batches.
         
+        The chunks of all texts are grouped by model and every model runs over its
+        chunks in batched forward passes.
+        
         Args:
             texts: List of input texts
-            batch_size: Number of texts to process simultaneously
+            batch_size: Number of chunks per forward pass
             positional_tags: List of entity types to detect
             ner_confidence_threshold: Minimum confidence score for entity detection
-            language: Language of the input texts
+            language: Language of the input texts, or a list with the language of each text
             
         Returns:
             List of processed texts with entities anonymized
         """
-        results = []
-        for i in range(0, len(texts), batch_size):
-            batch = texts[i:i + batch_size]
-            batch_results = [
-                self.ner_process(
-                    text,
-                    positional_tags=positional_tags,
-                    ner_confidence_threshold=ner_confidence_threshold,
-                    language=language
-                ) for text in batch
-            ]
-            results.extend(batch_results)
-        return results
+        if not texts:
+            return []
+        if not positional_tags:
+            raise ValueError("Must provide at least one positional tag")
+        if any(not isinstance(text, str) for text in texts):
+            raise ValueError("All texts must be strings")
+        
+        ner_confidence_threshold = ner_confidence_threshold or 0.85
+        languages = language if isinstance(language, list) else [language] * len(texts)
+        
+        # Split long texts into chunks, remembering which text each chunk belongs to
+        chunks, owners = [], []
+        for i, text in enumerate(texts):
+            for text_chunk in self.split_text(text, self.min_token_length, self.tokenizer):
+                chunks.append(text_chunk)
+                owners.append(i)
+        if metrics.active():
+            counts = [0] * len(texts)
+            for owner in owners:
+                counts[owner] += 1
+            for count in counts:
+                metrics.NER_CHUNKS.observe(count)
+        
+        # Group the non empty chunks by the model which handles their language
+        groups = defaultdict(list)
+        for j, text_chunk in enumerate(chunks):
+            if text_chunk.strip():
+                groups[self.model_key(languages[owners[j]])].append(j)
+        
+        ner_results = [[] for _ in chunks]
+        for key, indices in groups.items():
+            outputs = self.run_pipeline(key, [chunks[j] for j in indices], batch_size, positional_tags)
+            for j, entities in zip(indices, outputs):
+                ner_results[j] = entities
+        
+        # For English or unspecified, chunks without English entities go to the multilingual model
+        retry = [j for j in groups.get('en', []) if not ner_results[j]]
+        outputs = self.run_pipeline('multi', [chunks[j] for j in retry], batch_size, positional_tags)
+        for j, entities in zip(retry, outputs):
+            ner_results[j] = entities
+        
+        ner_clean_text = [[] for _ in texts]
+        for j, text_chunk in enumerate(chunks):
+            ner_clean_text[owners[j]].append(self.anonymize_chunk(text_chunk, ner_results[j], ner_confidence_threshold))
+        
+        return [''.join(parts) for parts in ner_clean_text]
 
     def __del__(self):
         """Cleanup GPU memory when object is destroyed."""
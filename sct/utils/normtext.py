@@ -38,9 +38,7 @@ class NormaliseText:
         """
         Replace strange quotes, i.e., 〞with a single quote ' or a double quote " if it fits better.
         """
-        text = constants.SINGLE_QUOTE_REGEX.sub("'", text)
-        text = constants.DOUBLE_QUOTE_REGEX.sub('"', text)
-        return text
+        return text.translate(constants.QUOTES_TRANSLATION)
 
     def to_ascii_unicode(self, text, no_emoji=True):
         """
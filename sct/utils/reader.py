@@ -0,0 +1,169 @@
+import os
+import mmap
+import random
+import hashlib
+import logging
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class LineIndexedFile:
+    """
+    Random access to the lines of a newline delimited file, e.g. one document per line.
+
+    The file is memory-mapped and the byte offset of every line is kept in a uint64 array,
+    built once and persisted next to the file (``<file>.sctidx``) so re-opening is instant.
+    Reading a range of lines only touches the pages holding them, which makes sampling and
+    splitting the work across workers cheap on files much larger than memory.
+    """
+
+    MAGIC = b"SCTIDX01"
+    HEADER = np.dtype([("magic", "S8"), ("size", "<u8"), ("mtime_ns", "<u8"), ("count", "<u8")])
+    BLOCK_SIZE = 64 * 1024 ** 2  # bytes scanned for line breaks at once while indexing
+
+    def __init__(self, path: Union[str, Path], encoding: str = "utf-8", index_path: Union[str, Path] = None,
+                 rebuild: bool = False):
+        self.path = Path(path)
+        self.encoding = encoding
+        self.index_path = Path(index_path) if index_path else self.path.with_name(self.path.name + ".sctidx")
+        stat = os.stat(self.path)
+        self.size, self.mtime_ns = stat.st_size, stat.st_mtime_ns
+
+        self._file = open(self.path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+        self.offsets = None if rebuild else self._load_index()
+        if self.offsets is None:
+            self.offsets = self._build_index()
+            self._save_index()
+
+    def _load_index(self) -> Optional[np.ndarray]:
+        try:
+            header = np.fromfile(self.index_path, dtype=self.HEADER, count=1)
+        except (OSError, ValueError):
+            return None
+        if (len(header) != 1 or header["magic"][0] != self.MAGIC or header["size"][0] != self.size
+                or header["mtime_ns"][0] != self.mtime_ns):
+            return None  # missing, foreign or stale
+        count = int(header["count"][0])
+        return np.memmap(self.index_path, dtype="<u8", mode="r", offset=self.HEADER.itemsize, shape=(count + 1,))
+
+    def _build_index(self) -> np.ndarray:
+        """Start offset of every line followed by the end of the file."""
+        logger.info(f"Indexing the lines of {self.path}")
+        parts = [np.zeros(1, dtype="<u8")]
+        for start in range(0, self.size, self.BLOCK_SIZE):
+            block = np.frombuffer(self._mmap, dtype=np.uint8, count=min(self.BLOCK_SIZE, self.size - start), offset=start)
+            parts.append(np.flatnonzero(block == ord("\n")).astype("<u8") + (start + 1))
+        offsets = np.concatenate(parts)
+        if offsets[-1] != self.size:
+            offsets = np.append(offsets, np.array([self.size], dtype="<u8"))  # no line break at the end
+        return offsets
+
+    def _save_index(self) -> None:
+        header = np.array([(self.MAGIC, self.size, self.mtime_ns, len(self.offsets) - 1)], dtype=self.HEADER)
+        tmp_path = self.index_path.with_name(self.index_path.name + ".tmp")
+        try:
+            with open(tmp_path, "wb") as f:
+                header.tofile(f)
+                np.asarray(self.offsets, dtype="<u8").tofile(f)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            logger.warning(f"Could not store the line index {self.index_path}: {e}")
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def line(self, i: int) -> str:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(f"Line {i} out of range for {len(self)} lines")
+        line = self._mmap[int(self.offsets[i]):int(self.offsets[i + 1])].decode(self.encoding)
+        line = line[:-1] if line.endswith("\n") else line
+        return line[:-1] if line.endswith("\r") else line
+
+    def read(self, start: int = 0, stop: int = None) -> List[str]:
+        """Lines ``start`` to ``stop``, decoded from one contiguous slice of the file."""
+        start, stop, _ = slice(start, stop).indices(len(self))
+        if start >= stop:
+            return []
+        data = self._mmap[int(self.offsets[start]):int(self.offsets[stop])].decode(self.encoding)
+        lines = data.split("\n")
+        if data.endswith("\n"):
+            lines.pop()
+        return [line[:-1] if line.endswith("\r") else line for line in lines]
+
+    def raw(self, start: int = 0, stop: int = None) -> bytes:
+        """The undecoded bytes of lines ``start`` to ``stop``, line breaks included."""
+        start, stop, _ = slice(start, stop).indices(len(self))
+        if start >= stop:
+            return b""
+        return self._mmap[int(self.offsets[start]):int(self.offsets[stop])]
+
+    def sampled_digest(self, blocks: int = 64, block_size: int = 64 * 1024) -> str:
+        """
+        Hex digest of ``blocks`` evenly spaced blocks of the file, including the first and last,
+        or of the whole file when it isn't larger than them. Cheap on any size and, unlike the
+        mtime, the same for copies of the file.
+        """
+        digest = hashlib.blake2b(str(self.size).encode("ascii"), digest_size=16)
+        if self.size <= blocks * block_size:
+            digest.update(self._mmap[:])
+        else:
+            for k in range(blocks):
+                start = (self.size - block_size) * k // (blocks - 1)
+                digest.update(self._mmap[start:start + block_size])
+        return digest.hexdigest()
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            if key.step not in (None, 1):
+                return [self.line(i) for i in range(*key.indices(len(self)))]
+            return self.read(key.start or 0, key.stop)
+        return self.line(key)
+
+    def __iter__(self) -> Iterator[str]:
+        for batch in self.batches(1024):
+            yield from batch
+
+    def batches(self, batch_size: int, start: int = 0, stop: int = None) -> Iterator[List[str]]:
+        """Lines ``start`` to ``stop`` in lists of ``batch_size``, ready for ``TextCleaner.process_batch``."""
+        start, stop, _ = slice(start, stop).indices(len(self))
+        for batch_start in range(start, stop, batch_size):
+            yield self.read(batch_start, min(batch_start + batch_size, stop))
+
+    def sample(self, k: int, seed: int = None) -> List[Tuple[int, str]]:
+        """``k`` random lines with their line numbers, in file order."""
+        indices = sorted(random.Random(seed).sample(range(len(self)), min(k, len(self))))
+        return [(i, self.line(i)) for i in indices]
+
+    def split(self, n: int, by: str = "lines") -> List[Tuple[int, int]]:
+        """
+        Splits the lines into ``n`` contiguous (start, stop) ranges, of about the same number
+        of lines or, with ``by="bytes"``, of about the same size in bytes.
+        """
+        if by == "lines":
+            bounds = [len(self) * k // n for k in range(n + 1)]
+        elif by == "bytes":
+            targets = [self.size * k // n for k in range(n + 1)]
+            bounds = np.searchsorted(self.offsets[:-1], targets).tolist()
+            bounds[-1] = len(self)
+        else:
+            raise ValueError(f"Unknown split {by!r}, expected 'lines' or 'bytes'")
+        return [(bounds[k], bounds[k + 1]) for k in range(n)]
+
+    def close(self) -> None:
+        self.offsets = None
+        if isinstance(self._mmap, mmap.mmap):
+            self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,151 @@
+"""
+Pluggable regex engine used to compile the patterns in ``constants``.
+
+Supported backends, from the strictest to the most permissive:
+    re2   : linear-time RE2 engine (``google-re2``), no lookarounds or backreferences,
+            note that ``\\w``, ``\\d`` and ``\\b`` are ASCII only in RE2
+    regex : the ``regex`` module, every call is bounded by ``config.REGEX_TIMEOUT``
+    re    : the standard library engine (default)
+
+A pattern which the requested backend can't compile (missing module or unsupported
+syntax) falls back to the next backend in that order, so asking for ``re2`` gives
+RE2 where possible and a timeout-guarded ``regex`` pattern everywhere else. Every
+fallback is logged as a warning, since only the stdlib engine is left unbounded.
+"""
+import re
+import logging
+import importlib
+from sct import config
+
+try:
+    import regex
+except ImportError:
+    regex = None
+
+try:
+    import re2
+except ImportError:
+    re2 = None
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ["re2", "regex", "re"]
+
+class RegexTimeoutError(TimeoutError):
+    """Raised when a pattern runs longer than the configured timeout"""
+    pass
+
+class TimeoutPattern:
+    """
+    Wraps a compiled ``regex`` pattern so every matching call is bounded by ``timeout`` seconds.
+    Any other attribute (``pattern``, ``flags``, ``groups`` ...) is served by the wrapped pattern.
+    """
+
+    def __init__(self, pattern, timeout):
+        self._pattern = pattern
+        self.timeout = timeout
+
+    def __getattr__(self, name):
+        return getattr(self._pattern, name)
+
+    def __repr__(self):
+        return f"TimeoutPattern({self._pattern!r}, timeout={self.timeout})"
+
+    def _call(self, method, *args, **kwargs):
+        try:
+            return method(*args, timeout=self.timeout, **kwargs)
+        except TimeoutError as e:
+            raise RegexTimeoutError(
+                f"Pattern {self._pattern.pattern[:40]!r}... exceeded {self.timeout}s"
+            ) from e
+
+    def search(self, string, *args, **kwargs):
+        return self._call(self._pattern.search, string, *args, **kwargs)
+
+    def match(self, string, *args, **kwargs):
+        return self._call(self._pattern.match, string, *args, **kwargs)
+
+    def fullmatch(self, string, *args, **kwargs):
+        return self._call(self._pattern.fullmatch, string, *args, **kwargs)
+
+    def findall(self, string, *args, **kwargs):
+        return self._call(self._pattern.findall, string, *args, **kwargs)
+
+    def finditer(self, string, *args, **kwargs):
+        return iter(self._call(lambda *a, **kw: list(self._pattern.finditer(*a, **kw)), string, *args, **kwargs))
+
+    def split(self, string, *args, **kwargs):
+        return self._call(self._pattern.split, string, *args, **kwargs)
+
+    def sub(self, repl, string, *args, **kwargs):
+        return self._call(self._pattern.sub, repl, string, *args, **kwargs)
+
+    def subn(self, repl, string, *args, **kwargs):
+        return self._call(self._pattern.subn, repl, string, *args, **kwargs)
+
+def _compile_re2(pattern, flags, timeout):
+    if re2 is None or flags & ~(re.IGNORECASE | re.MULTILINE | re.DOTALL | re.UNICODE):
+        return None
+    inline = "".join(ch for flag, ch in ((re.IGNORECASE, "i"), (re.MULTILINE, "m"), (re.DOTALL, "s")) if flags & flag)
+    options = re2.Options()
+    options.log_errors = False
+    try:
+        return re2.compile(f"(?{inline}){pattern}" if inline else pattern, options)
+    except re2.error:
+        return None
+
+def _compile_regex(pattern, flags, timeout):
+    if regex is None:
+        return None
+    try:
+        compiled = regex.compile(pattern, flags)
+    except regex.error:
+        return None
+    return TimeoutPattern(compiled, timeout) if timeout else compiled
+
+def _compile_re(pattern, flags, timeout):
+    return re.compile(pattern, flags)
+
+_COMPILERS = {"re2": _compile_re2, "regex": _compile_regex, "re": _compile_re}
+
+def available_backends():
+    """Returns the backends which can be used in this environment."""
+    return [name for name, module in (("re2", re2), ("regex", regex), ("re", re)) if module is not None]
+
+def compile(pattern, flags=0, backend=None, timeout=None):
+    """
+    Compiles ``pattern`` with ``backend`` (default ``config.REGEX_BACKEND``), falling back
+    to the next backend in ``BACKENDS`` when it is not installed or can't handle the pattern.
+    Args:
+        pattern (str): regular expression
+        flags (int): ``re`` flags, only IGNORECASE, MULTILINE, DOTALL and UNICODE are accepted by RE2
+        backend (str): one of ``BACKENDS``
+        timeout (float): per-call timeout in seconds for the ``regex`` backend,
+            default ``config.REGEX_TIMEOUT``
+    """
+    backend = backend or config.REGEX_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown regex backend {backend!r}, expected one of {BACKENDS}")
+    timeout = config.REGEX_TIMEOUT if timeout is None else timeout
+
+    for name in BACKENDS[BACKENDS.index(backend):]:
+        compiled = _COMPILERS[name](pattern, flags, timeout)
+        if compiled is not None:
+            if name != backend:
+                bound = "without a time bound" if name == "re" or not timeout else f"with a {timeout}s timeout"
+                logger.warning(f"Pattern {pattern[:40]!r} compiled with {name} instead of {backend}, {bound}")
+            return compiled
+
+def use_backend(backend, timeout=None):
+    """
+    Switches the regex backend and recompiles every pattern in ``constants``, with ``timeout``
+    replacing ``config.REGEX_TIMEOUT`` when given.
+    Equivalent to setting ``config.REGEX_BACKEND`` / ``config.REGEX_TIMEOUT`` before ``sct`` is imported.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown regex backend {backend!r}, expected one of {BACKENDS}")
+    config.REGEX_BACKEND = backend
+    if timeout is not None:
+        config.REGEX_TIMEOUT = timeout
+    from sct.utils import constants
+    importlib.reload(constants)
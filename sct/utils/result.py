@@ -0,0 +1,82 @@
+from typing import Any, Callable, Optional
+
+
+class CleanResult:
+    """
+    Result of cleaning one text, returned by ``TextCleaner`` when ``config.RETURN_RESULT_OBJECTS`` is set.
+
+    The statistical model text is only computed when ``stat_text`` is first read, then cached.
+    For backward compatibility it unpacks, indexes and compares like the tuple ``TextCleaner``
+    returns otherwise, whose shape depends on the config at creation time. When the config makes
+    the result a plain string, ``TextCleaner`` returns the str rather than a ``CleanResult``, which
+    isn't str compatible: a shape 1 result only compares equal to its string.
+    """
+
+    __slots__ = ("lm_text", "language", "_stat_text", "_stat_fn", "_shape")
+
+    def __init__(self, lm_text: str, stat_text: Optional[str] = None, language: Optional[str] = None,
+                 stat_fn: Optional[Callable[[], str]] = None, shape: int = 3):
+        """
+        Args:
+            stat_text: the statistical model text if already known, otherwise computed by ``stat_fn``
+            shape: length of the equivalent tuple, 3 (lm_text, stat_text, language),
+                2 (lm_text, language) or 1 for just the lm_text, iterated and indexed as (lm_text,)
+        """
+        self.lm_text = lm_text
+        self.language = language
+        self._stat_text = stat_text
+        self._stat_fn = None if stat_text is not None else stat_fn
+        self._shape = shape
+
+    @property
+    def stat_text(self) -> Optional[str]:
+        if self._stat_fn is not None:
+            self._stat_text = self._stat_fn()
+            self._stat_fn = None  # drops the reference to the cleaner
+        return self._stat_text
+
+    def as_tuple(self):
+        """The tuple (or string) ``TextCleaner`` would have returned."""
+        if self._shape == 3:
+            return (self.lm_text, self.stat_text, self.language)
+        if self._shape == 2:
+            return (self.lm_text, self.language)
+        return self.lm_text
+
+    def _items(self):
+        return (self.lm_text,) if self._shape == 1 else self.as_tuple()
+
+    def __iter__(self):
+        return iter(self._items())
+
+    def __getitem__(self, index):
+        return self._items()[index]
+
+    def __len__(self):
+        return self._shape
+
+    def __eq__(self, other):
+        if isinstance(other, CleanResult):
+            return (self.lm_text, self.stat_text, self.language) == (other.lm_text, other.stat_text, other.language)
+        return self.as_tuple() == other
+
+    __hash__ = None
+
+    def __reduce__(self):
+        # resolve the stat text instead of pickling the cleaner behind it
+        return (CleanResult, (self.lm_text, self.stat_text, self.language, None, self._shape))
+
+    def __repr__(self):
+        stat_text = "<lazy>" if self._stat_fn is not None else repr(self._stat_text)
+        return f"CleanResult(lm_text={self.lm_text!r}, stat_text={stat_text}, language={self.language!r})"
+
+
+def result_to_json(result: Any) -> dict:
+    """Turns a ``TextCleaner`` result, whose shape depends on the config, into a JSON object."""
+    if isinstance(result, CleanResult):
+        result = result.as_tuple()
+    if isinstance(result, str):
+        return {"lm_text": result}
+    if len(result) == 2:
+        return {"lm_text": result[0], "language": result[1]}
+    return {"lm_text": result[0], "stat_text": result[1], "language": result[2]}
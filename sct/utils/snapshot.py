@@ -0,0 +1,187 @@
+"""
+Snapshots of the NER models for near-instant cold starts, written by ``sct snapshot``.
+
+A snapshot directory holds every configured model as a single safetensors file next to its
+config and tokenizer, plus a ``snapshot.json`` manifest with the original model names and
+revisions, their label maps and the language detection settings. ``load_model`` maps the
+weights file into memory and builds the model around the mapped tensors instead of copying
+them, so startup no longer depends on the model size, nothing is resolved on the Hub and the
+processes of one host share the weights through the page cache.
+
+    sct snapshot /models/sct          # once, where the models can be downloaded
+    config.NER_SNAPSHOT_DIR = "/models/sct"
+"""
+import os
+import json
+import struct
+import shutil
+import logging
+import itertools
+from pathlib import Path
+from typing import Dict, Tuple
+
+import torch
+
+from sct import config
+from sct.utils import resources
+from sct.utils.models import model_revision
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+MANIFEST = "snapshot.json"
+WEIGHTS = "model.safetensors"
+LANGUAGE_SETTINGS = ("LANGUAGE", "LANGUAGE_SAMPLE_CHARS", "LANGUAGE_SAMPLE_WINDOWS", "LANGUAGE_CONFIDENCE_THRESHOLD",
+                     "LANGUAGE_LOW_ACCURACY")
+
+_DTYPES = {
+    "F64": torch.float64, "F32": torch.float32, "F16": torch.float16, "BF16": torch.bfloat16,
+    "I64": torch.int64, "I32": torch.int32, "I16": torch.int16, "I8": torch.int8, "U8": torch.uint8,
+    "BOOL": torch.bool,
+}
+
+
+def save_weights(module: torch.nn.Module, path) -> None:
+    """
+    Writes the state of ``module`` to the safetensors file ``path``, including the buffers left
+    out of its state dict. Tensors sharing memory, e.g. tied weights, are stored once.
+    """
+    from safetensors.torch import save_file
+
+    state = module.state_dict()
+    extra = [(name, buffer) for name, buffer in module.named_buffers() if name not in state]
+    tensors, aliases, seen = {}, {}, {}
+    for name, tensor in itertools.chain(state.items(), extra):
+        key = (tensor.untyped_storage().data_ptr(), tensor.storage_offset(), tuple(tensor.shape), tensor.dtype)
+        if key in seen and tensor.numel():
+            aliases[name] = seen[key]
+            continue
+        seen[key] = name
+        tensors[name] = tensor.detach().cpu().contiguous()
+    save_file(tensors, str(path), metadata={"format": "pt", "aliases": json.dumps(aliases)})
+
+
+def load_weights(path) -> Tuple[Dict[str, torch.Tensor], Dict[str, str]]:
+    """
+    Maps the safetensors file ``path`` into memory and returns its tensors, views of the mapping,
+    and the aliases of the tensors stored once. The mapping is private: writes to a tensor
+    copy the page instead of changing the file.
+    """
+    path = str(path)
+    with open(path, "rb") as f:
+        header_size = struct.unpack("<Q", f.read(8))[0]
+        header = json.loads(f.read(header_size))
+    metadata = header.pop("__metadata__", None) or {}
+    storage = torch.UntypedStorage.from_file(path, shared=False, nbytes=os.path.getsize(path))
+
+    tensors, unaligned = {}, []
+    data_start = 8 + header_size
+    for name, info in header.items():
+        dtype = _DTYPES[info["dtype"]]
+        start = data_start + info["data_offsets"][0]
+        itemsize = torch.empty((), dtype=dtype).element_size()
+        if start % itemsize:
+            unaligned.append(name)
+            continue
+        tensors[name] = torch.empty(0, dtype=dtype).set_(storage, start // itemsize, info["shape"])
+    if unaligned:
+        # a tensor can't start in the middle of an element of its type, these few are copied
+        from safetensors import safe_open
+        with safe_open(path, framework="pt") as f:
+            for name in unaligned:
+                tensors[name] = f.get_tensor(name)
+    return tensors, json.loads(metadata.get("aliases", "{}"))
+
+
+def load_model(directory, device: str = "cpu") -> torch.nn.Module:
+    """Builds the token classification model of the snapshot ``directory`` around its mapped weights."""
+    from transformers import AutoConfig, AutoModelForTokenClassification
+
+    directory = Path(directory)
+    with torch.device("meta"):
+        model = AutoModelForTokenClassification.from_config(AutoConfig.from_pretrained(directory))
+
+    tensors, aliases = load_weights(directory / WEIGHTS)
+    for alias, name in aliases.items():
+        tensors[alias] = tensors[name]
+    state_names = set(model.state_dict())
+    model.load_state_dict({name: tensors[name] for name in state_names if name in tensors}, strict=False, assign=True)
+    for name in set(tensors) - state_names:
+        module_name, _, buffer = name.rpartition(".")
+        setattr(model.get_submodule(module_name), buffer, tensors[name])
+
+    missing = [name for name, tensor in itertools.chain(model.named_parameters(), model.named_buffers())
+               if tensor.is_meta]
+    if missing:
+        raise ValueError(f"Snapshot {directory} has no weights for {missing}")
+    model.eval()
+    return model if device == "cpu" else model.to(device)
+
+
+def write_snapshot(directory, model_names=None, cache_dir=None) -> Dict:
+    """
+    Downloads (or takes from ``cache_dir``) the NER models, default ``config.NER_MODELS_LIST``,
+    and writes the snapshot to ``directory``, which must not exist yet. Returns the manifest.
+    """
+    from transformers import AutoModelForTokenClassification, AutoTokenizer
+    from sct.utils.ner import GeneralNER
+
+    directory = Path(directory)
+    if directory.exists():
+        raise FileExistsError(f"Snapshot directory {directory} already exists")
+    model_names = list(model_names or config.NER_MODELS_LIST)
+    if len(model_names) != len(GeneralNER.MODEL_KEYS):
+        raise ValueError(f"Expected {len(GeneralNER.MODEL_KEYS)} models, got {len(model_names)}")
+    cache_args = {"cache_dir": str(cache_dir)} if cache_dir else {}
+
+    # written next to the target and renamed at the end, so a snapshot is complete or absent
+    tmp_directory = directory.with_name(directory.name + ".tmp")
+    shutil.rmtree(tmp_directory, ignore_errors=True)
+    tmp_directory.mkdir(parents=True)
+    models = {}
+    for key, model_name in zip(GeneralNER.MODEL_KEYS, model_names):
+        logger.info(f"Writing {model_name} to the snapshot")
+        model_directory = tmp_directory / key
+        tokenizer = AutoTokenizer.from_pretrained(model_name, **cache_args)
+        model = AutoModelForTokenClassification.from_pretrained(model_name, **cache_args)
+        model_directory.mkdir()
+        model.config.save_pretrained(model_directory)
+        tokenizer.save_pretrained(model_directory)
+        save_weights(model, model_directory / WEIGHTS)
+        models[key] = {
+            "name": model_name,
+            "revision": model_revision(model_name, cache_dir),
+            "labels": {str(i): label for i, label in model.config.id2label.items()},
+        }
+        del model
+
+    import transformers
+    manifest = {
+        "version": SNAPSHOT_VERSION,
+        "models": models,
+        "language": {"languages": resources.LANGUAGE_NAME,
+                     **{name.lower(): getattr(config, name) for name in LANGUAGE_SETTINGS}},
+        "libraries": {"torch": torch.__version__, "transformers": transformers.__version__},
+    }
+    with open(tmp_directory / MANIFEST, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    tmp_directory.rename(directory)
+    return manifest
+
+
+def read_manifest(directory) -> Dict:
+    """The manifest of the snapshot ``directory``, warning when the language settings differ from it."""
+    path = Path(directory) / MANIFEST
+    if not path.exists():
+        raise FileNotFoundError(f"{directory} is not a model snapshot, {MANIFEST} is missing")
+    with open(path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(f"Snapshot {directory} has version {manifest.get('version')}, expected {SNAPSHOT_VERSION}")
+
+    language = manifest.get("language", {})
+    changed = [name for name in LANGUAGE_SETTINGS
+               if name.lower() in language and language[name.lower()] != getattr(config, name)]
+    if changed or language.get("languages", resources.LANGUAGE_NAME) != resources.LANGUAGE_NAME:
+        logger.warning(f"Language detection settings differ from the snapshot {directory}: {changed or 'languages'}")
+    return manifest
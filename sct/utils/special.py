@@ -1,6 +1,3 @@
-import re
-import string
-#---
 from sct.utils import constants
 
 class ProcessSpecialSymbols:
@@ -18,10 +15,11 @@ class ProcessSpecialSymbols:
                 otherwise, pass in a string with which to replace all symbols
                 (e.g. "*CURRENCY*")
         """
-        if replace_with is None:
-            for k, v in constants.CURRENCIES.items():
-                text = text.replace(k, v)
+        if not constants.PREFILTERS["CURRENCY_REGEX"](text):
             return text
+        if replace_with is None:
+            text = constants.MULTI_CHAR_CURRENCY_REGEX.sub(lambda m: constants.CURRENCIES[m.group()], text)
+            return text.translate(constants.CURRENCY_TRANSLATION)
         else:
             return constants.CURRENCY_REGEX.sub(replace_with, text)
         
@@ -38,13 +36,15 @@ class ProcessSpecialSymbols:
         """
         Removes any isolated symbols which shouldn't be present in the text.
         """
-        cleaned_text = re.sub(r'\[[^\]]+\]', '', text) # to remove [] content, usianlly they are image or file loc text
-        cleaned_text = re.sub(r'\{[^}]+\}', '', cleaned_text) # to remove {}} content, usianlly they are html links
+        cleaned_text = constants.SQUARE_BRACKETS_REGEX.sub('', text)
+        cleaned_text = constants.CURLY_BRACKETS_REGEX.sub('', cleaned_text)
         cleaned_text = constants.ISOLATED_SPECIAL_SYMBOLS_REGEX.sub('', cleaned_text)
-        cleaned_text = re.sub(r"(?<![a-zA-Z0-9])['\"\-*%](?![a-zA-Z0-9])", '', cleaned_text, flags=re.UNICODE | re.IGNORECASE)
+        cleaned_text = constants.ISOLATED_MARKS_REGEX.sub('', cleaned_text)
         
         return cleaned_text
     
     def remove_punctuation(self, text):
-        chars = re.escape(string.punctuation)
-        return re.sub('['+chars+']', '',text)
\ No newline at end of file
+        """
+        Removes all the ascii punctuation characters in a single pass.
+        """
+        return text.translate(constants.PUNCTUATION_TRANSLATION)
\ No newline at end of file
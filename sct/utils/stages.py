@@ -0,0 +1,238 @@
+"""
+Registry of the pipeline stages ``TextCleaner`` runs before NER, built-in and user defined.
+
+Every stage declares what the pipeline builder needs to order it: its cost class, whether it
+shortens the text, whether running it twice changes nothing, the placeholders it emits (e.g.
+``"EMAIL"``) or consumes, and the stages it must follow. ``build_order`` keeps the registration
+order by default and, with ``optimize=True``, moves cheap length-reducing stages ahead of
+expensive ones wherever the declared dependencies allow, so less text reaches e.g. ftfy.
+
+Batch-safe stages give the same result on texts joined with ``BATCH_SEPARATOR`` as on each text
+on its own: no match crosses the separator and the text edges look the same to the patterns as
+the start and end of a string. ``TextCleaner`` runs them once over a joined batch of short texts.
+
+    @register_stage("replace_ibans", cost="cheap", reduces_length=True, emits=["IBAN"],
+                    after=["to_ascii_unicode"], before=["replace_numbers"])
+    def replace_ibans(text):
+        return IBAN_REGEX.sub("<IBAN>", text)
+"""
+import functools
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List
+
+from sct import config
+from sct.utils import checkpoint
+
+COST_CLASSES = ("cheap", "moderate", "expensive", "model")
+
+# the line breaks end every \S and [^\s...] run and satisfy the (?<=[^\w...]) lookbehinds like the
+# start of a string, the NUL between them stops the optional "\s?ext" tail of phone numbers.
+# Texts containing a NUL are never joined, so the separator can't be confused with their content.
+BATCH_SEPARATOR = "\n\x00\n"
+
+
+class Stage:
+    """
+    A pipeline stage and the metadata used to order it.
+    Args:
+        name: unique name, for the built-in stages the ``TextCleaner`` method implementing it
+        function: callable taking and returning the text, None for the built-in stages
+        check: name of the ``config`` flag enabling the stage, None if always enabled
+        cost: one of COST_CLASSES
+        reduces_length: whether the output is usually shorter than the input
+        emits: placeholders the stage inserts, stages consuming them run after it
+        consumes: placeholders the stage works on
+        after: stages which must run first when enabled
+        before: stages which must run after it when enabled
+        pinned: keep the registration position relative to every other stage
+        config: ``config`` settings the output depends on, for the checkpoint fingerprints
+        batch_safe: whether the stage can run over texts joined with ``BATCH_SEPARATOR``
+        version: bump it when the output changes for the same input and config, which
+            invalidates the checkpoints of this and the later stages
+    """
+
+    __slots__ = ("name", "function", "check", "cost", "reduces_length", "emits", "consumes", "after",
+                 "before", "pinned", "config", "batch_safe", "version")
+
+    def __init__(self, name: str, function: Callable[[str], str] = None, check: str = None, cost: str = "moderate",
+                 reduces_length: bool = False, emits: Iterable[str] = (),
+                 consumes: Iterable[str] = (), after: Iterable[str] = (), before: Iterable[str] = (),
+                 pinned: bool = False, config: Iterable[str] = (), batch_safe: bool = False, version: str = None):
+        if cost not in COST_CLASSES:
+            raise ValueError(f"Unknown cost class {cost!r} of stage {name!r}, expected one of {COST_CLASSES}")
+        self.name = name
+        self.function = function
+        self.check = check
+        self.cost = cost
+        self.reduces_length = reduces_length
+        self.emits = frozenset(emits)
+        self.consumes = frozenset(consumes)
+        self.after = tuple(after)
+        self.before = tuple(before)
+        self.pinned = pinned
+        self.config = tuple(config)
+        self.batch_safe = batch_safe
+        self.version = version
+
+    def enabled(self) -> bool:
+        return self.check is None or bool(getattr(config, self.check))
+
+    def priority(self):
+        """Scheduling order among stages free to run, cheap and length-reducing first."""
+        return COST_CLASSES.index(self.cost), not self.reduces_length
+
+    def __repr__(self):
+        return f"Stage({self.name!r}, cost={self.cost!r}, reduces_length={self.reduces_length})"
+
+
+# in the default order, ner_process is not a stage here as it always runs last and batched
+_REGEX_STAGES = ["replace_urls", "replace_emails", "replace_years", "replace_phone_numbers", "replace_numbers",
+                 "replace_currency_symbols"]
+
+REGISTRY: Dict[str, Stage] = OrderedDict((stage.name, stage) for stage in [
+    # runs on the raw text, any change before it would change the detected language
+    Stage("detect_language", cost="expensive", pinned=True),
+    Stage("fix_bad_unicode", check="CHECK_FIX_BAD_UNICODE", cost="expensive"),
+    Stage("to_ascii_unicode", check="CHECK_TO_ASCII_UNICODE", after=["fix_bad_unicode"]),
+    # tags and entities are ASCII, stripping them first leaves less for the unicode fixes
+    Stage("replace_html", check="CHECK_REPLACE_HTML", reduces_length=True, emits=["HTML"]),
+    # the patterns match non-ASCII characters, so they need the normalised text, and the
+    # broader patterns must run before the ones matching parts of their matches
+    Stage("replace_urls", check="CHECK_REPLACE_URLS", cost="cheap", reduces_length=True, emits=["URL"],
+          after=["to_ascii_unicode", "replace_html"], batch_safe=True),
+    Stage("replace_emails", check="CHECK_REPLACE_EMAILS", cost="cheap", reduces_length=True, emits=["EMAIL"],
+          after=["replace_urls"], batch_safe=True),
+    Stage("replace_years", check="CHECK_REPLACE_YEARS", cost="cheap", emits=["YEAR"], after=["replace_emails"],
+          batch_safe=True),
+    Stage("replace_phone_numbers", check="CHECK_REPLACE_PHONE_NUMBERS", cost="cheap", reduces_length=True,
+          emits=["PHONE"], after=["replace_years"], batch_safe=True),
+    # not batch-safe, "(?:$|(?=\b))" takes a trailing "," or "." at the end of a string only
+    Stage("replace_numbers", check="CHECK_REPLACE_NUMBERS", cost="cheap", emits=["NUMBER"],
+          after=["replace_phone_numbers"]),
+    Stage("replace_currency_symbols", check="CHECK_REPLACE_CURRENCY_SYMBOLS", cost="cheap",
+          after=["replace_numbers"], batch_safe=True),
+    # work on the whitespace and symbols left around the placeholders, not batch-safe: the
+    # isolated letters take the line break before them, brackets and whitespace runs span lines
+    Stage("remove_isolated_letters", check="CHECK_REMOVE_ISOLATED_LETTERS", cost="cheap", reduces_length=True,
+          after=_REGEX_STAGES),
+    Stage("remove_isolated_special_symbols", check="CHECK_REMOVE_ISOLATED_SPECIAL_SYMBOLS", cost="cheap",
+          reduces_length=True, after=["remove_isolated_letters"]),
+    Stage("normalize_whitespace", check="CHECK_NORMALIZE_WHITESPACE", cost="cheap", reduces_length=True,
+          after=["remove_isolated_special_symbols"]),
+])
+
+for _stage in REGISTRY.values():
+    _stage.config = tuple(checkpoint.STAGE_CONFIG.get(_stage.name, []))
+
+
+def register_stage(name: str, function: Callable[[str], str] = None, replace: bool = False, **metadata):
+    """
+    Adds a user stage to the pipeline of the ``TextCleaner`` objects created afterwards, see ``Stage``
+    for the ``metadata``. Works as a decorator when ``function`` is omitted. Returns the function.
+    """
+    if function is None:
+        return lambda function: register_stage(name, function, replace=replace, **metadata)
+    if name in REGISTRY and not replace:
+        raise ValueError(f"Stage {name!r} is already registered, pass replace=True to override it")
+    if name == "ner_process":
+        raise ValueError("ner_process always runs last and can't be replaced")
+
+    stage_function = function
+    if getattr(function, "__name__", None) != name:
+        # the pipeline identifies stages by their __name__, e.g. for the checkpoints
+        stage_function = functools.wraps(function)(lambda text: function(text))
+        stage_function.__name__ = name
+    stage = Stage(name, stage_function, **metadata)
+    REGISTRY[name] = stage
+    checkpoint.STAGE_CONFIG[name] = list(stage.config)
+    if stage.version is None:
+        checkpoint.STAGE_VERSIONS.pop(name, None)
+    else:
+        checkpoint.STAGE_VERSIONS[name] = stage.version
+    return function
+
+
+def unregister_stage(name: str) -> None:
+    stage = REGISTRY.get(name)
+    if stage is None or stage.function is None:
+        raise ValueError(f"{name!r} is not a registered user stage")
+    del REGISTRY[name]
+    checkpoint.STAGE_CONFIG.pop(name, None)
+    checkpoint.STAGE_VERSIONS.pop(name, None)
+
+
+def _dependencies(stages: List[Stage]) -> Dict[str, set]:
+    """The names of the stages each stage must follow, transitively, over all of ``stages``."""
+    names = [stage.name for stage in stages]
+    known = set(names)
+    direct = {name: set() for name in names}
+    emitters = {}
+    for stage in stages:
+        for placeholder in stage.emits:
+            emitters.setdefault(placeholder, set()).add(stage.name)
+    for position, stage in enumerate(stages):
+        for other in stage.after:
+            if other not in known:
+                raise ValueError(f"Stage {stage.name!r} runs after unknown stage {other!r}")
+            direct[stage.name].add(other)
+        for other in stage.before:
+            if other not in known:
+                raise ValueError(f"Stage {stage.name!r} runs before unknown stage {other!r}")
+            direct[other].add(stage.name)
+        for placeholder in stage.consumes:
+            direct[stage.name].update(emitters.get(placeholder, set()) - {stage.name})
+        if stage.pinned:
+            for other in names[:position]:
+                direct[stage.name].add(other)
+            for other in names[position + 1:]:
+                direct[other].add(stage.name)
+
+    closure = {}
+
+    def resolve(name, path):
+        if name in path:
+            raise ValueError(f"Stage order has a cycle: {' -> '.join(path[path.index(name):] + [name])}")
+        if name not in closure:
+            found = set()
+            for other in direct[name]:
+                found.add(other)
+                found |= resolve(other, path + [name])
+            closure[name] = found
+        return closure[name]
+
+    for name in names:
+        resolve(name, [])
+    return closure
+
+
+def build_order(enabled: Iterable[str], optimize: bool = None,
+                registry: Dict[str, Stage] = None) -> List[Stage]:
+    """
+    Orders the ``enabled`` stages of the ``registry``, validating their dependencies.
+    Without ``optimize`` (default ``config.OPTIMIZE_STAGE_ORDER``) stages keep their registration
+    order unless a dependency requires otherwise, with it the cheapest, length-reducing stage
+    whose dependencies have run goes next.
+    """
+    registry = REGISTRY if registry is None else registry
+    optimize = config.OPTIMIZE_STAGE_ORDER if optimize is None else optimize
+    enabled = set(enabled)
+    unknown = enabled - set(registry)
+    if unknown:
+        raise ValueError(f"Unknown stages {sorted(unknown)}")
+
+    stages = list(registry.values())
+    dependencies = _dependencies(stages)
+    position = {stage.name: i for i, stage in enumerate(stages)}
+    pending = [stage for stage in stages if stage.name in enabled]
+
+    order, done = [], set()
+    while pending:
+        ready = [stage for stage in pending if not (dependencies[stage.name] & enabled) - done]
+        if optimize:
+            stage = min(ready, key=lambda stage: (stage.priority(), position[stage.name]))
+        else:
+            stage = ready[0]
+        order.append(stage)
+        done.add(stage.name)
+        pending.remove(stage)
+    return order
@@ -0,0 +1,94 @@
+"""
+Token ids of the language model text, returned by ``TextCleaner.process_batch_tokens``.
+The cleaned texts of a batch go through the Hugging Face fast tokenizer in one batched call, and the
+placeholders the pipeline inserts, e.g. ``<PERSON>`` or ``<EMAIL>``, can be registered as single
+special tokens instead of being split into pieces.
+"""
+import itertools
+from typing import List, Optional
+
+import numpy as np
+
+from sct import config
+
+# the placeholders the NER stage inserts for the positional tags
+NER_PLACEHOLDERS = {"PER": "<PERSON>", "LOC": "<LOCATION>", "ORG": "<ORGANISATION>"}
+
+
+def placeholders() -> List[str]:
+    """The placeholders the current config can insert into the language model text."""
+    values = [config.REPLACE_WITH_URL, config.REPLACE_WITH_HTML, config.REPLACE_WITH_EMAIL, config.REPLACE_WITH_YEARS,
+              config.REPLACE_WITH_PHONE_NUMBERS, config.REPLACE_WITH_NUMBERS, config.REPLACE_WITH_CURRENCY_SYMBOLS]
+    if config.CHECK_NER_PROCESS:
+        values.extend(NER_PLACEHOLDERS[tag] for tag in config.POSITIONAL_TAGS if tag in NER_PLACEHOLDERS)
+    # a replacement with whitespace in it is not a single token
+    return sorted({value for value in values if value and not any(c.isspace() for c in value)})
+
+
+class TokenizedBatch:
+    """
+    Token ids of a batch. Padded, ``input_ids`` and ``attention_mask`` are (texts, length) arrays.
+    Ragged, ``input_ids`` holds the ids of all texts one after the other, those of text ``i`` are
+    ``input_ids[offsets[i]:offsets[i + 1]]``, and ``attention_mask`` is None.
+    """
+
+    __slots__ = ("input_ids", "attention_mask", "offsets")
+
+    def __init__(self, input_ids: np.ndarray, attention_mask: Optional[np.ndarray] = None,
+                 offsets: Optional[np.ndarray] = None):
+        self.input_ids = input_ids
+        self.attention_mask = attention_mask
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.input_ids) if self.offsets is None else len(self.offsets) - 1
+
+    def row(self, i: int) -> np.ndarray:
+        """The token ids of text ``i``, without padding."""
+        if self.offsets is None:
+            return self.input_ids[i][self.attention_mask[i].astype(bool)]
+        return self.input_ids[self.offsets[i]:self.offsets[i + 1]]
+
+
+class LMTokenizer:
+    """
+    A Hugging Face fast tokenizer applied to the cleaned batches.
+
+    Registering the placeholders adds tokens to the vocabulary, a model fine-tuned on the ids then
+    needs ``model.resize_token_embeddings(len(tokenizer.tokenizer))``.
+    """
+
+    def __init__(self, name: str, register_placeholders: bool = True, max_length: Optional[int] = None,
+                 padding: bool = True, **kwargs):
+        """
+        Args:
+            name: model name or directory of the tokenizer, ``kwargs`` go to ``AutoTokenizer.from_pretrained``
+            register_placeholders: add the ``placeholders()`` of the current config as special tokens
+            max_length: truncate longer texts to this many tokens, None to keep them whole
+            padding: return padded arrays with an attention mask, False for ragged ids with offsets
+        """
+        from transformers import AutoTokenizer
+
+        self.name = name
+        self.tokenizer = AutoTokenizer.from_pretrained(name, **kwargs)
+        if not getattr(self.tokenizer, "is_fast", False):
+            raise ValueError(f"{name} has no fast tokenizer")
+        self.added_tokens = self.tokenizer.add_tokens(placeholders(), special_tokens=True) if register_placeholders else 0
+        self.max_length = max_length
+        self.padding = padding
+
+    def encode(self, texts: List[str]) -> TokenizedBatch:
+        """Tokenizes ``texts`` in one batched call."""
+        if not texts:
+            if self.padding:
+                return TokenizedBatch(np.zeros((0, 0), np.int64), np.zeros((0, 0), np.int64))
+            return TokenizedBatch(np.zeros(0, np.int64), offsets=np.zeros(1, np.int64))
+        truncation = {"truncation": True, "max_length": self.max_length} if self.max_length else {}
+        if self.padding:
+            encoded = self.tokenizer(texts, padding=True, return_tensors="np", **truncation)
+            return TokenizedBatch(encoded["input_ids"], encoded["attention_mask"])
+        input_ids = self.tokenizer(texts, return_attention_mask=False, **truncation)["input_ids"]
+        offsets = np.zeros(len(input_ids) + 1, dtype=np.int64)
+        np.cumsum([len(ids) for ids in input_ids], out=offsets[1:])
+        flat = np.fromiter(itertools.chain.from_iterable(input_ids), dtype=np.int64, count=offsets[-1])
+        return TokenizedBatch(flat, offsets=offsets)
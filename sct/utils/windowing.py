@@ -0,0 +1,76 @@
+from typing import Iterator, List
+from sct.utils import constants
+
+
+class WindowSplitter:
+    """
+    Splits very large documents into bounded windows at safe boundaries, so every
+    pipeline stage only ever allocates copies of one window instead of the whole document.
+    """
+
+    # patterns whose matches may contain whitespace, a window never ends inside one of them
+    SPAN_PATTERNS = ["PHONE_REGEX", "NUMBERS_REGEX", "HTML_REGEX"]
+    # how far around a candidate boundary to look for a spanning match
+    SPAN_CONTEXT = 256
+
+    def __init__(self):
+        pass
+
+    def find_boundary(self, text, start, max_chars):
+        """
+        Returns the end of the window starting at ``start``, at most ``start + max_chars``.
+        Prefers a paragraph break, then a line break, then whitespace outside any matched span
+        in the second half of the window, and only cuts hard when there is none.
+        """
+        limit = start + max_chars
+        if limit >= len(text):
+            return len(text)
+        floor = start + max_chars // 2
+
+        for separator in ("\n\n", "\n"):
+            pos = text.rfind(separator, floor, limit)
+            if pos != -1:
+                return pos + len(separator)
+
+        pos = limit
+        while pos > floor:
+            pos -= 1
+            if text[pos].isspace() and not self._inside_span(text, pos):
+                return pos + 1
+        return limit
+
+    def _inside_span(self, text, pos):
+        lo = max(0, pos - self.SPAN_CONTEXT)
+        context = text[lo:pos + self.SPAN_CONTEXT]
+        for name in self.SPAN_PATTERNS:
+            if not constants.PREFILTERS[name](context):
+                continue
+            for match in getattr(constants, name).finditer(context):
+                if lo + match.start() <= pos < lo + match.end():
+                    return True
+        return False
+
+    def split(self, text, max_chars) -> List[str]:
+        """
+        Splits ``text`` into windows of at most ``max_chars`` characters.
+        The windows partition the text, joining them gives back the original string.
+        """
+        return list(self.windows(text, max_chars))
+
+    def windows(self, text, max_chars) -> Iterator[str]:
+        """Yields the windows of ``split`` one by one, the rest isn't cut when the caller stops early."""
+        if max_chars <= 0:
+            raise ValueError("max_chars must be positive")
+        start = 0
+        while start < len(text):
+            end = self.find_boundary(text, start, max_chars)
+            yield text[start:end]
+            start = end
+
+    def truncate(self, text, max_chars):
+        """
+        Cuts ``text`` to at most ``max_chars`` characters at the last safe boundary.
+        """
+        if len(text) <= max_chars:
+            return text
+        return text[:self.find_boundary(text, 0, max_chars)]
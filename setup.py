@@ -20,6 +20,7 @@ setup(
         'transformers>=4.30',
         'torch>=2.0.0',
         'presidio_anonymizer>=2.2.355',
+        'numpy>=1.21',
     ],
     extras_require={
         'dev': [
@@ -33,6 +34,19 @@ setup(
             'coverage==7.3.1',
             'pytest-cov==4.1.0',
         ],
+        'regex': [
+            'regex>=2023.8.8',
+        ],
+        're2': [
+            'google-re2>=1.1',
+        ],
+        'columnar': [
+            'pyarrow>=12.0',
+            'pandas>=1.5',
+        ],
+        'features': [
+            'scipy>=1.8',
+        ],
     },
     classifiers=[
         'Programming Language :: Python :: 3',
@@ -47,7 +61,8 @@ setup(
     python_requires='>=3.10',
     entry_points={
         'console_scripts': [
-            'nltk_downloader=sct.scripts.download_nltk_stopwords:main'
+            'nltk_downloader=sct.scripts.download_nltk_stopwords:main',
+            'sct=sct.cli:main',
         ],
     },
     test_suite='tests',
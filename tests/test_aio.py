@@ -0,0 +1,67 @@
+import asyncio
+import unittest
+from sct.aio import AsyncTextCleaner
+
+
+class RecordingCleaner:
+    """Stands in for TextCleaner, upper-cases texts and records every batch it receives."""
+
+    def __init__(self):
+        self.batches = []
+
+    def process_batch(self, texts, batch_size=None):
+        self.batches.append(list(texts))
+        if "boom" in texts:
+            raise RuntimeError("bad document")
+        return [text.upper() for text in texts]
+
+
+class AsyncTextCleanerTest(unittest.TestCase):
+
+    def run_async(self, coro):
+        return asyncio.run(coro)
+
+    def test_concurrent_calls_share_a_batch(self):
+        cleaner = RecordingCleaner()
+
+        async def main():
+            async with AsyncTextCleaner(cleaner, max_batch_size=64, max_wait=0.05) as sx:
+                return await asyncio.gather(*(sx.aclean(f"text {i}") for i in range(10)))
+
+        results = self.run_async(main())
+        self.assertEqual([f"TEXT {i}" for i in range(10)], results)
+        self.assertEqual(1, len(cleaner.batches))
+
+    def test_flush_on_batch_size(self):
+        cleaner = RecordingCleaner()
+
+        async def main():
+            async with AsyncTextCleaner(cleaner, max_batch_size=4, max_wait=10) as sx:
+                return await sx.aclean_batch([str(i) for i in range(8)])
+
+        self.assertEqual([str(i) for i in range(8)], self.run_async(main()))
+        self.assertEqual([4, 4], [len(batch) for batch in cleaner.batches])
+
+    def test_failing_text_is_isolated(self):
+        cleaner = RecordingCleaner()
+
+        async def main():
+            async with AsyncTextCleaner(cleaner, max_batch_size=3, max_wait=0.05) as sx:
+                return await asyncio.gather(sx.aclean("a"), sx.aclean("boom"), sx.aclean("b"),
+                                            return_exceptions=True)
+
+        ok_a, failed, ok_b = self.run_async(main())
+        self.assertEqual(("A", "B"), (ok_a, ok_b))
+        self.assertIsInstance(failed, RuntimeError)
+
+    def test_invalid_input(self):
+        async def main():
+            async with AsyncTextCleaner(RecordingCleaner()) as sx:
+                await sx.aclean(None)
+
+        with self.assertRaises(ValueError):
+            self.run_async(main())
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
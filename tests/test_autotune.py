@@ -0,0 +1,183 @@
+import os
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from sct import config
+from sct.scripts import benchmark_ner
+from sct.utils import autotune
+
+CHUNKS = [f"chunk {i}" for i in range(200)]
+
+
+class FakeModel:
+    """Runs in simulated time, a batch costs a fixed overhead plus a cost per chunk."""
+
+    def __init__(self, overhead=1.0, per_chunk=0.1, max_batch_size=None):
+        self.now = 0.0
+        self.overhead = overhead
+        self.per_chunk = per_chunk
+        self.max_batch_size = max_batch_size
+        self.calls = []
+
+    def clock(self):
+        return self.now
+
+    def run(self, chunks, batch_size):
+        self.calls.append((len(chunks), batch_size))
+        if self.max_batch_size and batch_size > self.max_batch_size:
+            raise RuntimeError("CUDA out of memory. Tried to allocate 2.00 GiB")
+        batches = -(-len(chunks) // batch_size)
+        self.now += batches * self.overhead + len(chunks) * self.per_chunk * max(1, batch_size / 8)
+        return [[] for _ in chunks]
+
+
+def count_tokens(chunks):
+    return 10 * len(chunks)
+
+
+class BatchSizeTunerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = Path(self.directory.name) / "autotune.json"
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def tune(self, model, chunks=CHUNKS, memory_limit_mb=10 ** 9, **kwargs):
+        tuner = autotune.BatchSizeTuner(self.path, memory_limit_mb=memory_limit_mb)
+        with patch.object(autotune.time, "perf_counter", model.clock):
+            return tuner, tuner.batch_size("model|cpu", chunks, model.run, count_tokens, default=3, **kwargs)
+
+    def stored(self):
+        with open(self.path) as f:
+            return json.load(f)[autotune.host_key()]["model|cpu"]
+
+    def test_stops_when_no_faster(self):
+        # batches beyond 8 chunks cost proportionally more, the overhead per batch no longer pays off
+        model = FakeModel()
+        _, batch_size = self.tune(model)
+        self.assertEqual(8, batch_size)
+        self.assertEqual([(1, 1), (2, 1), (4, 2), (8, 4), (16, 8), (32, 16)], model.calls)
+        self.assertEqual(8, self.stored()["batch_size"])
+        self.assertGreater(self.stored()["tokens_per_second"], 0)
+        # stored per host and model, the next tuner doesn't probe
+        model = FakeModel()
+        self.assertEqual(8, self.tune(model)[1])
+        self.assertEqual([], model.calls)
+
+    def test_out_of_memory(self):
+        model = FakeModel(max_batch_size=4)
+        self.assertEqual(4, self.tune(model)[1])
+        self.assertEqual(4, self.stored()["batch_size"])
+
+    def test_memory_limit(self):
+        model = FakeModel()
+        with patch.object(autotune, "memory_mb", lambda device, peak=False: 100 * len(model.calls)):
+            _, batch_size = self.tune(model, memory_limit_mb=450)
+        # the probe of 8 peaked at 500 MB
+        self.assertEqual(4, batch_size)
+
+    def test_too_few_chunks(self):
+        model = FakeModel()
+        self.assertEqual(3, self.tune(model, chunks=CHUNKS[:5])[1])
+        self.assertEqual([], model.calls)
+        # enough to probe but not to conclude, kept for the process only
+        tuner, batch_size = self.tune(model, chunks=CHUNKS[:20])
+        self.assertEqual(8, batch_size)
+        self.assertEqual(8, tuner.settings["model|cpu"]["batch_size"])
+        self.assertFalse(self.path.exists())
+
+    def test_back_off(self):
+        tuner, _ = self.tune(FakeModel())
+        self.assertEqual(4, tuner.back_off("model|cpu", 8))
+        self.assertEqual(1, tuner.back_off("model|cpu", 1))
+        self.assertEqual(1, tuner.batch_size("model|cpu", CHUNKS, None, count_tokens, default=3))
+        self.assertIn("backed_off_at", tuner.settings["model|cpu"])
+        # for this process only, the next one starts from the tuned size
+        self.assertEqual(8, self.stored()["batch_size"])
+        self.assertNotIn("backed_off_at", self.stored())
+        self.assertEqual(8, self.tune(FakeModel())[1])
+
+    def test_under_pressure(self):
+        tuner = autotune.BatchSizeTuner(self.path, memory_limit_mb=1000)
+        self.assertTrue(tuner.under_pressure(800, 1200))
+        self.assertFalse(tuner.under_pressure(800, 900))
+        # over the limit before the run, smaller batches wouldn't help
+        self.assertFalse(tuner.under_pressure(1100, 1300))
+
+    @unittest.skipUnless(os.path.exists("/proc/self/clear_refs"), "the resident set peak can't be reset")
+    def test_peak_of_a_run(self):
+        # a large allocation before the run doesn't count as its peak
+        large = bytearray(300 * 2 ** 20)
+        large[::4096] = b"x" * len(large[::4096])
+        del large
+        measure = autotune.track_peak("cpu")
+        small = bytearray(50 * 2 ** 20)
+        small[::4096] = b"x" * len(small[::4096])
+        before, peak = measure()
+        del small
+        self.assertGreater(peak - before, 40)
+        self.assertLess(peak - before, 200)
+
+    def test_settings_of_other_hosts_are_kept(self):
+        with open(self.path, "w") as f:
+            json.dump({"other-4cpu": {"model|cpu": {"batch_size": 2}}}, f)
+        self.tune(FakeModel())
+        with open(self.path) as f:
+            self.assertEqual({"other-4cpu", autotune.host_key()}, set(json.load(f)))
+
+    def test_out_of_memory_errors(self):
+        self.assertTrue(autotune.is_out_of_memory(RuntimeError("CUDA out of memory. Tried to allocate")))
+        self.assertTrue(autotune.is_out_of_memory(MemoryError()))
+        self.assertFalse(autotune.is_out_of_memory(RuntimeError("shape mismatch")))
+
+
+class GeneralNERAutotuneTest(unittest.TestCase):
+    """Autotunes GeneralNER on generated tiny models, nothing is downloaded."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.models = config.NER_MODELS_LIST[:]
+        config.NER_MODELS_LIST[:] = benchmark_ner.make_tiny_models(cls.directory.name, vocab_size=500)
+
+    @classmethod
+    def tearDownClass(cls):
+        config.NER_MODELS_LIST[:] = cls.models
+        cls.directory.cleanup()
+
+    def test_process_batch(self):
+        from sct.utils.ner import GeneralNER
+        texts = [text for text, _ in benchmark_ner.generate_corpus("short", 140)]
+        expected = GeneralNER(device="cpu").process_batch(texts, 8, config.POSITIONAL_TAGS, language="DUTCH")
+        path = Path(self.directory.name) / "autotune.json"
+        with patch.multiple(config, NER_AUTOTUNE=True, NER_AUTOTUNE_PATH=str(path)):
+            ner = GeneralNER(device="cpu")
+            self.assertEqual(expected, ner.process_batch(texts, 8, config.POSITIONAL_TAGS, language="DUTCH"))
+        model = ner.autotuner.model_id(config.NER_MODELS_LIST[1])
+        with open(path) as f:
+            setting = json.load(f)[autotune.host_key()][model]
+        self.assertIn(setting["batch_size"], autotune.BatchSizeTuner.CANDIDATES)
+        self.assertGreater(setting["peak_memory_mb"], 0)
+
+        # running out of memory halves the batch size for this process
+        ner.autotuner.settings[model]["batch_size"] = 4
+        pipeline = ner.models.get("nl").pipeline
+
+        def small_memory_pipeline(chunks, batch_size):
+            if batch_size > 2:
+                raise RuntimeError("CUDA out of memory")
+            return pipeline(chunks, batch_size=batch_size)
+
+        self.assertEqual(pipeline(texts, batch_size=2), ner.run_autotuned("nl", small_memory_pipeline, texts, 8))
+        self.assertEqual(2, ner.autotuner.settings[model]["batch_size"])
+        with open(path) as f:
+            self.assertEqual(setting, json.load(f)[autotune.host_key()][model])
+
+
+if __name__ == "__main__":
+    unittest.main()
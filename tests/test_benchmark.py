@@ -0,0 +1,56 @@
+import tempfile
+import unittest
+
+from sct import config
+from sct.scripts import benchmark_ner
+
+
+class CorpusTest(unittest.TestCase):
+
+    def test_corpus_is_deterministic(self):
+        self.assertEqual(benchmark_ner.generate_corpus("medium", 6), benchmark_ner.generate_corpus("medium", 6))
+        self.assertNotEqual(benchmark_ner.generate_corpus("medium", 6), benchmark_ner.generate_corpus("medium", 6, 1))
+
+    def test_shapes(self):
+        for shape, (low, high) in benchmark_ner.SHAPES.items():
+            for text, language in benchmark_ner.generate_corpus(shape, 4):
+                self.assertIn(language, benchmark_ner.WORDS)
+                # entities span more than one word
+                self.assertTrue(low <= len(text.split()) <= high * 3)
+
+
+class TinyModelBenchmarkTest(unittest.TestCase):
+    """Runs GeneralNER on generated models, nothing is downloaded."""
+
+    @classmethod
+    def setUpClass(cls):
+        from sct.utils.ner import GeneralNER
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.models = config.NER_MODELS_LIST[:]
+        config.NER_MODELS_LIST[:] = benchmark_ner.make_tiny_models(cls.directory.name, vocab_size=500)
+        cls.ner = GeneralNER(device="cpu")
+
+    @classmethod
+    def tearDownClass(cls):
+        config.NER_MODELS_LIST[:] = cls.models
+        cls.directory.cleanup()
+
+    def test_models_are_reused(self):
+        self.assertEqual(config.NER_MODELS_LIST, benchmark_ner.make_tiny_models(self.directory.name))
+        self.assertEqual(self.ner.loaded_models()["en"], config.NER_MODELS_LIST[0])
+
+    def test_report(self):
+        report = benchmark_ner.benchmark(self.ner, benchmark_ner.generate_corpus("long", 8), batch_size=4)
+        self.assertEqual({"ner_process", "process_batch"}, set(report))
+        for mode in report.values():
+            self.assertGreater(mode["docs_per_second"], 0)
+            self.assertGreater(mode["chunks_per_document"], 1)
+            self.assertTrue(0 <= mode["padding_ratio"] < 1)
+            self.assertLessEqual(set(mode["model_seconds"]), set(self.ner.MODEL_KEYS))
+        # one text per call never pads, batching calls each model once for the texts in its language
+        self.assertEqual(0, report["ner_process"]["padding_ratio"])
+        self.assertLess(report["process_batch"]["model_calls"], report["ner_process"]["model_calls"])
+
+
+if __name__ == "__main__":
+    unittest.main()
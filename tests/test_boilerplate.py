@@ -0,0 +1,47 @@
+import unittest
+from hypothesis import given
+from hypothesis.strategies import lists, sampled_from
+from sct.utils import boilerplate
+
+PIECES = ["hello", "world", "\n", "\n\n", " \n \n", "\t", " ", "Kind regards"]
+DISCLAIMER = "This e-mail is confidential and intended solely for the addressee."
+
+
+class BoilerplateDetectorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.BoilerplateDetector = boilerplate.BoilerplateDetector(min_count=3, min_chars=10)
+
+    @given(lists(sampled_from(PIECES), max_size=50).map("".join), sampled_from(["paragraph", "line"]))
+    def test_blocks_partition_text(self, text, unit):
+        detector = boilerplate.BoilerplateDetector(unit=unit)
+        self.assertEqual(text, "".join(block + separator for block, separator in detector.blocks(text)))
+        self.assertEqual(text, "".join(segment + separator for segment, separator, _ in detector.segment(text)))
+
+    def test_detects_repeated_blocks(self):
+        texts = [f"Message number {i}\nsecond line\n\n{DISCLAIMER}" for i in range(3)]
+        self.BoilerplateDetector.fit(texts + ["unrelated"])
+        self.assertTrue(self.BoilerplateDetector.is_boilerplate(DISCLAIMER))
+        # compared with normalised whitespace
+        self.assertTrue(self.BoilerplateDetector.is_boilerplate(DISCLAIMER.replace(" ", "\t ")))
+        self.assertFalse(self.BoilerplateDetector.is_boilerplate("Message number 0\nsecond line"))
+        self.assertEqual(
+            [("Message number 1\nsecond line", "\n\n", False), (DISCLAIMER, "", True)],
+            self.BoilerplateDetector.segment(texts[1])
+        )
+
+    def test_counts_documents_not_occurrences(self):
+        self.BoilerplateDetector.fit([f"{DISCLAIMER}\n\n{DISCLAIMER}\n\n{DISCLAIMER}", "other text"])
+        self.assertFalse(self.BoilerplateDetector.is_boilerplate(DISCLAIMER))
+
+    def test_short_blocks_are_ignored(self):
+        self.BoilerplateDetector.fit(["Thanks\n\nA"] * 5)
+        self.assertFalse(self.BoilerplateDetector.is_boilerplate("Thanks"))
+
+    def test_unknown_unit(self):
+        with self.assertRaises(ValueError):
+            boilerplate.BoilerplateDetector(unit="sentence")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
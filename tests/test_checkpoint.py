@@ -0,0 +1,81 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from sct import config
+from sct.utils import checkpoint
+
+STAGES = ["detect_language", "fix_bad_unicode", "replace_numbers", "ner_process", "normalize_whitespace"]
+
+
+class CheckpointTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.CheckpointStore = checkpoint.CheckpointStore(os.path.join(self.directory.name, "checkpoints.db"))
+
+    def tearDown(self):
+        self.CheckpointStore.close()
+        self.directory.cleanup()
+
+    def test_config_change_only_invalidates_later_stages(self):
+        before = checkpoint.stage_fingerprints(STAGES)
+        with patch.object(config, 'REPLACE_WITH_NUMBERS', "<NUM>"):
+            after = checkpoint.stage_fingerprints(STAGES)
+        self.assertEqual(before[:2], after[:2])
+        self.assertTrue(all(b != a for b, a in zip(before[2:], after[2:])))
+
+    def test_configured_language_invalidates_every_stage(self):
+        # detect_language doesn't run with a configured language
+        stages = ["fix_bad_unicode", "to_ascii_unicode", "replace_html", "ner_process"]
+        with patch.object(config, 'LANGUAGE', "dutch"):
+            dutch = checkpoint.stage_fingerprints(stages)
+        with patch.object(config, 'LANGUAGE', "german"):
+            german = checkpoint.stage_fingerprints(stages)
+        self.assertTrue(all(d != g for d, g in zip(dutch, german)))
+
+    def test_regex_backend_invalidates_regex_stages(self):
+        before = checkpoint.stage_fingerprints(STAGES)
+        with patch.object(config, 'REGEX_BACKEND', "re2"):
+            after = checkpoint.stage_fingerprints(STAGES)
+        self.assertEqual(before[:2], after[:2])
+        self.assertTrue(all(b != a for b, a in zip(before[2:], after[2:])))
+
+    def test_pipeline_change_invalidates(self):
+        self.assertNotEqual(
+            checkpoint.stage_fingerprints(STAGES)[-1],
+            checkpoint.stage_fingerprints([s for s in STAGES if s != "fix_bad_unicode"])[-1]
+        )
+
+    def test_models_only_invalidate_ner(self):
+        models = {"en": {"name": "org/en", "revision": "abc", "quantized": False}}
+        before = checkpoint.stage_fingerprints(STAGES, models)
+        models["en"]["revision"] = "def"
+        after = checkpoint.stage_fingerprints(STAGES, models)
+        ner = STAGES.index("ner_process")
+        self.assertEqual(before[:ner], after[:ner])
+        self.assertTrue(all(b != a for b, a in zip(before[ner:], after[ner:])))
+
+    def test_stage_versions(self):
+        before = checkpoint.stage_fingerprints(STAGES)
+        with patch.dict(checkpoint.STAGE_VERSIONS, {"replace_numbers": "2"}):
+            after = checkpoint.stage_fingerprints(STAGES)
+        self.assertEqual(before[:2], after[:2])
+        self.assertTrue(all(b != a for b, a in zip(before[2:], after[2:])))
+
+    def test_keys_depend_on_input(self):
+        fingerprint = checkpoint.stage_fingerprints(STAGES)[0]
+        self.assertNotEqual(checkpoint.checkpoint_key(fingerprint, "a"), checkpoint.checkpoint_key(fingerprint, "b"))
+
+    def test_save_and_load(self):
+        keys = [checkpoint.checkpoint_key("f", str(i)) for i in range(1200)]
+        self.CheckpointStore.save((key, f"text {i}", "ENGLISH") for i, key in enumerate(keys[:1000]))
+        found = self.CheckpointStore.load(keys)
+        self.assertEqual(1000, len(found))
+        self.assertEqual(("text 7", "ENGLISH"), found[keys[7]])
+        self.CheckpointStore.clear()
+        self.assertEqual(0, len(self.CheckpointStore))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
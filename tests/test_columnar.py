@@ -0,0 +1,51 @@
+import unittest
+from unittest.mock import patch
+from hypothesis import given
+from hypothesis.strategies import lists, sampled_from, text
+from sct import config
+from sct.utils import columnar, datetime, special
+
+PIECES = ["1999", "2024", "19999", "x2001", "2001y", " ", "$", "$$", "zł", "€", "£5", "abc", "ü", "١٩٩٩", "_2000", "\n"]
+
+
+@unittest.skipIf(columnar.pa is None, "pyarrow not installed")
+class ColumnarTest(unittest.TestCase):
+
+    def setUp(self):
+        self.ProcessDateTime = datetime.ProcessDateTime()
+        self.ProcessSpecialSymbols = special.ProcessSpecialSymbols()
+
+    def arrow(self, texts):
+        return columnar.pa.array(texts, columnar.pa.large_string())
+
+    @given(lists(lists(sampled_from(PIECES), max_size=12).map("".join), max_size=20))
+    def test_replace_years_matches_regex(self, texts):
+        result = columnar.replace_years(self.arrow(texts))
+        if not all(t.isascii() for t in texts):
+            self.assertIsNone(result)  # RE2 semantics differ from re outside ASCII
+        elif texts:
+            expected = [self.ProcessDateTime.replace_years(t, config.REPLACE_WITH_YEARS) for t in texts]
+            self.assertEqual(expected, result.to_pylist())
+
+    @given(lists(lists(sampled_from(PIECES), max_size=12).map("".join) | text(max_size=20), max_size=20),
+           sampled_from([None, "<CUR>", ""]))
+    def test_replace_currency_symbols_matches(self, texts, replace_with):
+        with patch.object(config, 'REPLACE_WITH_CURRENCY_SYMBOLS', replace_with):
+            result = columnar.replace_currency_symbols(self.arrow(texts))
+        expected = [self.ProcessSpecialSymbols.replace_currency_symbols(t, replace_with) for t in texts]
+        self.assertEqual(expected, result.to_pylist())
+
+    def test_backslash_replacement_not_vectorized(self):
+        with patch.object(config, 'REPLACE_WITH_YEARS', r"\1"):
+            self.assertIsNone(columnar.replace_years(self.arrow(["1999"])))
+
+    def test_to_arrow(self):
+        array, index = columnar.to_arrow(columnar.pa.chunked_array([["a", None], ["b"]]))
+        self.assertEqual(["a", None, "b"], array.to_pylist())
+        self.assertIsNone(index)
+        with self.assertRaises(ValueError):
+            columnar.to_arrow(columnar.pa.array([1, 2]))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,83 @@
+import unittest
+import zlib
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import numpy as np
+from hypothesis import given, settings
+from hypothesis.strategies import lists, one_of, sampled_from, text
+
+from sct import config
+from sct.sct import TextCleaner
+from sct.utils import features, normtext, special, stopwords
+
+FLAGS = ["CHECK_CASEFOLD", "CHECK_REMOVE_STOPWORDS", "CHECK_REMOVE_PUNCTUATION", "CHECK_REMOVE_ISOLATED_LETTERS",
+         "CHECK_NORMALIZE_WHITESPACE"]
+LANGUAGES = ["ENGLISH", "DUTCH", "GERMAN", "SPANISH"]
+FRAGMENTS = ["The", "the", "and", "De", "het", "und", "Der", "el", "y", "don't", "b", "B.", "c,", "a", "u", "x!",
+             "K", "ſ", "İ", "Straße", "ÆBLE", "<PERSON>", "foo-bar", "...", ",", "'", " ", "  ", "\n", "\t", " "]
+TEXTS = lists(one_of(sampled_from(FRAGMENTS), text(alphabet="aBx.,'- \n", max_size=4)), max_size=16).map("".join)
+
+
+class FeatureHasherTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.stopwords = stopwords.ProcessStopwords()
+        cls.hasher = features.FeatureHasher(cls.stopwords, n_features=64, ngram_range=(1, 2))
+        # statistical_model_processing only needs these attributes of the cleaner
+        cls.cleaner = SimpleNamespace(ProcessStopwords=cls.stopwords, ProcessSpecialSymbols=special.ProcessSpecialSymbols(),
+                                      NormaliseText=normtext.NormaliseText(), language=None)
+
+    def stat_tokens(self, text, language):
+        return TextCleaner.statistical_model_processing(self.cleaner, text, language).split()
+
+    @settings(max_examples=300, deadline=None)
+    @given(TEXTS, sampled_from(LANGUAGES), lists(sampled_from(FLAGS), unique=True))
+    def test_tokens_match_stat_text(self, text, language, disabled):
+        with patch.multiple(config, **{flag: flag not in disabled for flag in FLAGS}):
+            self.assertEqual(self.stat_tokens(text, language), self.hasher.tokens(text, language))
+
+    def test_unknown_language_keeps_stopwords(self):
+        self.assertEqual(["the", "cat"], self.hasher.tokens("The cat", None))
+
+    def test_counts(self):
+        def index(gram):
+            return zlib.crc32(gram.encode("utf-8")) % 64
+        counts = self.hasher.counts(["red", "cat", "red", "cat"])
+        expected = {}
+        for gram in ["red", "cat", "red", "cat", "red cat", "cat red", "red cat"]:
+            expected[index(gram)] = expected.get(index(gram), 0) + 1
+        self.assertEqual(expected, dict(counts))
+        self.assertEqual(7, sum(counts.values()))
+
+    def test_transform(self):
+        indptr, indices, data = self.hasher.transform([["red", "cat"], [], ["red", "red"]])
+        self.assertEqual([0, 3, 3, 5], indptr.tolist())
+        self.assertEqual(np.int32, indices.dtype)
+        batch = features.HashedFeatures(indptr, indices, data, 64, ["", "", ""], [None] * 3)
+        self.assertEqual((3, 64), batch.shape)
+        row_indices, row_counts = batch.row(2)
+        expected = {zlib.crc32(b"red") % 64: 2, zlib.crc32(b"red red") % 64: 1}
+        self.assertEqual(expected, dict(zip(row_indices.tolist(), row_counts.tolist())))
+        self.assertTrue(all(np.all(np.diff(batch.row(i)[0]) > 0) for i in range(len(batch))))
+
+    def test_to_csr(self):
+        batch = features.HashedFeatures(*self.hasher.transform([["red", "cat"], []]), 64, ["", ""], [None] * 2)
+        if features.sparse is None:
+            with self.assertRaises(ImportError):
+                batch.to_csr()
+            return
+        matrix = batch.to_csr()
+        self.assertEqual((2, 64), matrix.shape)
+        self.assertEqual(3, matrix.sum())
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            features.FeatureHasher(self.stopwords, n_features=0)
+        with self.assertRaises(ValueError):
+            features.FeatureHasher(self.stopwords, ngram_range=(2, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
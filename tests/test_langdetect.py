@@ -0,0 +1,75 @@
+import unittest
+from hypothesis import given, settings
+from hypothesis.strategies import integers, text
+from lingua import Language
+from sct.utils import resources
+from sct.utils.langdetect import LanguageDetector
+
+ENGLISH = "The weather is lovely today and we are going for a long walk along the river. "
+GERMAN = "Das Wetter ist heute wunderbar und wir machen einen langen Spaziergang am Fluss. "
+
+
+class CountingDetector:
+    """Wraps a lingua detector, recording the texts scored."""
+
+    def __init__(self, detector):
+        self.detector = detector
+        self.texts = []
+
+    def compute_language_confidence_values(self, text):
+        self.texts.append(text)
+        return self.detector.compute_language_confidence_values(text)
+
+
+class LanguageDetectorTest(unittest.TestCase):
+
+    @settings(deadline=None)
+    @given(text(alphabet="abcdeéñß ?.,12", max_size=60))
+    def test_whole_text_matches_lingua(self, value):
+        language, confidence = LanguageDetector().detect(value)
+        self.assertEqual(resources.DETECTOR.detect_language_of(value), language)
+        self.assertTrue(0 <= confidence <= 1)
+
+    @given(text(alphabet="ab cd\n", max_size=500), integers(min_value=10, max_value=200),
+           integers(min_value=1, max_value=6))
+    def test_sample_is_bounded(self, value, sample_chars, windows):
+        detector = LanguageDetector(sample_chars=sample_chars, windows=windows)
+        sample = detector.sample(value)
+        self.assertLessEqual(sum(map(len, sample)), max(sample_chars, len(value) if len(value) <= sample_chars else 0))
+        self.assertTrue(value.startswith(sample[0]))
+        for window in sample:
+            self.assertIn(window, value)
+
+    def test_long_document_cost_is_constant(self):
+        detector = LanguageDetector(sample_chars=1000, windows=4)
+        detector.detector = CountingDetector(detector.detector)
+        language, confidence = detector.detect(ENGLISH * 2000)
+        self.assertEqual(Language.ENGLISH, language)
+        self.assertGreater(confidence, 0.5)
+        self.assertEqual(4, len(detector.detector.texts))
+        self.assertLessEqual(sum(map(len, detector.detector.texts)), 1000)
+        self.assertFalse(any(window.startswith(" ") for window in detector.detector.texts))
+
+    def test_confidence_early_exit(self):
+        detector = LanguageDetector(sample_chars=1000, windows=4, confidence_threshold=0.5)
+        detector.detector = CountingDetector(detector.detector)
+        self.assertEqual(Language.ENGLISH, detector.detect(ENGLISH * 2000)[0])
+        self.assertEqual(1, len(detector.detector.texts))
+
+    def test_windows_spread_over_the_text(self):
+        detector = LanguageDetector(sample_chars=800, windows=4)
+        # mostly German after an English opening
+        self.assertEqual(Language.GERMAN, detector.detect(ENGLISH * 3 + GERMAN * 500)[0])
+
+    def test_low_accuracy(self):
+        language, confidence = LanguageDetector(low_accuracy=True).detect(GERMAN * 3)
+        self.assertEqual(Language.GERMAN, language)
+        self.assertGreater(confidence, 0.5)
+
+    def test_undetectable(self):
+        self.assertEqual((None, 0.0), LanguageDetector().detect("42"))
+        self.assertEqual((None, 0.0), LanguageDetector().detect(""))
+
+
+if __name__ == "__main__":
+    unittest.main()
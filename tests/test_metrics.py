@@ -0,0 +1,119 @@
+import json
+import math
+import threading
+import unittest
+import urllib.request
+from unittest.mock import patch
+from hypothesis import given
+from hypothesis.strategies import floats, lists
+from sct import config, server
+from sct.utils import metrics
+from tests.test_server import RecordingCleaner
+
+
+def parse_prometheus(text):
+    """Sample name with labels -> value, checking every sample has HELP and TYPE lines."""
+    samples, declared = {}, set()
+    for line in text.splitlines():
+        if line.startswith("# TYPE "):
+            declared.add(line.split()[2])
+        elif line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            base = name.split("{")[0]
+            base = next((base[:-len(suffix)] for suffix in ("_bucket", "_sum", "_count")
+                         if base.endswith(suffix) and base[:-len(suffix)] in declared), base)
+            assert base in declared, f"{name} has no TYPE line"
+            samples[name] = float(value)
+    return samples
+
+
+class MetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = metrics.MetricsRegistry()
+
+    def test_counter(self):
+        counter = self.registry.counter("requests_total", "Requests", ["model"])
+        counter.inc(model="en")
+        counter.inc(2, model="en")
+        counter.inc(model="multi")
+        self.assertEqual(3, counter.value(model="en"))
+        with self.assertRaises(ValueError):
+            counter.inc(language="en")
+        samples = parse_prometheus(self.registry.prometheus_text())
+        self.assertEqual({'requests_total{model="en"}': 3, 'requests_total{model="multi"}': 1}, samples)
+
+    @given(lists(floats(min_value=0, max_value=100), max_size=50))
+    def test_histogram_buckets_are_cumulative(self, values):
+        histogram = metrics.Histogram("latency_seconds", "Latency", buckets=(0.1, 1, 10))
+        for value in values:
+            histogram.observe(value)
+        if not values:
+            self.assertEqual([], histogram.samples())
+            return
+        sample = histogram.samples()[0]
+        self.assertEqual(len(values), sample["count"])
+        self.assertAlmostEqual(sum(values), sample["sum"])
+        for bound, count in sample["buckets"].items():
+            self.assertEqual(sum(value <= bound for value in values), count)
+        self.assertEqual(len(values), sample["buckets"][math.inf])
+
+    def test_label_escaping(self):
+        counter = self.registry.counter("tags_total", "Tags", ["tag"])
+        counter.inc(tag='a"b\\c')
+        self.assertIn('tags_total{tag="a\\"b\\\\c"} 1', self.registry.prometheus_text())
+
+    def test_merged(self):
+        counter = self.registry.counter("requests_total", "Requests", ["model"])
+        histogram = self.registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1))
+        counter.inc(2, model="en")
+        histogram.observe(0.5)
+        first = json.loads(json.dumps(self.registry.dump()))
+        self.registry.reset()
+        counter.inc(model="en")
+        counter.inc(model="multi")
+        histogram.observe(5)
+        merged = parse_prometheus(self.registry.merged([first, self.registry.dump()]).prometheus_text())
+        self.assertEqual(3, merged['requests_total{model="en"}'])
+        self.assertEqual(1, merged['requests_total{model="multi"}'])
+        self.assertEqual(1, merged['latency_seconds_bucket{le="1"}'])
+        self.assertEqual(2, merged['latency_seconds_count'])
+        self.assertEqual(5.5, merged['latency_seconds_sum'])
+        # the registry merged from is unchanged
+        self.assertEqual(1, counter.value(model="en"))
+
+    def test_disabled_by_default(self):
+        self.assertIsNone(metrics.active())
+        with patch.object(config, "COLLECT_METRICS", True):
+            self.assertIs(metrics.REGISTRY, metrics.active())
+
+
+class MetricsScrapeTest(unittest.TestCase):
+
+    def setUp(self):
+        metrics.REGISTRY.reset()
+        self.server = server.start_worker(server.make_server(RecordingCleaner(), port=0))
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/metrics"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        metrics.REGISTRY.reset()
+
+    def test_scrape(self):
+        metrics.DOCUMENTS.inc(3)
+        metrics.STAGE_SECONDS.observe(0.002, stage="replace_urls")
+        metrics.NER_INVOCATIONS.inc(model="en")
+        with urllib.request.urlopen(self.url) as response:
+            self.assertTrue(response.headers["Content-Type"].startswith("text/plain"))
+            samples = parse_prometheus(response.read().decode("utf-8"))
+        self.assertEqual(3, samples["sct_documents_total"])
+        self.assertEqual(1, samples['sct_stage_seconds_count{stage="replace_urls"}'])
+        self.assertEqual(1, samples['sct_stage_seconds_bucket{stage="replace_urls",le="+Inf"}'])
+        self.assertEqual(0, samples['sct_stage_seconds_bucket{stage="replace_urls",le="0.001"}'])
+        self.assertEqual(1, samples['sct_ner_invocations_total{model="en"}'])
+
+
+if __name__ == "__main__":
+    unittest.main()
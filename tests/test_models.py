@@ -0,0 +1,130 @@
+import os
+import tempfile
+import unittest
+import torch
+from sct.utils.models import (LoadedModel, ModelManager, load_quantized_model, model_revision, module_footprint,
+                              quantize_model)
+
+MB = 1024 ** 2
+
+
+def linear_loader(name, megabytes):
+    """Loader for a float32 linear layer of about ``megabytes`` MB."""
+    def load():
+        return LoadedModel(name, torch.nn.Linear(megabytes * MB // 4, 1, bias=False), None)
+    return load
+
+
+class ModelManagerTest(unittest.TestCase):
+
+    def test_footprint(self):
+        self.assertEqual(MB, module_footprint(torch.nn.Linear(MB // 4, 1, bias=False)))
+
+    def test_lru_eviction_within_budget(self):
+        manager = ModelManager(memory_budget_mb=2.5)
+        for key in ("en", "nl", "de"):
+            manager.register(key, linear_loader(key, 1))
+
+        manager.get("en")
+        manager.get("nl")
+        manager.get("en")  # nl is now the least recently used
+        manager.get("de")
+
+        self.assertEqual(["en", "de"], list(manager.loaded()))
+        self.assertEqual(3, manager.loads)
+        self.assertEqual(1, manager.evictions)
+        self.assertEqual(1, manager.hits)
+        self.assertLessEqual(manager.memory_used, manager.memory_budget)
+
+    def test_no_budget_keeps_everything(self):
+        manager = ModelManager()
+        for key in ("en", "nl", "de"):
+            manager.register(key, linear_loader(key, 1))
+            manager.get(key)
+        self.assertEqual(3, len(manager.loaded()))
+        self.assertEqual(0, manager.evictions)
+
+    def test_oversized_model_still_loads(self):
+        manager = ModelManager(memory_budget_mb=1)
+        manager.register("en", linear_loader("en", 1))
+        manager.register("multi", linear_loader("multi", 2))
+        manager.get("en")
+        self.assertEqual("multi", manager.get("multi").name)
+        self.assertEqual(["multi"], list(manager.loaded()))
+
+    def test_unknown_key(self):
+        with self.assertRaises(KeyError):
+            ModelManager().get("fr")
+
+
+class QuantizationTest(unittest.TestCase):
+
+    def build(self):
+        torch.manual_seed(0)
+        return torch.nn.Sequential(torch.nn.Linear(256, 256), torch.nn.ReLU(), torch.nn.Linear(256, 4))
+
+    def test_quantized_footprint(self):
+        model = self.build()
+        self.assertLess(module_footprint(quantize_model(self.build())), module_footprint(model) / 3)
+
+    def test_quantized_weights_are_cached(self):
+        inputs = torch.randn(2, 256)
+        loads = []
+
+        def load_model():
+            loads.append(1)
+            return self.build()
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            first = load_quantized_model("org/model", load_model, self.build, cache_dir, revision=lambda: "abc")
+            # differently initialised architecture, the stored weights must win
+            second = load_quantized_model("org/model", load_model, lambda: torch.nn.Sequential(
+                torch.nn.Linear(256, 256), torch.nn.ReLU(), torch.nn.Linear(256, 4)), cache_dir, revision=lambda: "abc")
+            self.assertEqual(1, len(loads))
+            self.assertTrue(torch.equal(first(inputs), second(inputs)))
+
+            # another revision of the model is quantized again
+            load_quantized_model("org/model", load_model, self.build, cache_dir, revision=lambda: "def")
+            self.assertEqual(2, len(loads))
+            self.assertEqual(2, len(os.listdir(cache_dir)))
+
+    def test_unknown_revision_is_not_cached(self):
+        revisions = iter([None, "abc"])
+        with tempfile.TemporaryDirectory() as cache_dir:
+            # the revision becomes known once the model is loaded, e.g. downloaded from the Hub
+            load_quantized_model("org/model", self.build, self.build, cache_dir, revision=lambda: next(revisions))
+            self.assertEqual(["org--model-abc-torch" + torch.__version__ + ".pt"], os.listdir(cache_dir))
+            load_quantized_model("org/other", self.build, self.build, cache_dir, revision=lambda: None)
+            self.assertEqual(1, len(os.listdir(cache_dir)))
+
+
+class ModelRevisionTest(unittest.TestCase):
+
+    def test_local_model_revision(self):
+        with tempfile.TemporaryDirectory() as model_dir:
+            with open(os.path.join(model_dir, "config.json"), "w") as f:
+                f.write('{"num_labels": 9}')
+            revision = model_revision(model_dir)
+            self.assertTrue(revision.startswith("local-"))
+            self.assertEqual(revision, model_revision(model_dir))
+
+            weights = os.path.join(model_dir, "model.safetensors")
+            with open(weights, "wb") as f:
+                f.write(b"weights")
+            self.assertNotEqual(revision, model_revision(model_dir))
+            revision = model_revision(model_dir)
+
+            # weights rewritten in place with the same size
+            with open(weights, "wb") as f:
+                f.write(b"updated")
+            stat = os.stat(weights)
+            os.utime(weights, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+            self.assertNotEqual(revision, model_revision(model_dir))
+
+    def test_uncached_hub_model(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            self.assertIsNone(model_revision("org/not-downloaded", cache_dir))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,82 @@
+import os
+import tempfile
+import unittest
+from hypothesis import given, settings
+from hypothesis.strategies import characters, integers, lists, sampled_from, text
+from sct.utils import reader
+
+
+class LineIndexedFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "corpus.txt")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, content):
+        with open(self.path, "w", encoding="utf-8", newline="") as f:
+            f.write(content)
+
+    @settings(deadline=None)
+    @given(lists(text(alphabet=characters(blacklist_characters="\r\n", blacklist_categories=["Cs"]), max_size=10),
+                 max_size=30),
+           sampled_from(["\n", "\r\n"]), sampled_from([True, False]))
+    def test_lines_roundtrip(self, lines, newline, trailing):
+        content = newline.join(lines) + (newline if trailing and lines else "")
+        self.write(content)
+        expected = content.split(newline)
+        if expected[-1] == "":
+            expected.pop()  # a final line break doesn't start another line
+        with reader.LineIndexedFile(self.path, rebuild=True) as corpus:
+            self.assertEqual(expected, corpus[:])
+            self.assertEqual(expected, [corpus.line(i) for i in range(len(corpus))])
+            self.assertEqual(expected, [line for batch in corpus.batches(3) for line in batch])
+            self.assertEqual(content.encode("utf-8"), corpus.raw())
+
+    @given(integers(min_value=0, max_value=50), integers(min_value=1, max_value=8), sampled_from(["lines", "bytes"]))
+    def test_split_covers_all_lines(self, count, n, by):
+        self.write("".join(f"line {i}\n" * (i % 3 + 1) for i in range(count)))
+        with reader.LineIndexedFile(self.path) as corpus:
+            ranges = corpus.split(n, by=by)
+            self.assertEqual(n, len(ranges))
+            self.assertEqual(corpus[:], [line for start, stop in ranges for line in corpus.read(start, stop)])
+
+    def test_index_is_persisted_and_refreshed(self):
+        self.write("a\nb\n")
+        with reader.LineIndexedFile(self.path) as corpus:
+            self.assertEqual(2, len(corpus))
+        self.assertTrue(os.path.exists(self.path + ".sctidx"))
+
+        with reader.LineIndexedFile(self.path) as corpus:
+            self.assertEqual(["a", "b"], corpus[:])
+
+        self.write("a\nb\nc\n")
+        os.utime(self.path, ns=(0, 10 ** 9))  # make sure the modification time changes
+        with reader.LineIndexedFile(self.path) as corpus:
+            self.assertEqual(["a", "b", "c"], corpus[:])
+
+    def test_sampled_digest(self):
+        content = "".join(f"line {i:03d}\n" for i in range(100))
+        self.write(content)
+        with reader.LineIndexedFile(self.path) as corpus:
+            whole, sampled = corpus.sampled_digest(), corpus.sampled_digest(blocks=4, block_size=8)
+        # same size, a byte changed in the last block, then in a line between the sampled blocks
+        for position, digests_differ in ((len(content) - 3, (True, True)), (500, (True, False))):
+            self.write(content[:position] + "X" + content[position + 1:])
+            os.utime(self.path, ns=(0, 10 ** 9 + position))
+            with reader.LineIndexedFile(self.path) as corpus:
+                self.assertEqual(digests_differ, (whole != corpus.sampled_digest(),
+                                                  sampled != corpus.sampled_digest(blocks=4, block_size=8)))
+
+    def test_sample(self):
+        self.write("".join(f"{i}\n" for i in range(100)))
+        with reader.LineIndexedFile(self.path) as corpus:
+            sample = corpus.sample(5, seed=1)
+            self.assertEqual(sample, corpus.sample(5, seed=1))
+            self.assertTrue(all(line == str(i) for i, line in sample))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
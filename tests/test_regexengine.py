@@ -0,0 +1,128 @@
+import re
+import time
+import unittest
+from sct import config
+from sct.utils import constants, regexengine
+
+# Inputs which make the nested quantifiers in ``constants`` backtrack heavily
+PATHOLOGICAL_INPUTS = {
+    "EMAIL_REGEX": ["-" * 6000 + "@" + "a-" * 6000, "a" * 50000, "a." * 20000 + "@"],
+    "PHONE_REGEX": ["1 " * 20000, "+1" * 20000, "(123) " * 5000],
+    "NUMBERS_REGEX": ["1" * 50000 + "a", "1,000" * 10000 + ".", "1." * 20000],
+    "URL_REGEX": ["http://" + "a:" * 20000, "http://" + "a-" * 20000, "www." * 10000],
+}
+
+TIMEOUT = 0.5
+
+
+class RegexEngineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.timeout = config.REGEX_TIMEOUT
+
+    def tearDown(self):
+        config.REGEX_TIMEOUT = self.timeout
+        regexengine.use_backend("re")
+
+    def test_default_backend_is_stdlib(self):
+        self.assertIsInstance(constants.EMAIL_REGEX.body, re.Pattern)
+        self.assertIsInstance(constants.YEAR_REGEX, re.Pattern)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            regexengine.compile("a", backend="pcre")
+
+    @unittest.skipIf(regexengine.regex is None, "regex module not installed")
+    def test_regex_backend_matches_stdlib(self):
+        sample = "Mail john.doe@example.com or +1-234-567-8900, visit https://example.com in 2024 for $1,000.50"
+        expected = {name: getattr(constants, name).sub("", sample) for name in PATHOLOGICAL_INPUTS}
+        regexengine.use_backend("regex", timeout=TIMEOUT)
+        for name in PATHOLOGICAL_INPUTS:
+            self.assertIsInstance(getattr(constants, name).body, regexengine.TimeoutPattern, name)
+            self.assertEqual(expected[name], getattr(constants, name).sub("", sample), name)
+
+    def assert_bounded(self, seconds):
+        for name, inputs in PATHOLOGICAL_INPUTS.items():
+            pattern = getattr(constants, name)
+            for text in inputs:
+                start = time.perf_counter()
+                try:
+                    pattern.sub("", text)
+                except regexengine.RegexTimeoutError:
+                    pass
+                # a generous margin for slow CI machines
+                self.assertLess(time.perf_counter() - start, seconds * 4, f"{name} on {text[:10]!r}")
+
+    @unittest.skipIf(regexengine.regex is None, "regex module not installed")
+    def test_pathological_inputs_bounded_time(self):
+        regexengine.use_backend("regex", timeout=TIMEOUT)
+        self.assert_bounded(TIMEOUT)
+
+    @unittest.skipIf(regexengine.regex is None, "regex module not installed")
+    def test_pathological_inputs_default_timeout(self):
+        self.assertIsNotNone(config.REGEX_TIMEOUT)
+        regexengine.use_backend("regex")
+        self.assert_bounded(config.REGEX_TIMEOUT)
+
+    @unittest.skipIf(regexengine.re2 is None, "google-re2 not installed")
+    def test_pathological_inputs_re2(self):
+        regexengine.use_backend("re2")
+        for name in PATHOLOGICAL_INPUTS:
+            # no fallback, linear time without a timeout
+            self.assertEqual("re2", type(getattr(constants, name).body).__module__.split(".")[0], name)
+        self.assert_bounded(0.25)
+
+    @unittest.skipIf(regexengine.re2 is None, "google-re2 not installed")
+    def test_re2_patterns_match_stdlib(self):
+        sample = ("Mail john.doe@example.com, -x@y.org or j[at]ex.nl, call +1-234-567-8900 or (020) 123-4567 ext 12, "
+                  "visit https://user@example.com:8080/path?q=1 and http://192.168.1.1/x or http://8.8.8.8, "
+                  "pay 1,000.50 or 12 345,50 in 2024")
+        expected = {name: getattr(constants, name).sub("<X>", sample) for name in PATHOLOGICAL_INPUTS}
+        regexengine.use_backend("re2")
+        for name in PATHOLOGICAL_INPUTS:
+            self.assertEqual(expected[name], getattr(constants, name).sub("<X>", sample), name)
+
+    def test_prefixed_patterns_match_adjacent(self):
+        # the character before a match is checked without being taken, so a match may start right
+        # where the previous one ended, as with the lookbehinds of the original patterns
+        cases = {
+            "EMAIL_REGEX": [("20a@b.coa@b.co[_0a@b.coext]", "<X><X>]"), ("a@b.co,c@d.org", "<X>,<X>"),
+                            ("x.a@b.co", "<X>"), ("(a@b.co)", "(<X>)")],
+            "PHONE_REGEX": [("020 123 4567,020 123 4567", "<X>,<X>"), ("a020 123 4567", "a020 <X>"),
+                            ("+31 20 1234567", "+31 <X>")],
+            "NUMBERS_REGEX": [("1 2 3", "<X> <X> <X>"), ("x-1-2", "x-<X>-<X>"), ("a1 b2", "a1 b2"), ("1,000.5", "<X>")],
+            "URL_REGEX": [("see http://a.com,http://b.com", "see <X>,<X>"), ("x/www.a.com", "x/www.a.com")],
+        }
+        for backend in regexengine.available_backends():
+            regexengine.use_backend(backend, timeout=TIMEOUT)
+            for name, examples in cases.items():
+                for text, expected in examples:
+                    self.assertEqual(expected, getattr(constants, name).sub("<X>", text), f"{backend} {name} {text!r}")
+            matches = constants.EMAIL_REGEX.finditer("20a@b.coa@b.co[_0a@b.coext]")
+            self.assertEqual([(0, 15), (15, 26)], [match.span() for match in matches])
+            self.assertIsNone(constants.NUMBERS_REGEX.search("a1"))
+
+    @unittest.skipIf(regexengine.re2 is None, "google-re2 not installed")
+    def test_fallback_is_bounded_and_logged(self):
+        config.REGEX_TIMEOUT = None
+        with self.assertLogs(regexengine.logger, "WARNING") as logs:
+            compiled = regexengine.compile(r"(?<=a)b", backend="re2")
+        self.assertIn("without a time bound", logs.output[0])
+        if regexengine.regex is not None:
+            with self.assertLogs(regexengine.logger, "WARNING") as logs:
+                compiled = regexengine.compile(r"(?<=a)b", backend="re2", timeout=TIMEOUT)
+            self.assertIsInstance(compiled, regexengine.TimeoutPattern)
+            self.assertIn(f"with a {TIMEOUT}s timeout", logs.output[0])
+
+    @unittest.skipIf(regexengine.re2 is None, "google-re2 not installed")
+    def test_re2_backend_with_fallback(self):
+        regexengine.use_backend("re2", timeout=TIMEOUT)
+        self.assertEqual(config.REGEX_BACKEND, "re2")
+        # YEAR_REGEX is plain RE2 syntax, ISOLATED_MARKS_REGEX needs lookarounds and falls back
+        self.assertEqual(type(constants.YEAR_REGEX).__module__.split(".")[0], "re2")
+        self.assertNotIsInstance(constants.ISOLATED_MARKS_REGEX, re.Pattern)
+        self.assertEqual("<YEAR> and <YEAR>", constants.YEAR_REGEX.sub("<YEAR>", "1999 and 2024"))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,56 @@
+import pickle
+import unittest
+from sct.utils.result import CleanResult
+
+
+class CleanResultTest(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = 0
+
+    def stat_fn(self):
+        self.calls += 1
+        return "stat text"
+
+    def test_stat_text_is_lazy_and_cached(self):
+        result = CleanResult("LM Text", language="ENGLISH", stat_fn=self.stat_fn)
+        self.assertEqual("LM Text", result.lm_text)
+        self.assertEqual(0, self.calls)
+        self.assertEqual("stat text", result.stat_text)
+        self.assertEqual("stat text", result.stat_text)
+        self.assertEqual(1, self.calls)
+
+    def test_tuple_compatible(self):
+        result = CleanResult("LM Text", language="ENGLISH", stat_fn=self.stat_fn)
+        lm_text, stat_text, language = result
+        self.assertEqual(("LM Text", "stat text", "ENGLISH"), (lm_text, stat_text, language))
+        self.assertEqual("ENGLISH", result[2])
+        self.assertEqual(3, len(result))
+        self.assertEqual(("LM Text", "stat text", "ENGLISH"), result)
+
+    def test_shapes(self):
+        two = CleanResult("LM Text", language="DUTCH", stat_fn=self.stat_fn, shape=2)
+        self.assertEqual(("LM Text", "DUTCH"), two)
+        self.assertEqual(0, self.calls)
+        self.assertEqual("LM Text", CleanResult("LM Text", shape=1))
+
+    def test_shape_one_is_not_a_str(self):
+        # TextCleaner returns plain strings in this shape, the object only compares equal
+        result = CleanResult("LM Text", shape=1)
+        self.assertNotIsInstance(result, str)
+        self.assertEqual(1, len(result))
+        self.assertEqual("LM Text", result[0])
+        self.assertEqual(["LM Text"], list(result))
+        self.assertFalse(hasattr(result, "lower"))
+
+    def test_no_instance_dict(self):
+        with self.assertRaises(AttributeError):
+            CleanResult("LM Text").extra = 1
+
+    def test_pickle_resolves_stat_text(self):
+        result = pickle.loads(pickle.dumps(CleanResult("LM Text", language="ENGLISH", stat_fn=self.stat_fn)))
+        self.assertEqual(("LM Text", "stat text", "ENGLISH"), result.as_tuple())
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,118 @@
+import os
+import json
+import tempfile
+import unittest
+from sct import config
+from sct.runner import BatchRunner
+
+
+class RecordingCleaner:
+    """Stands in for TextCleaner, upper cases texts and fails on the ones containing "boom"."""
+
+    def __init__(self, crash_after=None):
+        self.calls = []
+        self.crash_after = crash_after
+
+    def process_batch(self, texts, batch_size=None):
+        if self.crash_after is not None and len(self.calls) >= self.crash_after:
+            raise KeyboardInterrupt  # not an Exception, like the process being killed
+        self.calls.append(list(texts))
+        if any("boom" in text for text in texts):
+            raise ValueError("boom")
+        return [(text.upper(), "ENGLISH") for text in texts]
+
+
+class BatchRunnerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.output_dir = os.path.join(self.directory.name, "out")
+        self.texts = [f"text {i}" for i in range(25)]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def runner(self, cleaner, **kwargs):
+        return BatchRunner(self.output_dir, cleaner=cleaner, segment_size=10, chunk_size=4, **kwargs)
+
+    def test_results_in_order(self):
+        runner = self.runner(RecordingCleaner())
+        stats = runner.run(self.texts)
+        self.assertEqual({"segments": 3, "skipped": 0, "texts": 25, "errors": 0}, stats)
+        self.assertEqual([{"lm_text": text.upper(), "language": "ENGLISH"} for text in self.texts],
+                         list(runner.results()))
+
+    def test_failing_texts_go_to_the_sidecar(self):
+        self.texts[12] = "boom"
+        runner = self.runner(RecordingCleaner())
+        stats = runner.run(self.texts)
+        self.assertEqual(1, stats["errors"])
+
+        results = list(runner.results())
+        self.assertEqual(25, len(results))
+        self.assertIsNone(results[12])
+        self.assertEqual("TEXT 13", results[13]["lm_text"])
+        errors = list(runner.errors())
+        self.assertEqual([12], [error["index"] for error in errors])
+        self.assertEqual("boom", errors[0]["text"])
+        self.assertIn("ValueError", errors[0]["error"])
+        self.assertTrue(os.path.exists(os.path.join(self.output_dir, "segment-000001.errors.jsonl")))
+
+    def test_resume_after_crash(self):
+        # 3 chunks per segment, dies in the second segment
+        with self.assertRaises(KeyboardInterrupt):
+            self.runner(RecordingCleaner(crash_after=4)).run(self.texts)
+        self.assertEqual(1, len(self.runner(RecordingCleaner()).read_journal()))
+
+        cleaner = RecordingCleaner()
+        stats = self.runner(cleaner).run(self.texts)
+        self.assertEqual({"segments": 2, "skipped": 1, "texts": 15, "errors": 0}, stats)
+        self.assertEqual(self.texts[10:], [text for call in cleaner.calls for text in call])
+        self.assertEqual([text.upper() for text in self.texts],
+                         [result["lm_text"] for result in self.runner(cleaner).results()])
+
+        # a finished job does nothing
+        cleaner = RecordingCleaner()
+        self.assertEqual(3, self.runner(cleaner).run(self.texts)["skipped"])
+        self.assertEqual([], cleaner.calls)
+
+    def test_torn_journal_line_is_ignored(self):
+        runner = self.runner(RecordingCleaner())
+        runner.run(self.texts)
+        with open(runner.journal_path, "a", encoding="utf-8") as f:
+            f.write('{"segment": 3, "sta')
+        self.assertEqual([0, 1, 2], sorted(runner.read_journal()))
+
+    def test_file_input(self):
+        path = os.path.join(self.directory.name, "input.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(self.texts) + "\n")
+        runner = self.runner(RecordingCleaner())
+        runner.run(path)
+        self.assertEqual([text.upper() for text in self.texts], [result["lm_text"] for result in runner.results()])
+
+    def test_mismatched_job_is_refused(self):
+        self.runner(RecordingCleaner()).run(self.texts)
+        with self.assertRaises(ValueError):
+            BatchRunner(self.output_dir, cleaner=RecordingCleaner(), segment_size=5).run(self.texts)
+
+        original = config.REPLACE_WITH_EMAIL
+        config.REPLACE_WITH_EMAIL = "<MAIL>"
+        try:
+            with self.assertRaises(ValueError):
+                self.runner(RecordingCleaner()).run(self.texts)
+        finally:
+            config.REPLACE_WITH_EMAIL = original
+
+    def test_journal_format(self):
+        runner = self.runner(RecordingCleaner())
+        runner.run(self.texts)
+        with open(runner.journal_path, encoding="utf-8") as f:
+            entries = [json.loads(line) for line in f]
+        self.assertEqual(10, entries[0]["segment_size"])
+        self.assertEqual([(0, 0, 10), (1, 10, 10), (2, 20, 5)],
+                         [(entry["segment"], entry["start"], entry["count"]) for entry in entries[1:]])
+
+
+if __name__ == '__main__':
+    unittest.main()
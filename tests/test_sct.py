@@ -1,3 +1,4 @@
+import re
 import unittest
 import random
 import string
@@ -5,7 +6,7 @@ from hypothesis import given, settings
 from hypothesis.strategies import text, from_regex
 from faker import Faker
 from sct import config
-from sct.utils import contact, datetime, special, normtext, stopwords, constants
+from sct.utils import contact, datetime, features, special, normtext, stopwords, tokenization, constants, regexengine
 from sct.utils.ner import GeneralNER
 import torch
 from unittest.mock import patch
@@ -15,7 +16,9 @@ import signal
 from contextlib import contextmanager
 from sct.sct import TextCleaner
 from sct.utils import ner
+from sct.scripts import benchmark_ner
 import os
+import tempfile
 
 def requires_ner(func):
     @wraps(func)
@@ -122,22 +125,22 @@ class TextCleanerTest(unittest.TestCase):
         self.ner = self.__class__.ner
 
     @settings(deadline=None)
-    @given(from_regex(constants.EMAIL_REGEX, fullmatch=True))
+    @given(from_regex(constants.EMAIL_REGEX.body, fullmatch=True))
     def test_email_regex(self, rx):
         self.assertEqual("", self.ProcessContacts.replace_emails(rx, ""))
         
     @settings(deadline=None)
-    @given(from_regex(constants.PHONE_REGEX, fullmatch=True))
+    @given(from_regex(constants.PHONE_REGEX.body, fullmatch=True))
     def test_phone_regex(self, rx):
         self.assertEqual("", self.ProcessContacts.replace_phone_numbers(rx, ""))
         
     @settings(deadline=None)
-    @given(from_regex(constants.NUMBERS_REGEX, fullmatch=True))
+    @given(from_regex(constants.NUMBERS_REGEX.body, fullmatch=True))
     def test_number_regex(self, rx):
         self.assertEqual("", self.ProcessContacts.replace_numbers(rx, ""))
         
     @settings(deadline=None)
-    @given(from_regex(constants.URL_REGEX, fullmatch=True))
+    @given(from_regex(constants.URL_REGEX.body, fullmatch=True))
     def test_url_regex(self, rx):
         self.assertNotEqual(rx, self.ProcessContacts.replace_urls(rx, ""))
         
@@ -340,6 +343,33 @@ class TextCleanerTest(unittest.TestCase):
                 self.assertNotIn("John Smith", result)
                 self.assertNotIn("Microsoft", result)
 
+    @requires_ner
+    def test_ner_batch_matches_single(self):
+        """Test batched NER over mixed languages gives the same output as one text at a time."""
+        texts = [
+            "John Smith works at Microsoft.",
+            "Angela Merkel lebt in Berlin.",
+            "Pablo vive en Madrid.",
+            "Willem woont in Amsterdam."
+        ]
+        languages = ["ENGLISH", "GERMAN", "SPANISH", "DUTCH"]
+
+        results = self.ner.process_batch(
+            texts,
+            batch_size=3,
+            positional_tags=['PER', 'ORG', 'LOC'],
+            ner_confidence_threshold=0.85,
+            language=languages
+        )
+
+        for text, language, result in zip(texts, languages, results):
+            self.assertEqual(result, self.ner.ner_process(
+                text,
+                positional_tags=['PER', 'ORG', 'LOC'],
+                ner_confidence_threshold=0.85,
+                language=language
+            ))
+
     @requires_ner
     def test_ner_memory_management(self):
         """Test memory management during NER processing."""
@@ -522,6 +552,337 @@ class TextCleanerTest(unittest.TestCase):
             # Memory difference should be minimal after cleanup
             self.assertLess(final_memory - initial_memory, 1024 * 1024 * 100)  # 100MB threshold
 
+    @requires_ner
+    def test_batch_processing_result_objects(self):
+        """Test result objects match the tuples and compute the stat text lazily."""
+        sx = TextCleaner()
+        sx.GeneralNER = self.ner
+        texts = ["John Doe works at Apple Inc. in 2023", "The quick brown fox", ""]
+        
+        expected = sx.process_batch(texts)
+        with patch.object(config, 'RETURN_RESULT_OBJECTS', True), \
+                patch.object(sx, 'statistical_model_processing', wraps=sx.statistical_model_processing) as stat:
+            results = sx.process_batch(texts)
+            self.assertEqual(0, stat.call_count)
+            self.assertEqual(expected, [result.as_tuple() for result in results])
+            for result, (lm_text, stat_text, language) in zip(results, expected):
+                self.assertEqual(lm_text, result.lm_text)
+                self.assertEqual(stat_text, result.stat_text)
+                self.assertEqual(language, result.language)
+
+        # results which are plain strings stay str
+        with patch.multiple(config, RETURN_RESULT_OBJECTS=True, CHECK_STATISTICAL_MODEL_PROCESSING=False,
+                            CHECK_DETECT_LANGUAGE=False):
+            results = sx.process_batch(texts)
+        self.assertEqual([lm_text for lm_text, _, _ in expected], results)
+        for result in results:
+            self.assertIsInstance(result, str)
+
+    @requires_ner
+    def test_process_corpus_boilerplate(self):
+        """Test repeated blocks are cleaned once and spliced back, or dropped."""
+        sx = TextCleaner()
+        sx.GeneralNER = self.ner
+        disclaimer = "This e-mail is confidential, if you received it in error call +31 20 123 4567."
+        texts = [f"My order {i} from 2021 never arrived.\n\n{disclaimer}" for i in range(6)] + [""]
+        
+        with patch.object(sx, 'clean_batch', wraps=sx.clean_batch) as clean_batch:
+            results = sx.process_corpus(texts)
+            self.assertEqual(7, len(clean_batch.call_args[0][0]))  # 6 messages and the disclaimer once
+        self.assertEqual(sx.process_batch(texts), results)
+        
+        dropped = sx.process_corpus(texts, drop_boilerplate=True)
+        self.assertEqual(sx.process_batch([f"My order 0 from 2021 never arrived."])[0], dropped[0])
+        self.assertEqual(("", "", None), dropped[-1])
+
+    @requires_ner
+    def test_checkpoint_resume(self):
+        """Test re-runs resume from the deepest checkpoint still valid for the config."""
+        texts = ["Dr. John Smith paid $50 in 2021, call +1-234-567-8900", "Ünïcödé text from München"]
+        with tempfile.TemporaryDirectory() as directory, \
+                patch.object(config, 'CHECKPOINT_PATH', os.path.join(directory, "checkpoints.db")):
+            sx = TextCleaner()
+            sx.GeneralNER = self.ner
+            first = sx.process_batch(texts)
+            self.assertEqual(first, sx.process_batch(texts))
+            self.assertEqual(len(texts), sx.checkpoints.hits)
+            
+            # other NER models only invalidate the NER outputs
+            other_models = {"en": {"name": "other/model", "revision": "abc", "quantized": False}}
+            with patch.object(self.ner, 'model_versions', return_value=other_models), \
+                    patch.object(self.ner, 'process_batch', wraps=self.ner.process_batch) as ner_batch, \
+                    patch.object(sx.NormaliseText, 'fix_bad_unicode', wraps=sx.NormaliseText.fix_bad_unicode) as fix_bad_unicode:
+                self.assertEqual(first, sx.process_batch(texts))
+                self.assertEqual(1, ner_batch.call_count)
+                self.assertEqual(0, fix_bad_unicode.call_count)
+            
+            with patch.object(config, 'REPLACE_WITH_NUMBERS', "<NUM>"), \
+                    patch.object(sx.NormaliseText, 'fix_bad_unicode', wraps=sx.NormaliseText.fix_bad_unicode) as fix_bad_unicode:
+                changed = sx.process_batch(texts)
+                self.assertEqual(0, fix_bad_unicode.call_count)
+            self.assertEqual("<NUM>" in changed[0][0], "<NUMBER>" in first[0][0])
+            sx.checkpoints.close()
+
+    @requires_ner
+    def test_checkpoint_configured_language(self):
+        """Test a checkpoint stored for one configured language isn't used for another."""
+        texts = ["Jan de Vries woont in Amsterdam en werkt bij Philips sinds 2019"]
+        with tempfile.TemporaryDirectory() as directory, \
+                patch.object(config, 'CHECKPOINT_PATH', os.path.join(directory, "checkpoints.db")):
+            for language in ("dutch", "german"):
+                with patch.object(config, 'LANGUAGE', language), \
+                        patch.object(self.ner, 'process_batch', wraps=self.ner.process_batch) as ner_batch:
+                    sx = TextCleaner()
+                    sx.GeneralNER = self.ner
+                    result = sx.process_batch(texts)
+                self.assertEqual(0, sx.checkpoints.hits)
+                self.assertEqual([language.upper()], ner_batch.call_args.kwargs["language"])
+                self.assertEqual(language.upper(), result[0][2])
+                sx.checkpoints.close()
+
+    @requires_ner
+    def test_clean_column(self):
+        """Test the columnar API matches process and keeps nulls."""
+        try:
+            import pandas as pd
+        except ImportError:
+            self.skipTest("pandas not installed")
+        sx = TextCleaner()
+        sx.GeneralNER = self.ner
+        texts = ["John Smith paid $50 in 2021, call +1-234-567-8900", None, "", "Ünïcödé text from 1999 in München"]
+        
+        frame = sx.clean_column(pd.Series(texts, index=[10, 11, 12, 13]), chunk_size=2)
+        self.assertEqual([10, 11, 12, 13], list(frame.index))
+        self.assertTrue(pd.isna(frame.loc[11, "lm_text"]))
+        for i, text in zip(frame.index, texts):
+            if text is not None:
+                lm_text, stat_text, language = sx.process(text)
+                self.assertEqual(lm_text, frame.loc[i, "lm_text"])
+                self.assertEqual(stat_text, frame.loc[i, "stat_text"])
+                self.assertEqual(language, None if pd.isna(frame.loc[i, "language"]) else frame.loc[i, "language"])
+
+    @requires_ner
+    def test_clean_column_configured_language(self):
+        """Test the columnar API uses the configured language like process_batch."""
+        try:
+            import pandas as pd
+        except ImportError:
+            self.skipTest("pandas not installed")
+        texts = ["Jan de Vries woont in Amsterdam en het is een mooie dag", "Bel 020 123 4567 voor de afspraak"]
+        with patch.object(config, 'LANGUAGE', "dutch"):
+            sx = TextCleaner()
+            sx.GeneralNER = self.ner
+            with patch.object(self.ner, 'process_batch', wraps=self.ner.process_batch) as ner_batch:
+                expected = sx.process_batch(texts)
+                frame = sx.clean_column(pd.Series(texts))
+            self.assertEqual(["DUTCH"] * len(texts), ner_batch.call_args_list[0].kwargs["language"])
+            self.assertEqual(["DUTCH"] * len(texts), ner_batch.call_args_list[1].kwargs["language"])
+        self.assertEqual(expected, list(zip(frame["lm_text"], frame["stat_text"], frame["language"])))
+
+    @requires_ner
+    def test_language_sampling(self):
+        """Test language detection from a bounded sample, its confidence and a configured language."""
+        long_text = "The weather is lovely today and we are going for a walk along the river. " * 500
+        with patch.object(config, 'LANGUAGE_SAMPLE_CHARS', 1000), \
+                patch.object(config, 'LANGUAGE_CONFIDENCE_THRESHOLD', 0.5):
+            sx = TextCleaner()
+            sx.GeneralNER = self.ner
+            self.assertEqual("ENGLISH", sx.process(long_text)[2])
+            self.assertGreater(sx.language_confidence, 0.5)
+            self.assertEqual("GERMAN", sx.language_of("Angela Merkel lebt in Berlin und liest gern")[0])
+        
+        with patch.object(config, 'LANGUAGE', 'dutch'):
+            sx = TextCleaner()
+            sx.GeneralNER = self.ner
+            self.assertEqual(["DUTCH", "DUTCH"], [language for _, _, language in sx.process_batch(["Hello there", "Hallo"])])
+
+    @requires_ner
+    def test_custom_stage_and_optimized_order(self):
+        """Test user stages run in the declared position and the optimized order keeps the results."""
+        from sct.utils import stages
+        texts = ["<p>Pay to NL91ABNA0417164300 &amp; mail john.doe@example.com</p>", "Ünïcödé <b>bold</b> 1999"]
+        sx = TextCleaner()
+        sx.GeneralNER = self.ner
+        expected = sx.process_batch(texts)
+        
+        with patch.object(config, 'OPTIMIZE_STAGE_ORDER', True):
+            optimized = TextCleaner()
+            optimized.GeneralNER = self.ner
+            names = [step.__name__ for step in optimized.pipeline]
+            self.assertLess(names.index("replace_html"), names.index("fix_bad_unicode"))
+            self.assertEqual(expected, optimized.process_batch(texts))
+        
+        stages.register_stage("replace_ibans", lambda text: re.sub(r"\bNL\d{2}[A-Z]{4}\d{10}\b", "<IBAN>", text),
+                              cost="cheap", reduces_length=True, emits=["IBAN"], before=["replace_numbers"])
+        try:
+            sx = TextCleaner()
+            sx.GeneralNER = self.ner
+            names = [step.__name__ for step in sx.pipeline]
+            self.assertLess(names.index("replace_ibans"), names.index("replace_numbers"))
+            self.assertIn("<IBAN>", sx.process(texts[0])[0])
+        finally:
+            stages.unregister_stage("replace_ibans")
+
+    @requires_ner
+    def test_metrics(self):
+        """Test the cleaner and NER update the metrics registry only when enabled."""
+        from sct.utils import metrics
+        metrics.REGISTRY.reset()
+        sx = TextCleaner()
+        sx.GeneralNER = self.ner
+        texts = ["John Smith visited https://example.com in 2021", "Angela Merkel lebt in Berlin", ""]
+        sx.process_batch(texts)
+        self.assertEqual(0, metrics.DOCUMENTS.value())
+        
+        with patch.object(config, 'COLLECT_METRICS', True):
+            sx.process_batch(texts)
+        self.assertEqual(3, metrics.DOCUMENTS.value())
+        self.assertEqual(1, metrics.BATCH_SECONDS.count())
+        self.assertEqual(2, metrics.STAGE_SECONDS.count(stage="replace_urls"))
+        self.assertEqual(1, metrics.STAGE_SECONDS.count(stage="ner_process"))
+        self.assertEqual(2, metrics.NER_CHUNKS.count())
+        self.assertGreaterEqual(metrics.NER_INVOCATIONS.value(model="en") + metrics.NER_INVOCATIONS.value(model="de"), 1)
+        self.assertIn("sct_stage_seconds_bucket", metrics.prometheus_text())
+        metrics.REGISTRY.reset()
+
+    @requires_ner
+    def test_output_budget(self):
+        """Test the output limits cut the LM text and leave the rest of long documents unprocessed."""
+        document = "Dr. John Smith paid $50 in 2021 and wrote to john.doe@example.com about it. " * 400
+        short = "Call John at +1-234-567-8900"
+        sx = TextCleaner()
+        sx.GeneralNER = self.ner
+        full, expected_short = sx.process_batch([document, short])
+        
+        with patch.object(config, 'MAX_OUTPUT_CHARS', 300), \
+                patch.object(self.ner, 'ner_process', wraps=self.ner.ner_process) as ner_process:
+            limited, limited_short = sx.process_batch([document, short])
+            self.assertLessEqual(len(limited[0]), 300)
+            self.assertTrue(full[0].startswith(limited[0]))
+            self.assertEqual(sx.statistical_model_processing(limited[0], limited[2]), limited[1])
+            self.assertEqual(expected_short, limited_short)
+            # only the first window went through NER
+            self.assertEqual(1, ner_process.call_count)
+            self.assertLess(len(ner_process.call_args[0][0]), len(document) // 10)
+        
+        with patch.object(config, 'MAX_OUTPUT_TOKENS', 50):
+            lm_text = sx.process(document)[0]
+            self.assertLessEqual(sx.count_tokens(lm_text), 50)
+            self.assertTrue(full[0].startswith(lm_text))
+            self.assertTrue(full[0][len(lm_text)].isspace())
+        
+        with patch.object(config, 'MAX_OUTPUT_CHARS', 300):
+            corpus = sx.process_corpus([document, short])
+            self.assertLessEqual(len(corpus[0][0]), 300)
+
+    @requires_ner
+    def test_short_text_mode(self):
+        """Test joined regex stages over short texts give the per text results."""
+        texts = ["Check https://t.co/abc 4 the $50 deal!! #2021", "mail me: jane@example.com or +31 20 123 4567",
+                 "The total was 1,000.", "Das Wetter in München kostet 12 345,", "The nul\x00 byte from 1999", "  ",
+                 "Here is b [tag] and c {x}"]
+        sx = TextCleaner()
+        sx.GeneralNER = self.ner
+        expected = sx.process_batch(texts)
+        
+        with patch.object(config, 'SHORT_TEXT_MAX_CHARS', 280), \
+                patch.object(sx.ProcessContacts, 'replace_urls', wraps=sx.ProcessContacts.replace_urls) as replace_urls:
+            self.assertEqual(expected, sx.process_batch(texts))
+            # one call for the joined texts, one for the text with a NUL
+            self.assertEqual(2, replace_urls.call_count)
+            self.assertEqual(expected[:5], sx.process_batch(texts[:5] + [texts[5] * 200])[:5])
+            replace_urls.reset_mock()
+            sx.process_batch(texts[:4])
+            self.assertEqual(1, replace_urls.call_count)
+
+    @requires_ner
+    def test_regex_timeout_policy(self):
+        """Test a text whose regexes time out is skipped without failing the rest of the batch."""
+        texts = ["mail me: jane@example.com or +31 20 123 4567", "a pathological @@ text", "The total was 1,000."]
+        sx = TextCleaner()
+        sx.GeneralNER = self.ner
+        expected = sx.process_batch([texts[0], texts[2]])
+        replace_emails = sx.ProcessContacts.replace_emails
+
+        def timing_out(text, *args, **kwargs):
+            if "@@" in text:
+                raise regexengine.RegexTimeoutError("Pattern exceeded 1.0s")
+            return replace_emails(text, *args, **kwargs)
+
+        with patch.object(sx.ProcessContacts, 'replace_emails', side_effect=timing_out):
+            with self.assertLogs("sct.sct", "WARNING"):
+                self.assertEqual([expected[0], sx.empty_result(), expected[1]], sx.process_batch(texts))
+            # the joined short texts time out together, then run one by one
+            with patch.object(config, 'SHORT_TEXT_MAX_CHARS', 280), self.assertLogs("sct.sct", "WARNING"):
+                self.assertEqual([expected[0], sx.empty_result(), expected[1]], sx.process_batch(texts))
+            with patch.object(config, 'REGEX_TIMEOUT_POLICY', 'error'):
+                with self.assertRaises(regexengine.RegexTimeoutError):
+                    sx.process_batch(texts)
+
+    @requires_ner
+    def test_windowed_processing(self):
+        """Test a long document is cleaned window by window, cutting the windows as they are needed."""
+        document = "Dr. John Smith paid $50 in 2021 and wrote to john.doe@example.com about it.\n\n" * 40
+        sx = TextCleaner()
+        sx.GeneralNER = self.ner
+        with patch.object(config, 'MAX_WINDOW_CHARS', 300), \
+                patch.object(sx.WindowSplitter, 'split', side_effect=AssertionError("builds every window")), \
+                patch.object(sx.WindowSplitter, 'windows', wraps=sx.WindowSplitter.windows) as windows:
+            lm_text, _, language = sx.process(document)
+            windows.assert_called_once_with(document, 300)
+        self.assertEqual(40, lm_text.count("<EMAIL>"))
+        self.assertEqual("ENGLISH", language)
+
+    @requires_ner
+    def test_batch_features(self):
+        """Test hashed features count the tokens of the statistical model texts of process_batch."""
+        texts = ["The quick brown fox jumps over the lazy dog near Amsterdam.", "",
+                 "Het is een mooie dag in Utrecht, zegt Jan de Vries.", "A long memo about budgets. " * 40]
+        sx = TextCleaner()
+        sx.GeneralNER = self.ner
+        hasher = features.FeatureHasher(sx.ProcessStopwords, n_features=2 ** 10, ngram_range=(1, 2))
+        with patch.object(config, 'MAX_WINDOW_CHARS', 300):
+            expected = sx.process_batch(texts)
+            batch = sx.process_batch_features(texts, hasher=hasher)
+        self.assertEqual((4, 2 ** 10), batch.shape)
+        self.assertEqual([result[0] for result in expected], batch.lm_texts)
+        self.assertEqual([result[2] for result in expected], batch.languages)
+        for i, (_, stat_text, _) in enumerate(expected):
+            indices, counts = batch.row(i)
+            self.assertEqual(dict(hasher.counts(stat_text.split())), dict(zip(indices.tolist(), counts.tolist())))
+
+    @requires_ner
+    def test_batch_token_ids(self):
+        """Test process_batch_tokens tokenizes the LM texts of the batch in one call."""
+        texts = ["Contact John Doe at john.doe@company.com. Meeting on 2023-10-01.", "  ", "Call +1-234-567-8900"]
+        sx = TextCleaner()
+        sx.GeneralNER = self.ner
+        with tempfile.TemporaryDirectory() as directory:
+            benchmark_ner.make_tiny_model(directory, 0, vocab_size=500)
+            tokenizer = tokenization.LMTokenizer(directory)
+            expected = sx.process_batch(texts)
+            with patch.object(tokenizer, 'encode', wraps=tokenizer.encode) as encode:
+                results, batch = sx.process_batch_tokens(texts, tokenizer)
+                encode.assert_called_once_with([lm_text for lm_text, _, _ in results])
+            self.assertEqual(expected, results)
+            for i, (lm_text, _, _) in enumerate(results):
+                self.assertEqual(tokenizer.tokenizer(lm_text)["input_ids"], batch.row(i).tolist())
+            
+            # a name is loaded once and kept
+            _, batch = sx.process_batch_tokens(texts, directory)
+            loaded = sx.lm_tokenizer(directory)
+            self.assertIs(loaded, sx.lm_tokenizers[(directory, tuple(tokenization.placeholders()))])
+            self.assertEqual(batch.row(0).tolist(), tokenizer.encode([results[0][0]]).row(0).tolist())
+
+            # other placeholders load it again, with the new ones registered
+            with patch.object(config, 'REPLACE_WITH_EMAIL', "<MAIL>"):
+                reloaded = sx.lm_tokenizer(directory)
+                self.assertIsNot(loaded, reloaded)
+                self.assertIn("<MAIL>", reloaded.tokenizer.get_vocab())
+                self.assertNotIn("<MAIL>", loaded.tokenizer.get_vocab())
+                self.assertIs(reloaded, sx.lm_tokenizer(directory))
+            self.assertIs(loaded, sx.lm_tokenizer(directory))
+
     @requires_ner
     def test_batch_processing_languages(self):
         """Test batch processing with multiple languages."""
@@ -0,0 +1,201 @@
+import os
+import json
+import time
+import signal
+import threading
+import unittest
+import urllib.request
+from urllib.error import HTTPError
+from sct import config, server
+from sct.utils import metrics
+
+
+class RecordingCleaner:
+    """Stands in for TextCleaner, returns (upper, lower, language) and records every batch."""
+
+    def __init__(self):
+        self.batches = []
+
+    def process_batch(self, texts, batch_size=None):
+        self.batches.append(list(texts))
+        return [(text.upper(), text.lower(), "ENGLISH") for text in texts]
+
+
+class ServerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cleaner = RecordingCleaner()
+        self.server = server.start_worker(server.make_server(self.cleaner, port=0, max_body_bytes=1000, max_texts=4),
+                                          max_batch_size=16, max_wait=0.05)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def request(self, path, payload=None):
+        data = json.dumps(payload).encode() if payload is not None else None
+        with urllib.request.urlopen(urllib.request.Request(self.url + path, data=data)) as response:
+            return response.status, json.loads(response.read())
+
+    def test_clean(self):
+        status, body = self.request("/clean", {"text": "Hello"})
+        self.assertEqual(200, status)
+        self.assertEqual({"lm_text": "HELLO", "stat_text": "hello", "language": "ENGLISH"}, body["result"])
+
+    def test_clean_batch(self):
+        status, body = self.request("/clean/batch", {"texts": ["a", "b", "c"]})
+        self.assertEqual(["A", "B", "C"], [result["lm_text"] for result in body["results"]])
+        self.assertEqual([["a", "b", "c"]], self.cleaner.batches)
+
+    def test_concurrent_requests_are_batched(self):
+        threads = [threading.Thread(target=self.request, args=("/clean", {"text": str(i)})) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(8, sum(len(batch) for batch in self.cleaner.batches))
+        self.assertLess(len(self.cleaner.batches), 8)
+
+    def test_health_and_ready(self):
+        self.assertEqual("ok", self.request("/health")[1]["status"])
+        status, body = self.request("/ready")
+        self.assertEqual(200, status)
+        self.assertTrue(body["ready"])
+
+    def test_invalid_request(self):
+        with self.assertRaises(HTTPError) as cm:
+            self.request("/clean/batch", {"texts": [1, 2]})
+        self.assertEqual(400, cm.exception.code)
+        with self.assertRaises(HTTPError) as cm:
+            self.request("/missing")
+        self.assertEqual(404, cm.exception.code)
+
+    def test_request_limits(self):
+        with self.assertRaises(HTTPError) as cm:
+            self.request("/clean", {"text": "x" * 1000})
+        self.assertEqual(413, cm.exception.code)
+        with self.assertRaises(HTTPError) as cm:
+            self.request("/clean/batch", {"texts": ["a"] * 5})
+        self.assertEqual(413, cm.exception.code)
+        self.assertEqual([], self.cleaner.batches)
+        self.assertEqual(4, len(self.request("/clean/batch", {"texts": ["a"] * 4})[1]["results"]))
+
+
+class CountingCleaner(RecordingCleaner):
+    """Counts the cleaned texts in the metrics like TextCleaner."""
+
+    def process_batch(self, texts, batch_size=None):
+        if metrics.active() is not None:
+            metrics.DOCUMENTS.inc(len(texts))
+        return super().process_batch(texts, batch_size)
+
+
+class ForkedWorkersTest(unittest.TestCase):
+    """Runs ``run_workers`` with two workers in a forked supervisor process."""
+
+    def setUp(self):
+        http_server = server.make_server(CountingCleaner(), port=0)
+        self.url = f"http://127.0.0.1:{http_server.server_address[1]}"
+        self.supervisor = os.fork()
+        if self.supervisor == 0:
+            try:
+                config.COLLECT_METRICS = True
+                metrics.REGISTRY.reset()
+                server.run_workers(http_server, workers=2, threads=1, max_wait=0)
+            finally:
+                os._exit(0)
+        http_server.server_close()
+
+    def tearDown(self):
+        if self.supervisor:
+            os.kill(self.supervisor, signal.SIGKILL)
+            os.waitpid(self.supervisor, 0)
+
+    def get(self, path):
+        with urllib.request.urlopen(self.url + path, timeout=10) as response:
+            return response.read()
+
+    def worker_pids(self, count, timeout=30):
+        """Polls /health until ``count`` different workers answered."""
+        pids, deadline = set(), time.monotonic() + timeout
+        while len(pids) < count and time.monotonic() < deadline:
+            pids.add(json.loads(self.get("/health"))["pid"])
+        return pids
+
+    def test_workers(self):
+        pids = self.worker_pids(2)
+        self.assertEqual(2, len(pids))
+        self.assertNotIn(self.supervisor, pids)
+
+        # the metrics of every worker are summed, whichever answers
+        for _ in range(20):
+            data = json.dumps({"texts": ["a", "b"]}).encode()
+            urllib.request.urlopen(urllib.request.Request(self.url + "/clean/batch", data=data), timeout=10).read()
+        for _ in range(4):
+            self.assertIn("sct_documents_total 40\n", self.get("/metrics").decode())
+
+        # a worker which dies is replaced
+        killed = pids.pop()
+        os.kill(killed, signal.SIGKILL)
+        restarted = self.worker_pids(2)
+        self.assertEqual(2, len(restarted))
+        self.assertNotIn(killed, restarted)
+        self.assertIn("sct_documents_total 40\n", self.get("/metrics").decode())
+
+        # SIGTERM stops the workers, then the supervisor
+        os.kill(self.supervisor, signal.SIGTERM)
+        _, status = os.waitpid(self.supervisor, 0)
+        self.supervisor = None
+        self.assertEqual(0, status)
+        for pid in restarted:
+            with self.assertRaises(ProcessLookupError):
+                os.kill(pid, 0)
+        with self.assertRaises(OSError):
+            self.get("/health")
+
+
+class CrashingCleaner:
+    """Ends the worker process on every batch."""
+
+    def process_batch(self, texts, batch_size=None):
+        os._exit(3)
+
+
+class CrashingWorkersTest(unittest.TestCase):
+
+    def test_restarts_are_limited(self):
+        http_server = server.make_server(CrashingCleaner(), port=0)
+        url = f"http://127.0.0.1:{http_server.server_address[1]}/clean"
+        supervisor = os.fork()
+        if supervisor == 0:
+            status = 1
+            try:
+                status = server.run_workers(http_server, workers=2, threads=1, max_wait=0, max_restarts=2,
+                                            restart_window=60, restart_backoff=0.2)
+            finally:
+                os._exit(10 + status)
+        http_server.server_close()
+
+        status, start = None, time.monotonic()
+        while status is None and time.monotonic() < start + 30:
+            try:
+                urllib.request.urlopen(urllib.request.Request(url, data=b'{"text": "a"}'), timeout=5).read()
+            except OSError:
+                pass
+            pid, code = os.waitpid(supervisor, os.WNOHANG)
+            if pid:
+                status = os.waitstatus_to_exitcode(code)
+        if status is None:
+            os.kill(supervisor, signal.SIGKILL)
+            os.waitpid(supervisor, 0)
+            self.fail("the supervisor kept restarting its workers")
+        # three workers died, the restarts waited 0.2s then 0.4s and the third death stopped the server
+        self.assertEqual(11, status)
+        self.assertGreaterEqual(time.monotonic() - start, 0.6)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,133 @@
+import os
+import json
+import tempfile
+import unittest
+import multiprocessing
+from unittest.mock import patch
+import numpy as np
+from hypothesis import given, settings
+from hypothesis.strategies import integers, lists, sampled_from, text
+from sct import shard
+from sct.utils.reader import LineIndexedFile
+from tests.test_runner import RecordingCleaner
+
+
+def run_node(path, output_dir, index, num_shards, by):
+    # a stand-in for a machine, a separate process sharing nothing but the files
+    return shard.run_shard(path, output_dir, index, num_shards, by=by, cleaner=RecordingCleaner(),
+                           segment_size=7, chunk_size=3)["shard"]
+
+
+class ShardTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "corpus.txt")
+        self.output_dir = os.path.join(self.directory.name, "shards")
+        self.texts = [f"text {i % 23}" for i in range(60)]
+        self.texts[17] = "boom"
+        self.write(self.texts)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, texts):
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write("".join(text + "\n" for text in texts))
+
+    def expected(self, texts):
+        return [None if "boom" in text else {"lm_text": text.upper(), "language": "ENGLISH"} for text in texts]
+
+    @settings(deadline=None, max_examples=30)
+    @given(lists(text(alphabet="ab é", max_size=6), max_size=40), integers(min_value=1, max_value=6),
+           sampled_from(shard.STRATEGIES))
+    def test_shards_partition_the_lines(self, texts, num_shards, by):
+        self.write(texts)
+        with LineIndexedFile(self.path, rebuild=True) as corpus:
+            parts = [shard.shard_lines(corpus, k, num_shards, by) for k in range(num_shards)]
+            self.assertEqual(list(range(len(corpus))), sorted(int(i) for part in parts for i in part))
+            for k, part in enumerate(parts):
+                self.assertTrue((np.diff(part) > 0).all())
+                self.assertEqual([corpus.line(int(i)) for i in part], shard.ShardLines(corpus, part)[:])
+                if by == "hash":
+                    self.assertTrue(all(shard.line_hash(corpus.line(int(i))) % num_shards == k for i in part))
+
+    def test_local_processes_merge_in_order(self):
+        for by in shard.STRATEGIES:
+            output_dir = os.path.join(self.output_dir, by)
+            with multiprocessing.get_context("spawn").Pool(3) as pool:
+                done = pool.starmap(run_node, [(self.path, output_dir, k, 3, by) for k in range(3)])
+            self.assertEqual([0, 1, 2], done)
+
+            self.assertEqual(self.expected(self.texts), list(shard.merge_shards(output_dir)))
+            errors = list(shard.merge_errors(output_dir))
+            self.assertEqual([17], [error["line"] for error in errors])
+
+            merged_path = os.path.join(self.directory.name, f"merged-{by}.jsonl")
+            self.assertEqual(60, shard.write_merged(output_dir, merged_path))
+            with open(merged_path, encoding="utf-8") as f:
+                self.assertEqual(self.expected(self.texts), [json.loads(line) for line in f])
+            self.assertTrue(os.path.exists(merged_path + ".errors.jsonl"))
+
+    def test_hash_keeps_duplicates_together(self):
+        with LineIndexedFile(self.path) as corpus:
+            for k in range(4):
+                texts = {corpus.line(int(i)) for i in shard.shard_lines(corpus, k, 4, "hash")}
+                for other in range(k + 1, 4):
+                    others = {corpus.line(int(i)) for i in shard.shard_lines(corpus, other, 4, "hash")}
+                    self.assertFalse(texts & others)
+
+    def test_merge_refuses_incomplete_or_inconsistent_shards(self):
+        run_node(self.path, self.output_dir, 0, 2, "bytes")
+        with self.assertRaisesRegex(ValueError, "missing \\[1\\]"):
+            list(shard.merge_shards(self.output_dir))
+
+        run_node(self.path, self.output_dir, 1, 2, "bytes")
+        manifest_path = os.path.join(shard.shard_dir(self.output_dir, 1, 2), "manifest.json")
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        manifest["fingerprint"] = "another config"
+        with open(manifest_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        with self.assertRaisesRegex(ValueError, "differ in fingerprint"):
+            list(shard.merge_shards(self.output_dir))
+
+    def test_merge_checks_the_content_of_every_shard(self):
+        for k in range(2):
+            run_node(self.path, self.output_dir, k, 2, "hash")
+        self.assertEqual(self.expected(self.texts), list(shard.merge_shards(self.output_dir, self.path)))
+
+        # a copy with the same size and line offsets, differing in one line between the sampled blocks
+        changed = list(self.texts)
+        changed[30] = changed[30].replace("text", "TEXT")
+        self.write(changed)
+        os.utime(self.path, ns=(0, 10 ** 9))
+        sample = shard.load_manifests(self.output_dir)[0]["input"]["sample"]
+        with patch.object(LineIndexedFile, "sampled_digest", lambda corpus: sample), \
+                self.assertRaisesRegex(ValueError, "other content"):
+            list(shard.merge_shards(self.output_dir, self.path))
+        self.assertEqual(self.expected(self.texts), list(shard.merge_shards(self.output_dir)))
+
+        self.write(self.texts + ["another text"])
+        os.utime(self.path, ns=(0, 2 * 10 ** 9))
+        with self.assertRaisesRegex(ValueError, "not the input"):
+            list(shard.merge_shards(self.output_dir, self.path))
+
+    def test_shards_of_different_copies_are_refused(self):
+        run_node(self.path, self.output_dir, 0, 2, "bytes")
+        self.write(["TEXT 0"] + self.texts[1:])
+        os.utime(self.path, ns=(0, 10 ** 9))
+        run_node(self.path, self.output_dir, 1, 2, "bytes")
+        with self.assertRaisesRegex(ValueError, "differ in input"):
+            list(shard.merge_shards(self.output_dir))
+
+    def test_rerun_on_changed_input_is_refused(self):
+        run_node(self.path, self.output_dir, 0, 2, "hash")
+        self.write(self.texts + ["another text"] * 5)
+        os.utime(self.path, ns=(0, 10 ** 9))
+        with self.assertRaises(ValueError):
+            run_node(self.path, self.output_dir, 0, 2, "hash")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+import torch
+from transformers import AutoModelForTokenClassification
+
+from sct import config
+from sct.scripts import benchmark_ner
+from sct.utils import snapshot
+
+
+class TiedModule(torch.nn.Module):
+
+    def __init__(self):
+        super().__init__()
+        self.embedding = torch.nn.Embedding(7, 3)
+        self.output = torch.nn.Linear(3, 7, bias=False)
+        self.output.weight = self.embedding.weight
+        self.flags = torch.nn.Parameter(torch.ones(3, dtype=torch.int8), requires_grad=False)  # leaves the rest unaligned
+        self.scale = torch.nn.Parameter(torch.rand(5, dtype=torch.float64))
+        self.register_buffer("positions", torch.arange(7), persistent=False)
+
+
+class WeightsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = Path(self.directory.name) / snapshot.WEIGHTS
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_roundtrip(self):
+        module = TiedModule()
+        snapshot.save_weights(module, self.path)
+        tensors, aliases = snapshot.load_weights(self.path)
+        self.assertEqual({"output.weight": "embedding.weight"}, aliases)
+        expected = dict(module.state_dict(), positions=module.positions)
+        expected.pop("output.weight")
+        self.assertEqual(set(expected), set(tensors))
+        for name, tensor in expected.items():
+            self.assertTrue(torch.equal(tensor, tensors[name]), name)
+
+    def test_tensors_map_the_file(self):
+        module = torch.nn.Sequential(torch.nn.Linear(8, 4), torch.nn.LayerNorm(4))
+        snapshot.save_weights(module, self.path)
+        tensors, _ = snapshot.load_weights(self.path)
+        # views of one mapping of the file, nothing copied
+        self.assertEqual(1, len({tensor.untyped_storage().data_ptr() for tensor in tensors.values()}))
+        self.assertEqual(self.path.stat().st_size, next(iter(tensors.values())).untyped_storage().nbytes())
+        tensors["0.weight"].zero_()
+        reloaded, _ = snapshot.load_weights(self.path)
+        self.assertTrue(torch.equal(module[0].weight, reloaded["0.weight"]))
+
+
+class SnapshotTest(unittest.TestCase):
+    """Snapshots of generated tiny models, nothing is downloaded."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.models = benchmark_ner.make_tiny_models(Path(cls.directory.name) / "models", vocab_size=500)
+        cls.snapshot_dir = Path(cls.directory.name) / "snapshot"
+        cls.manifest = snapshot.write_snapshot(cls.snapshot_dir, cls.models)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def test_manifest(self):
+        with open(self.snapshot_dir / snapshot.MANIFEST) as f:
+            self.assertEqual(self.manifest, json.load(f))
+        self.assertEqual(self.models[0], self.manifest["models"]["en"]["name"])
+        self.assertTrue(self.manifest["models"]["en"]["revision"].startswith("local-"))
+        self.assertEqual("B-PER", self.manifest["models"]["nl"]["labels"]["1"])
+        self.assertEqual(config.LANGUAGE_LOW_ACCURACY, self.manifest["language"]["language_low_accuracy"])
+        self.assertFalse(self.snapshot_dir.with_name("snapshot.tmp").exists())
+        with self.assertRaises(FileExistsError):
+            snapshot.write_snapshot(self.snapshot_dir, self.models)
+
+    def test_same_outputs(self):
+        expected = AutoModelForTokenClassification.from_pretrained(self.models[2]).eval()
+        model = snapshot.load_model(self.snapshot_dir / "de")
+        ids = torch.randint(5, model.config.vocab_size, (2, 20))
+        with torch.no_grad():
+            self.assertTrue(torch.equal(expected(ids).logits, model(ids).logits))
+        self.assertTrue(torch.equal(expected.roberta.embeddings.position_ids, model.roberta.embeddings.position_ids))
+
+    def test_general_ner(self):
+        from sct.utils.ner import GeneralNER
+        texts = [text for text, _ in benchmark_ner.generate_corpus("medium", 4)]
+        models = config.NER_MODELS_LIST[:]
+        try:
+            config.NER_MODELS_LIST[:] = self.models
+            expected = GeneralNER(device="cpu").process_batch(texts, 4, config.POSITIONAL_TAGS, language="GERMAN")
+            config.NER_SNAPSHOT_DIR = str(self.snapshot_dir)
+            ner = GeneralNER(device="cpu")
+        finally:
+            config.NER_MODELS_LIST[:] = models
+            config.NER_SNAPSHOT_DIR = None
+        self.assertEqual(expected, ner.process_batch(texts, 4, config.POSITIONAL_TAGS, language="GERMAN"))
+        self.assertEqual(self.models[3], ner.model_versions()["es"]["name"])
+        self.assertEqual(self.manifest["models"]["es"]["revision"], ner.model_versions()["es"]["revision"])
+
+    def test_not_a_snapshot(self):
+        with self.assertRaises(FileNotFoundError):
+            snapshot.read_manifest(self.directory.name)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import re
+import string
+import unittest
+from hypothesis import given, settings
+from hypothesis.strategies import text, sampled_from, lists
+from sct.utils import constants, normtext, special
+
+# Characters the symbol normalization stages care about, mixed with plain text
+SYMBOL_ALPHABET = list(constants.CURRENCIES.keys()) + constants.strange_single_quotes + \
+    constants.strange_double_quotes + list("[]{}'\"-*%:.!,ab1 ")
+
+
+class ProcessSpecialSymbolsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.ProcessSpecialSymbols = special.ProcessSpecialSymbols()
+        self.NormaliseText = normtext.NormaliseText()
+
+    def test_currency_symbols_to_abbreviations(self):
+        self.assertEqual("USD5 and PLN3 or EUREUR",
+                         self.ProcessSpecialSymbols.replace_currency_symbols("$5 and zł3 or €€", replace_with=None))
+
+    def test_currency_symbols_with_token(self):
+        self.assertEqual("<CUR>5 <CUR>",
+                         self.ProcessSpecialSymbols.replace_currency_symbols("$5 £¥", replace_with="<CUR>"))
+
+    @settings(deadline=None)
+    @given(lists(sampled_from(SYMBOL_ALPHABET), max_size=20).map("".join))
+    def test_currency_translation_matches_sequential_replace(self, rx):
+        expected = rx
+        for k, v in constants.CURRENCIES.items():
+            expected = expected.replace(k, v)
+        self.assertEqual(expected, self.ProcessSpecialSymbols.replace_currency_symbols(rx, replace_with=None))
+
+    @settings(deadline=None)
+    @given(text())
+    def test_remove_punctuation(self, rx):
+        expected = re.sub('[' + re.escape(string.punctuation) + ']', '', rx)
+        self.assertEqual(expected, self.ProcessSpecialSymbols.remove_punctuation(rx))
+
+    @settings(deadline=None)
+    @given(lists(sampled_from(SYMBOL_ALPHABET), max_size=20).map("".join))
+    def test_fix_strange_quotes(self, rx):
+        expected = constants.DOUBLE_QUOTE_REGEX.sub('"', constants.SINGLE_QUOTE_REGEX.sub("'", rx))
+        self.assertEqual(expected, self.NormaliseText.fix_strange_quotes(rx))
+
+    def test_remove_isolated_special_symbols(self):
+        self.assertEqual("see  and  now  ok",
+                         self.ProcessSpecialSymbols.remove_isolated_special_symbols("see [image.png] and {link} now - ok"))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
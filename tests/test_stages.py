@@ -0,0 +1,174 @@
+import unittest
+from hypothesis import given, settings
+from hypothesis.strategies import booleans, from_regex, just, lists, one_of, sets, sampled_from, text, tuples
+from sct.utils import checkpoint, constants, contact, datetime, special, stages
+
+BUILT_IN = list(stages.REGISTRY)
+
+# patterns of constants giving the same result over a joined batch, and why the others don't
+BATCH_SAFE_PATTERNS = ["URL_REGEX", "EMAIL_REGEX", "PHONE_REGEX", "YEAR_REGEX", "CURRENCY_REGEX",
+                       "MULTI_CHAR_CURRENCY_REGEX", "HTML_REGEX", "ACRONYM_REGEX", "ISOLATED_SPECIAL_SYMBOLS_REGEX",
+                       "ISOLATED_MARKS_REGEX", "DOUBLE_QUOTE_REGEX", "SINGLE_QUOTE_REGEX"]
+BATCH_UNSAFE_PATTERNS = {
+    "NUMBERS_REGEX": ["1,000.", "b"],  # ends at the end of a text after a trailing separator
+    "ISOLATED_LETTERS_REGEX": ["b", "c"],  # takes the line break before the letter
+    "SQUARE_BRACKETS_REGEX": ["[a", "b]"],
+    "CURLY_BRACKETS_REGEX": ["{a", "b}"],
+    "LINEBREAK_REGEX": ["a", "b"],
+    "TWO_LINEBREAK_REGEX": ["a\n", "b"],
+    "MULTI_WHITESPACE_TO_ONE_REGEX": ["a", "b"],
+    "NONBREAKING_SPACE_REGEX": ["a ", "b"],
+    "SENTENCE_BOUNDARY_PATTERN": ["a.", "b"],
+}
+FRAGMENTS = ["http://", "https://www.", "www.", "example.com", "/path?q=1", "john.doe", "@", "[at]", ".nl", "+31",
+             "020", "(020)", "123", "4567", "555-1234", " ext ", "x", "#", "2019", "1,000", "0.5", "12 345", "$",
+             "zł", "€", "<b>", "&amp;", "U.S.", "«", "’", "!", "-", " ", "\n", "\t"]
+TEXTS = lists(lists(one_of(sampled_from(FRAGMENTS), text(alphabet="aB1.,:-/ \n", max_size=3)), max_size=8)
+              .map("".join), min_size=1, max_size=4)
+
+
+class StageOrderTest(unittest.TestCase):
+
+    def tearDown(self):
+        for name in [name for name, stage in stages.REGISTRY.items() if stage.function is not None]:
+            stages.unregister_stage(name)
+
+    def names(self, enabled, optimize=False):
+        return [stage.name for stage in stages.build_order(enabled, optimize=optimize)]
+
+    def test_default_order_is_the_registration_order(self):
+        self.assertEqual(BUILT_IN, self.names(BUILT_IN))
+
+    def test_optimized_order_strips_html_before_fixing_unicode(self):
+        order = self.names(BUILT_IN, optimize=True)
+        self.assertEqual("detect_language", order[0])
+        self.assertLess(order.index("replace_html"), order.index("fix_bad_unicode"))
+        self.assertEqual(sorted(BUILT_IN), sorted(order))
+
+    @given(sets(sampled_from(BUILT_IN)), booleans())
+    def test_dependencies_hold_for_any_enabled_subset(self, enabled, optimize):
+        order = self.names(enabled, optimize)
+        self.assertEqual(sorted(enabled), sorted(order))
+        # disabling a stage in between must not free the ones around it
+        default = [name for name in BUILT_IN if name in enabled]
+        regex = [name for name in default if name.startswith("replace_") and name != "replace_html"]
+        self.assertEqual(regex, [name for name in order if name in regex])
+        cleanup = [name for name in default if name.startswith(("remove_", "normalize_"))]
+        self.assertEqual(cleanup, order[len(order) - len(cleanup):])
+        if "detect_language" in enabled:
+            self.assertEqual("detect_language", order[0])
+
+    def test_user_stage_placement(self):
+        @stages.register_stage("replace_ibans", cost="cheap", reduces_length=True, emits=["IBAN"],
+                               after=["to_ascii_unicode"], before=["replace_numbers"])
+        def replace_ibans(text):
+            return text
+
+        stages.register_stage("mask_ibans", lambda text: text, consumes=["IBAN"])
+        for optimize in (False, True):
+            order = self.names(list(stages.REGISTRY), optimize)
+            self.assertLess(order.index("to_ascii_unicode"), order.index("replace_ibans"))
+            self.assertLess(order.index("replace_ibans"), order.index("replace_numbers"))
+            self.assertLess(order.index("replace_ibans"), order.index("mask_ibans"))
+
+        self.assertEqual("mask_ibans", stages.REGISTRY["mask_ibans"].function.__name__)
+        self.assertIn("replace_ibans", checkpoint.STAGE_CONFIG)
+        with self.assertRaises(ValueError):
+            stages.register_stage("replace_ibans", replace_ibans)
+
+    def test_user_stage_version(self):
+        names = ["fix_bad_unicode", "replace_ibans", "normalize_whitespace"]
+        stages.register_stage("replace_ibans", lambda text: text)
+        unversioned = checkpoint.stage_fingerprints(names)
+        stages.register_stage("replace_ibans", lambda text: text, replace=True, version="2")
+        versioned = checkpoint.stage_fingerprints(names)
+        self.assertEqual(unversioned[0], versioned[0])
+        self.assertTrue(all(u != v for u, v in zip(unversioned[1:], versioned[1:])))
+        stages.unregister_stage("replace_ibans")
+        self.assertNotIn("replace_ibans", checkpoint.STAGE_VERSIONS)
+
+    def test_invalid_stages(self):
+        with self.assertRaises(ValueError):
+            stages.Stage("x", cost="free")
+        with self.assertRaises(ValueError):
+            stages.unregister_stage("replace_html")
+
+        stages.register_stage("first", lambda text: text, after=["second"])
+        stages.register_stage("second", lambda text: text, after=["first"])
+        with self.assertRaisesRegex(ValueError, "cycle"):
+            stages.build_order(["first"])
+        stages.unregister_stage("second")
+
+        stages.register_stage("second", lambda text: text, after=["missing"])
+        with self.assertRaisesRegex(ValueError, "unknown stage"):
+            stages.build_order(["first"])
+
+
+def replace(name, value):
+    """Replaces the matches of a pattern of ``constants`` as the stages do."""
+    return getattr(constants, name).sub("<X>", value)
+
+
+class BatchSafetyTest(unittest.TestCase):
+
+    def assert_batch_safe(self, function, texts):
+        joined = function(stages.BATCH_SEPARATOR.join(texts))
+        self.assertEqual([function(text) for text in texts], joined.split(stages.BATCH_SEPARATOR), repr(texts))
+
+    def test_every_pattern_is_classified(self):
+        patterns = {name for name in dir(constants) if name.isupper() and hasattr(getattr(constants, name), "sub")}
+        self.assertEqual(patterns, set(BATCH_SAFE_PATTERNS) | set(BATCH_UNSAFE_PATTERNS))
+
+    @settings(deadline=None, max_examples=300)
+    @given(TEXTS)
+    def test_safe_patterns(self, texts):
+        for name in BATCH_SAFE_PATTERNS:
+            self.assert_batch_safe(lambda value: replace(name, value), texts)
+
+    def test_unsafe_patterns(self):
+        for name, texts in BATCH_UNSAFE_PATTERNS.items():
+            joined = replace(name, stages.BATCH_SEPARATOR.join(texts))
+            self.assertNotEqual([replace(name, text) for text in texts], joined.split(stages.BATCH_SEPARATOR), name)
+
+    @settings(deadline=None)
+    @given(TEXTS)
+    def test_safe_stages(self, texts):
+        contacts, symbols = contact.ProcessContacts(), special.ProcessSpecialSymbols()
+        functions = {
+            "replace_urls": contacts.replace_urls,
+            "replace_emails": contacts.replace_emails,
+            "replace_years": datetime.ProcessDateTime().replace_years,
+            "replace_phone_numbers": contacts.replace_phone_numbers,
+            "replace_currency_symbols": lambda value: symbols.replace_currency_symbols(value, replace_with=None),
+        }
+        self.assertEqual(set(functions), {name for name, stage in stages.REGISTRY.items() if stage.batch_safe})
+        for function in functions.values():
+            self.assert_batch_safe(function, texts)
+
+
+class PrefilterTest(unittest.TestCase):
+
+    @settings(deadline=None, max_examples=500)
+    @given(sampled_from(sorted(constants.PREFILTERS)).flatmap(
+        lambda name: tuples(just(name), from_regex(getattr(getattr(constants, name), "body", getattr(constants, name))))))
+    def test_texts_with_a_match_pass(self, example):
+        name, value = example
+        self.assertTrue(constants.PREFILTERS[name](value), repr(value))
+
+    @settings(deadline=None, max_examples=300)
+    @given(TEXTS)
+    def test_prefilters_are_conservative(self, texts):
+        value = "".join(texts)
+        for name, check in constants.PREFILTERS.items():
+            if getattr(constants, name).search(value):
+                self.assertTrue(check(value), f"{name} {value!r}")
+
+    def test_plain_text_is_skipped(self):
+        value = "Hey, are you coming tonight? Bring the cake!"
+        self.assertEqual([], [name for name, check in constants.PREFILTERS.items() if check(value)])
+        self.assertTrue(constants.PREFILTERS["URL_REGEX"]("see WWW.example.com"))
+        self.assertTrue(constants.PREFILTERS["EMAIL_REGEX"]("jane(at)example.com"))
+
+
+if __name__ == "__main__":
+    unittest.main()
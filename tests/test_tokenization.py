@@ -0,0 +1,71 @@
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+from sct import config
+from sct.scripts import benchmark_ner
+from sct.utils import tokenization
+
+TEXTS = ["Call <PERSON> at <EMAIL> before <YEAR>.", "", "<NUMBER>", "een twee drie vier vijf zes zeven"]
+
+
+class PlaceholdersTest(unittest.TestCase):
+
+    def test_config_placeholders(self):
+        self.assertIn("<URL>", tokenization.placeholders())
+        self.assertIn("<ORGANISATION>", tokenization.placeholders())
+        with patch.multiple(config, REPLACE_WITH_URL="", REPLACE_WITH_NUMBERS="a number", CHECK_NER_PROCESS=False):
+            self.assertNotIn("<URL>", tokenization.placeholders())
+            self.assertNotIn("a number", tokenization.placeholders())
+            self.assertNotIn("<PERSON>", tokenization.placeholders())
+
+
+class LMTokenizerTest(unittest.TestCase):
+    """Uses the tokenizer of a generated tiny model, nothing is downloaded."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.path = cls.directory.name
+        benchmark_ner.make_tiny_model(cls.path, 0, vocab_size=500)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def test_padded(self):
+        tokenizer = tokenization.LMTokenizer(self.path)
+        batch = tokenizer.encode(TEXTS)
+        self.assertEqual(len(TEXTS), len(batch))
+        self.assertEqual(batch.input_ids.shape, batch.attention_mask.shape)
+        for i, text in enumerate(TEXTS):
+            self.assertEqual(tokenizer.tokenizer(text)["input_ids"], batch.row(i).tolist())
+        # every placeholder is a single token
+        tokens = tokenizer.tokenizer.convert_ids_to_tokens(batch.row(0).tolist())
+        for placeholder in ("<PERSON>", "<EMAIL>", "<YEAR>"):
+            self.assertEqual(1, tokens.count(placeholder))
+        self.assertEqual(len(tokenization.placeholders()), tokenizer.added_tokens)
+
+    def test_ragged(self):
+        tokenizer = tokenization.LMTokenizer(self.path, register_placeholders=False, padding=False, max_length=6)
+        batch = tokenizer.encode(TEXTS)
+        self.assertIsNone(batch.attention_mask)
+        self.assertEqual(np.int64, batch.input_ids.dtype)
+        self.assertEqual(0, tokenizer.added_tokens)
+        self.assertEqual(len(batch.input_ids), batch.offsets[-1])
+        for i, text in enumerate(TEXTS):
+            expected = tokenizer.tokenizer(text, truncation=True, max_length=6)["input_ids"]
+            self.assertEqual(expected, batch.row(i).tolist())
+        self.assertGreater(len(batch.row(0)), 1)
+        self.assertEqual(6, len(batch.row(3)))
+
+    def test_empty_batch(self):
+        for padding in (True, False):
+            batch = tokenization.LMTokenizer(self.path, padding=padding).encode([])
+            self.assertEqual(0, len(batch))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,37 @@
+import unittest
+from hypothesis import given, settings
+from hypothesis.strategies import integers, lists, sampled_from
+from sct.utils import windowing
+
+WORDS = ["lorem", "ipsum", "+31 20 123 4567", "1 000 000", "<a href='x y'>", "\n", "\n\n", " ", "dolor"]
+
+
+class WindowSplitterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.WindowSplitter = windowing.WindowSplitter()
+
+    @settings(deadline=None)
+    @given(lists(sampled_from(WORDS), max_size=200).map(" ".join), integers(min_value=1, max_value=300))
+    def test_split_partitions_text(self, text, max_chars):
+        windows = self.WindowSplitter.split(text, max_chars)
+        self.assertEqual(text, "".join(windows))
+        self.assertTrue(all(0 < len(w) <= max_chars for w in windows))
+
+    def test_split_prefers_paragraphs(self):
+        text = "first paragraph here\n\nsecond one"
+        self.assertEqual(["first paragraph here\n\n", "second one"], self.WindowSplitter.split(text, 25))
+
+    def test_split_keeps_spans_together(self):
+        text = "please call me at 020 123 4567 today"
+        windows = self.WindowSplitter.split(text, 28)
+        self.assertEqual(["please call me at ", "020 123 4567 today"], windows)
+
+    def test_truncate(self):
+        text = "one two three four"
+        self.assertEqual("one two ", self.WindowSplitter.truncate(text, 10))
+        self.assertEqual(text, self.WindowSplitter.truncate(text, 100))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)